@@ -0,0 +1,124 @@
+"""
+Замер поиска похожих обложек (BookAnalyzer.find_similar_covers) на синтетической БД: случайные
+хеши обложек и группы "переизданий" -- копии хеша с несколькими измененными битами.
+Поиск по индексу частей хеша сравнивается с перебором всех хешей, проверяется, что он находит
+все книги группы в пределах порога.
+
+Пример:
+    python benchmarks/bench_covers.py --rows 100000 --repeat 50 --output bench_covers.json
+"""
+import os
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+import shutil
+
+from common import percentile, write_results
+
+
+def populate(db_path, rows, group_size, max_flips, seed=0, batch=10000):
+    """
+    Создает БД BookAnalyzer с хешами обложек и их частями.\n
+    Аргументы:
+    db_path -- путь к файлу БД
+    rows -- количество записей
+    group_size -- книг в группе с похожей обложкой (первая -- исходная)
+    max_flips -- максимум измененных бит у похожих обложек
+    seed -- начальное значение генератора
+    batch -- размер пакета вставки\n
+    Возвращает:
+    Список путей исходных книг групп.
+    """
+    import cover_hash
+    from bookAnalyzer import BookAnalyzer
+    BookAnalyzer(db_path, reset=True)
+
+    rng = random.Random(seed)
+    conn = sqlite3.connect(db_path)
+    originals = []
+    value = 0
+    for start in range(0, rows, batch):
+        books = []
+        for i in range(start, min(rows, start + batch)):
+            if i % group_size == 0:
+                value = rng.getrandbits(64)
+                cover = value
+                originals.append(f"/library/book_{i:07d}.pdf")
+            else:
+                cover = value
+                for bit in rng.sample(range(64), rng.randint(1, max_flips)):
+                    cover ^= 1 << bit
+            books.append((i + 1, f"Книга {i}", f"/library/book_{i:07d}.pdf", cover_hash.to_signed(cover)))
+        conn.executemany("INSERT INTO books (id, title, file_ext, file_path, favorite, cover_hash) VALUES (?, ?, '.pdf', ?, 0, ?)",
+                         books)
+        conn.executemany('INSERT INTO cover_hash_bands (band, value, book_id) VALUES (?, ?, ?)',
+                         [(band, band_value, book_id) for book_id, _, _, cover in books
+                          for band, band_value in cover_hash.hash_bands(cover)])
+        conn.commit()
+    conn.close()
+    return originals
+
+
+def brute_force(db_path, file_path, max_distance):
+    # Перебор всех хешей обложек (без индекса частей)
+    import cover_hash
+    conn = sqlite3.connect(db_path)
+    value = conn.execute('SELECT cover_hash FROM books WHERE file_path = ?', (file_path,)).fetchone()[0]
+    found = [path for path, cover in conn.execute('SELECT file_path, cover_hash FROM books WHERE cover_hash IS NOT NULL')
+             if path != file_path and cover_hash.hamming(value, cover) <= max_distance]
+    conn.close()
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Similar cover search benchmark')
+    parser.add_argument('--rows', type=int, default=100_000, help='Number of books')
+    parser.add_argument('--group_size', type=int, default=5, help='Books per group of similar covers')
+    parser.add_argument('--max_flips', type=int, default=8, help='Maximum differing bits inside a group')
+    parser.add_argument('--max_distance', type=int, default=10, help='Search threshold, bits')
+    parser.add_argument('--repeat', type=int, default=50, help='Queries per method')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    parser.add_argument('--output', default='bench_covers.json', help='JSON file for the results')
+    args = parser.parse_args()
+
+    from bookAnalyzer import BookAnalyzer
+
+    work_dir = tempfile.mkdtemp(prefix='bench_covers_')
+    db_path = os.path.join(work_dir, 'books.db')
+    try:
+        print(f"Заполнение БД на {args.rows} записей...")
+        originals = populate(db_path, args.rows, args.group_size, args.max_flips, args.seed)
+        analyzer = BookAnalyzer(db_path, query_cache_entries=0)
+        queries = random.Random(args.seed).sample(originals, min(args.repeat, len(originals)))
+
+        results = []
+        missed = 0
+        for name, search in (
+                ('index', lambda path: [book[-1] for book in analyzer.find_similar_covers(path, args.max_distance)]),
+                ('brute force', lambda path: brute_force(db_path, path, args.max_distance))):
+            timings = []
+            found = 0
+            for file_path in queries:
+                started_at = time.perf_counter()
+                paths = search(file_path)
+                timings.append(time.perf_counter() - started_at)
+                found += len(paths)
+                if name == 'index':
+                    # Поиск по индексу должен находить все, что находит перебор
+                    missed += len(set(brute_force(db_path, file_path, args.max_distance)) - set(paths))
+            p50, p95 = percentile(timings, 50) * 1000, percentile(timings, 95) * 1000
+            print(f"{name:<12} p50 {p50:8.2f} мс  p95 {p95:8.2f} мс  найдено {found}")
+            results.append({'method': name, 'p50_ms': p50, 'p95_ms': p95, 'found': found})
+        print(f"Пропущено поиском по индексу: {missed}")
+        results[0]['missed'] = missed
+        analyzer.close()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    write_results(args.output, 'bench_covers', vars(args), results)
+
+
+if __name__ == '__main__':
+    main()
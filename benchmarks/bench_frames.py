@@ -0,0 +1,85 @@
+"""
+Замер массовой выборки каталога: get_all_books (отформатированные строки) против
+get_book_columns (массивы NumPy), get_books_arrow (таблица Arrow) и get_books_dataframe (pandas).
+Для каждого способа измеряются время и пик памяти Python (tracemalloc, отдельным проходом,
+так как трассировка замедляет выполнение).
+
+Пример:
+    python benchmarks/bench_frames.py --rows 1000000 --db_dir /tmp/bench --output bench_frames.json
+"""
+import os
+import gc
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+from common import write_results
+from bench_queries import populate
+
+
+def measure(method):
+    # (секунды, пик памяти в байтах); результат не сохраняется, чтобы не мешать следующему замеру
+    gc.collect()
+    started_at = time.perf_counter()
+    result = method()
+    elapsed = time.perf_counter() - started_at
+    del result
+    gc.collect()
+    tracemalloc.start()
+    result = method()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del result
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk catalog access benchmark')
+    parser.add_argument('--rows', type=int, default=1_000_000, help='Library size')
+    parser.add_argument('--db_dir', help='Keep/reuse the generated database in this directory')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    parser.add_argument('--output', default='bench_frames.json', help='JSON file for the results')
+    args = parser.parse_args()
+
+    from bookAnalyzer import BookAnalyzer
+
+    db_dir = args.db_dir or tempfile.mkdtemp(prefix='bench_frames_')
+    os.makedirs(db_dir, exist_ok=True)
+    # Превью почти пустые: замеряется выборка столбцов каталога, а не чтение BLOB
+    db_path = os.path.join(db_dir, f"books_{args.rows}_0.05kb.db")
+    if not os.path.exists(db_path):
+        print(f"Заполнение БД на {args.rows} записей...")
+        populate(db_path, args.rows, 0.05, args.seed)
+
+    analyzer = BookAnalyzer(db_path, query_cache_entries=0)
+    columns = ('favorite', 'title', 'author', 'file_ext', 'file_path', 'file_size', 'num_pages', 'metadata')
+    methods = [
+        ('get_all_books', analyzer.get_all_books),
+        ('get_book_columns', lambda: analyzer.get_book_columns(columns)),
+        ('get_book_columns (default)', analyzer.get_book_columns),
+        ('get_books_arrow', lambda: analyzer.get_books_arrow(columns)),
+    ]
+    try:
+        import pandas  # noqa: F401
+        methods.append(('get_books_dataframe', lambda: analyzer.get_books_dataframe(columns)))
+    except ImportError:
+        print("Пакет pandas не установлен, DataFrame не замеряется")
+
+    print(f"\n{'Способ':<30}{'с':>8}{'МБ':>10}")
+    results = []
+    for name, method in methods:
+        try:
+            elapsed, peak = measure(method)
+        except ImportError as e:
+            print(f"{name:<30} пропущен: {e}")
+            continue
+        print(f"{name:<30}{elapsed:>8.2f}{peak / 1024 ** 2:>10.0f}")
+        results.append({'method': name, 'seconds': elapsed, 'peak_mb': peak / 1024 ** 2})
+    analyzer.close()
+
+    write_results(args.output, 'bench_frames', vars(args), results)
+
+
+if __name__ == '__main__':
+    main()
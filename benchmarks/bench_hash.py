@@ -0,0 +1,93 @@
+"""
+Замер пропускной способности хеширования файлов (file_hash) на синтетических файлах.
+Первый проход по каждому файлу идет с диска (если ОС не успела закешировать файл),
+повторные -- из кеша страниц; для оценки скорости диска сравнивается с чтением файла
+без хеширования.
+
+Пример:
+    python benchmarks/bench_hash.py --size_mb 256 --files 4 --repeat 3 --output bench_hash.json
+"""
+import os
+import time
+import argparse
+import tempfile
+import shutil
+
+from common import write_results
+
+
+def make_file(path, size, block=4 * 1024 ** 2):
+    # Случайные данные (не сжимаются и не дедуплицируются файловой системой)
+    with open(path, 'wb') as file:
+        for start in range(0, size, block):
+            file.write(os.urandom(min(block, size - start)))
+
+
+def read_only(path, chunk_size=8 * 1024 ** 2):
+    # Чтение без хеширования: верхняя граница скорости
+    with open(path, 'rb', buffering=0) as file:
+        while file.read(chunk_size):
+            pass
+
+
+def read_chunks_blake2b(path, chunk_size=1024 * 1024):
+    # Прежний способ: чтение блоками в буферы Python
+    import hashlib
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='File hashing throughput benchmark')
+    parser.add_argument('--size_mb', type=int, default=256, help='Size of each test file, MB')
+    parser.add_argument('--files', type=int, default=2, help='Number of test files')
+    parser.add_argument('--repeat', type=int, default=3, help='Passes over the files per method')
+    parser.add_argument('--dir', help='Directory for the test files (default: temporary)')
+    parser.add_argument('--output', default='bench_hash.json', help='JSON file for the results')
+    args = parser.parse_args()
+
+    import file_hash
+
+    work_dir = tempfile.mkdtemp(prefix='bench_hash_', dir=args.dir)
+    size = args.size_mb * 1024 ** 2
+    paths = [os.path.join(work_dir, f"file_{i}.bin") for i in range(args.files)]
+    print(f"Создание {args.files} файлов по {args.size_mb} МБ...")
+    for path in paths:
+        make_file(path, size)
+
+    methods = [
+        ('read only', read_only),
+        ('read chunks + blake2b', read_chunks_blake2b),
+        ('mmap full blake2b', lambda path: file_hash.hash_file(path, 'full')),
+        ('mmap sampled blake2b', lambda path: file_hash.hash_file(path, 'sampled')),
+    ]
+    try:
+        import xxhash  # noqa: F401
+        methods.append(('mmap full xxh3', lambda path: file_hash.hash_file(path, 'full', 'xxh3')))
+    except ImportError:
+        print("Пакет xxhash не установлен, XXH3 не замеряется")
+
+    print(f"\n{'Способ':<28}{'МБ/с':>10}{'мс на файл':>12}")
+    results = []
+    try:
+        for name, method in methods:
+            started_at = time.perf_counter()
+            for _ in range(args.repeat):
+                for path in paths:
+                    method(path)
+            elapsed = time.perf_counter() - started_at
+            calls = args.repeat * len(paths)
+            throughput = size * calls / elapsed / 1024 ** 2
+            print(f"{name:<28}{throughput:>10.0f}{elapsed / calls * 1000:>12.1f}")
+            results.append({'method': name, 'mb_per_sec': throughput, 'ms_per_file': elapsed / calls * 1000})
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    write_results(args.output, 'bench_hash', vars(args), results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+"""
+Замер скорости обработки каталога (process_directory) на синтетическом наборе книг.
+
+Пример:
+    python benchmarks/bench_ingest.py --files 2000 --pages 20 --modes serial parallel --output bench_ingest.json
+"""
+import os
+import io
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import multiprocessing
+
+from common import peak_rss, write_results, compare_results
+
+WORDS_LATIN = ("book library page chapter author title reader story night river forest house window letter "
+               "garden winter summer morning evening mountain city street friend family history science").split()
+WORDS_CYRILLIC = ("книга библиотека страница глава автор название читатель история ночь река лес дом окно письмо "
+                  "сад зима лето утро вечер гора город улица друг семья наука").split()
+
+FORMATS = ('pdf', 'epub', 'docx', 'odt')
+
+
+def random_text(rng, words, count):
+    return " ".join(rng.choice(words) for _ in range(count))
+
+
+def make_cover(rng):
+    # Небольшая обложка для ePub, чтобы обработка превью тоже попадала в замер
+    from PIL import Image, ImageDraw
+    img = Image.new('RGB', (300, 450), color=tuple(rng.randrange(256) for _ in range(3)))
+    ImageDraw.Draw(img).rectangle((30, 30, 270, 120), fill=(255, 255, 255))
+    byte_arr = io.BytesIO()
+    img.save(byte_arr, format='PNG')
+    return byte_arr.getvalue()
+
+
+def make_pdf(path, rng, title, author, pages, words_per_page):
+    import fitz
+    doc = fitz.open()
+    for _ in range(pages):
+        page = doc.new_page()
+        # Стандартный шрифт PDF не содержит кириллицы, поэтому текст латиницей
+        page.insert_textbox(fitz.Rect(50, 50, 545, 790), random_text(rng, WORDS_LATIN, words_per_page), fontsize=10)
+    doc.set_metadata({'title': title, 'author': author})
+    doc.save(path)
+    doc.close()
+
+
+def make_epub(path, rng, title, author, pages, words_per_page):
+    from ebooklib import epub
+    book = epub.EpubBook()
+    book.set_identifier(f"bench-{rng.getrandbits(64)}")
+    book.set_title(title)
+    book.set_language('ru')
+    book.add_author(author)
+    book.set_cover('cover.png', make_cover(rng))
+
+    chapters = []
+    for i in range(pages):
+        chapter = epub.EpubHtml(title=f"Глава {i + 1}", file_name=f"chapter_{i + 1}.xhtml", lang='ru')
+        chapter.content = f"<h1>Глава {i + 1}</h1><p>{random_text(rng, WORDS_CYRILLIC, words_per_page)}</p>"
+        book.add_item(chapter)
+        chapters.append(chapter)
+    book.toc = chapters
+    book.spine = chapters
+    book.add_item(epub.EpubNcx())
+    book.add_item(epub.EpubNav())
+    epub.write_epub(path, book)
+
+
+def make_docx(path, rng, title, author, pages, words_per_page):
+    from docx import Document
+    document = Document()
+    document.core_properties.title = title
+    document.core_properties.author = author
+    document.add_heading(title, level=1)
+    for i in range(pages):
+        document.add_paragraph(random_text(rng, WORDS_CYRILLIC, words_per_page))
+        if i < pages - 1:
+            document.add_page_break()
+    document.save(path)
+
+
+def make_odt(path, rng, title, author, pages, words_per_page):
+    from odf.opendocument import OpenDocumentText
+    from odf import text, dc
+    document = OpenDocumentText()
+    document.meta.addElement(dc.Title(text=title))
+    document.meta.addElement(dc.Creator(text=author))
+    for _ in range(pages):
+        document.text.addElement(text.P(text=random_text(rng, WORDS_CYRILLIC, words_per_page)))
+    document.save(path)
+
+
+MAKERS = {'pdf': make_pdf, 'epub': make_epub, 'docx': make_docx, 'odt': make_odt}
+
+
+def generate_corpus(directory, files, formats, pages, words_per_page, seed=0, files_per_dir=200):
+    """
+    Создает синтетический набор книг.\n
+    Аргументы:
+    directory -- каталог для файлов
+    files -- общее количество файлов (делится поровну между форматами)
+    formats -- список форматов ('pdf', 'epub', 'docx', 'odt')
+    pages -- количество страниц (глав/абзацев) в книге
+    words_per_page -- количество слов на странице
+    seed -- начальное значение генератора, чтобы набор был воспроизводимым
+    files_per_dir -- сколько файлов класть в один подкаталог\n
+    Возвращает:
+    Общий размер созданных файлов в байтах.
+    """
+    rng = random.Random(seed)
+    total_size = 0
+    for i in range(files):
+        file_format = formats[i % len(formats)]
+        subdir = os.path.join(directory, f"part_{i // files_per_dir:04d}")
+        os.makedirs(subdir, exist_ok=True)
+        path = os.path.join(subdir, f"book_{i:06d}.{file_format}")
+        title = f"{random_text(rng, WORDS_LATIN, 3).title()} {i}"
+        author = random_text(rng, WORDS_LATIN, 2).title()
+        MAKERS[file_format](path, rng, title, author, pages, words_per_page)
+        total_size += os.path.getsize(path)
+    return total_size
+
+
+def run_mode(queue, corpus_dir, db_path, formats, workers, max_depth):
+    # Выполняется в отдельном процессе, чтобы пиковая память каждого режима мерилась независимо
+    from bookAnalyzer import BookAnalyzer
+    analyzer = BookAnalyzer(db_path, reset=True)
+    started_at = time.perf_counter()
+    analyzer.process_directory(corpus_dir, formats, [], max_depth, workers=workers)
+    elapsed = time.perf_counter() - started_at
+    rss_self, rss_children = peak_rss()
+    queue.put((elapsed, rss_self, rss_children))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Ingestion benchmark for BookAnalyzer')
+    parser.add_argument('--files', type=int, default=1000, help='Number of synthetic books')
+    parser.add_argument('--formats', nargs='+', default=list(FORMATS), choices=FORMATS, help='Formats to generate')
+    parser.add_argument('--pages', type=int, default=10, help='Pages (chapters) per book')
+    parser.add_argument('--words_per_page', type=int, default=250, help='Words per page')
+    parser.add_argument('--modes', nargs='+', default=['serial', 'parallel'], choices=['serial', 'parallel'],
+                        help='serial -- in-process, parallel -- worker processes')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes for the parallel mode')
+    parser.add_argument('--corpus_dir', help='Reuse or keep the corpus in this directory')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed of the corpus')
+    parser.add_argument('--output', default='bench_ingest.json', help='JSON file for the results')
+    parser.add_argument('--compare', help='Previous results JSON to compare files/sec with')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='bench_ingest_')
+    corpus_dir = args.corpus_dir or os.path.join(work_dir, 'corpus')
+    try:
+        if os.path.isdir(corpus_dir) and os.listdir(corpus_dir):
+            corpus_size = sum(entry.stat().st_size for part in os.scandir(corpus_dir) if part.is_dir()
+                              for entry in os.scandir(part.path))
+            file_count = sum(len(os.listdir(part.path)) for part in os.scandir(corpus_dir) if part.is_dir())
+            print(f"Используется готовый набор: {corpus_dir}")
+        else:
+            print(f"Генерация {args.files} файлов в {corpus_dir}...")
+            started_at = time.perf_counter()
+            corpus_size = generate_corpus(corpus_dir, args.files, args.formats, args.pages, args.words_per_page, args.seed)
+            file_count = args.files
+            print(f"Готово за {time.perf_counter() - started_at:.1f} с")
+
+        results = []
+        for mode in args.modes:
+            db_path = os.path.join(work_dir, f"{mode}.db")
+            workers = 0 if mode == 'serial' else (args.workers or os.cpu_count())
+            queue = multiprocessing.Queue()
+            process = multiprocessing.Process(target=run_mode, args=(queue, corpus_dir, db_path, args.formats, workers, 1))
+            process.start()
+            elapsed, rss_self, rss_children = queue.get()
+            process.join()
+
+            result = {
+                'mode': mode,
+                'workers': workers,
+                'files': file_count,
+                'seconds': elapsed,
+                'files_per_sec': file_count / elapsed if elapsed else None,
+                'mb_per_sec': corpus_size / 1024 ** 2 / elapsed if elapsed else None,
+                'peak_rss_bytes': rss_self,
+                'peak_rss_workers_bytes': rss_children,
+                'db_size_bytes': os.path.getsize(db_path),
+            }
+            results.append(result)
+            print(f"{mode:>9}: {result['files_per_sec']:.1f} файлов/с, {result['mb_per_sec']:.2f} МБ/с, "
+                  f"БД {result['db_size_bytes'] / 1024 ** 2:.1f} МБ")
+
+        params = {key: value for key, value in vars(args).items() if key not in ('output', 'compare')}
+        params['corpus_bytes'] = corpus_size
+        write_results(args.output, 'ingest', params, results)
+        if args.compare:
+            compare_results(args.compare, results, key=lambda result: result['mode'], metric='files_per_sec')
+    finally:
+        # Набор, созданный в --corpus_dir, остается для повторных запусков
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
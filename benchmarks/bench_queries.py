@@ -0,0 +1,189 @@
+"""
+Замер задержки запросов BookAnalyzer на синтетической БД.
+
+Пример:
+    python benchmarks/bench_queries.py --rows 10000 100000 --repeat 20 --output bench_queries.json
+"""
+import os
+import time
+import random
+import sqlite3
+import argparse
+import shutil
+import tempfile
+
+from common import percentile, write_results, compare_results
+
+EXTENSIONS = ('.pdf', '.epub', '.docx', '.odt')
+TITLE_WORDS = ("война мир мастер маргарита гарри поттер книга джунглей история наука математика "
+               "руководство администратор philosopher stone chamber secrets prisoner goblet").split()
+AUTHORS = ("Толстой Булгаков Роулинг Киплинг Маяковский Пушкин Чехов Достоевский Гоголь Тургенев "
+           "Rowling Kipling Tolkien Orwell Huxley").split()
+
+
+def populate(db_path, rows, preview_kb, seed=0, batch=10000):
+    """
+    Создает БД BookAnalyzer и заполняет ее синтетическими записями.\n
+    Аргументы:
+    db_path -- путь к файлу БД
+    rows -- количество записей
+    preview_kb -- средний размер превью в КБ (фактический размер от 0.5x до 1.5x)
+    seed -- начальное значение генератора
+    batch -- размер пакета вставки
+    """
+    from bookAnalyzer import BookAnalyzer
+    BookAnalyzer(db_path, reset=True)
+
+    rng = random.Random(seed)
+    # Превью -- случайные (несжимаемые) байты, как у PNG
+    preview_pool = [os.urandom(int(preview_kb * 1024 * rng.uniform(0.5, 1.5))) for _ in range(64)]
+
+    conn = sqlite3.connect(db_path)
+    for start in range(0, rows, batch):
+        data = []
+        for i in range(start, min(rows, start + batch)):
+            ext = rng.choice(EXTENSIONS)
+            title = " ".join(rng.choice(TITLE_WORDS) for _ in range(3)) + f" {i}"
+            author = rng.choice(AUTHORS) if rng.random() > 0.1 else None
+            metadata = "None" if rng.random() < 0.2 else str({'title': title, 'author': author, 'language': 'ru'})
+            data.append((title, author, ext, f"/library/part_{i // 500:05d}/book_{i:07d}{ext}",
+                         rng.randrange(10_000, 200_000_000), rng.randrange(1, 1500), rng.choice(preview_pool),
+                         metadata, 1 if rng.random() < 0.05 else 0))
+        conn.executemany("""
+            INSERT INTO books (title, author, file_ext, file_path, file_size, num_pages, preview, metadata, favorite)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, data)
+        conn.commit()
+    conn.close()
+
+
+def query_cases(db_path, rows, rng):
+    # Набор запросов: (имя, метод, аргументы); глубокие страницы -- смещение в середину таблицы
+    deep = max(0, rows // 2)
+    title = rng.choice(TITLE_WORDS)
+    author = rng.choice(AUTHORS)
+    # Путь существующей книги из трети таблицы (расширение в populate выбирается случайно)
+    conn = sqlite3.connect(db_path)
+    path = conn.execute('SELECT file_path FROM books ORDER BY id LIMIT 1 OFFSET ?', (rows // 3,)).fetchone()[0]
+    conn.close()
+    cases = [
+        ('get_all_books[page 1]', 'get_all_books', dict(limit=30, offset=0)),
+        ('get_all_books[deep page]', 'get_all_books', dict(limit=30, offset=deep)),
+        ('get_all_books[favorites]', 'get_all_books', dict(only_favorites=True, limit=30, offset=0)),
+        ('search_books_by_title', 'search_books_by_title', dict(title=title)),
+        ('search_books_by_title[favorites]', 'search_books_by_title', dict(title=title, only_favorites=True)),
+        ('search_books_by_author', 'search_books_by_author', dict(author=author)),
+        ('search_books_by_author[favorites]', 'search_books_by_author', dict(author=author, only_favorites=True)),
+        ('search_books_by_extension', 'search_books_by_extension', dict(file_ext='.odt')),
+        ('get_largest_books[top 30]', 'get_largest_books', dict(limit=30, offset=0)),
+        ('get_largest_books[deep page]', 'get_largest_books', dict(limit=30, offset=deep)),
+        ('get_largest_books[favorites]', 'get_largest_books', dict(limit=30, offset=0, only_favorites=True)),
+        ('get_books_with_most_pages[top 30]', 'get_books_with_most_pages', dict(limit=30, offset=0)),
+        ('get_recently_added_books[top 30]', 'get_recently_added_books', dict(limit=30, offset=0)),
+        ('get_books_without_author', 'get_books_without_author', dict()),
+        ('get_books_without_metadata[favorites]', 'get_books_without_metadata', dict(only_favorites=True)),
+        ('get_file_extension_statistics', 'get_file_extension_statistics', dict()),
+        ('get_book_metadata', 'get_book_metadata', dict(file_path=path)),
+        ('search_books_by_metadata', 'search_books_by_metadata', dict(metadata='language')),
+    ]
+    return cases
+
+
+def preview_paths(db_path, count, rng):
+    # Пути существующих книг для замера чтения превью
+    conn = sqlite3.connect(db_path)
+    max_id = conn.execute('SELECT MAX(id) FROM books').fetchone()[0]
+    ids = [rng.randrange(1, max_id + 1) for _ in range(count)]
+    paths = [conn.execute('SELECT file_path FROM books WHERE id = ?', (book_id,)).fetchone()[0] for book_id in ids]
+    conn.close()
+    return paths
+
+
+def measure(callable_, repeat, warmup=1):
+    # Возвращает список задержек в секундах и количество строк результата
+    result = None
+    for _ in range(warmup):
+        result = callable_()
+    timings = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        result = callable_()
+        timings.append(time.perf_counter() - started_at)
+    if result is None:
+        rows = 0
+    elif isinstance(result, list):
+        rows = len(result)
+    else:
+        rows = 1
+    return timings, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Query latency benchmark for BookAnalyzer')
+    parser.add_argument('--rows', nargs='+', type=int, default=[10_000, 100_000], help='Library sizes to test')
+    parser.add_argument('--preview_kb', type=float, default=30, help='Average preview BLOB size in KB')
+    parser.add_argument('--repeat', type=int, default=20, help='Measurements per query')
+    parser.add_argument('--only', nargs='+', help='Run only cases whose name starts with one of these')
+    parser.add_argument('--db_dir', help='Keep/reuse generated databases in this directory')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    parser.add_argument('--output', default='bench_queries.json', help='JSON file for the results')
+    parser.add_argument('--compare', help='Previous results JSON to compare p50 latency with')
+    parser.add_argument('--query_cache', action='store_true',
+                        help='Keep the query result cache on (by default SQLite latency is measured)')
+    args = parser.parse_args()
+
+    from bookAnalyzer import BookAnalyzer
+
+    db_dir = args.db_dir or tempfile.mkdtemp(prefix='bench_queries_')
+    os.makedirs(db_dir, exist_ok=True)
+    results = []
+    for rows in args.rows:
+        db_path = os.path.join(db_dir, f"books_{rows}_{args.preview_kb:g}kb.db")
+        if not os.path.exists(db_path):
+            print(f"Заполнение БД на {rows} записей...")
+            started_at = time.perf_counter()
+            populate(db_path, rows, args.preview_kb, args.seed)
+            print(f"Готово за {time.perf_counter() - started_at:.1f} с, {os.path.getsize(db_path) / 1024 ** 2:.0f} МБ")
+
+        # Без кеша результатов повторные вызовы измеряют сами запросы к SQLite
+        analyzer = BookAnalyzer(db_path) if args.query_cache else BookAnalyzer(db_path, query_cache_entries=0)
+        rng = random.Random(args.seed)
+        cases = [(name, getattr(analyzer, method), kwargs) for name, method, kwargs in query_cases(db_path, rows, rng)]
+        paths = preview_paths(db_path, args.repeat + 1, rng)
+        path_iter = iter(paths * 2)
+        cases.append(('get_book_preview_path', lambda: analyzer.get_book_preview_path(next(path_iter)), None))
+
+        print(f"\n{rows} записей:")
+        print(f"{'Запрос':<42}{'p50, мс':>10}{'p99, мс':>10}{'строк':>9}{'строк/с':>12}")
+        for name, method, kwargs in cases:
+            if args.only and not any(name.startswith(prefix) for prefix in args.only):
+                continue
+            callable_ = method if kwargs is None else (lambda method=method, kwargs=kwargs: method(**kwargs))
+            timings, result_rows = measure(callable_, args.repeat)
+            p50 = percentile(timings, 50)
+            p99 = percentile(timings, 99)
+            rows_per_sec = result_rows / p50 if p50 else None
+            results.append({
+                'rows': rows,
+                'query': name,
+                'p50_ms': p50 * 1000,
+                'p99_ms': p99 * 1000,
+                'result_rows': result_rows,
+                'rows_per_sec': rows_per_sec,
+            })
+            rows_per_sec_str = f"{rows_per_sec:.0f}" if rows_per_sec else "-"
+            print(f"{name:<42}{p50 * 1000:>10.2f}{p99 * 1000:>10.2f}{result_rows:>9}{rows_per_sec_str:>12}")
+
+    # Временные БД удаляем, сохраненные в --db_dir оставляем для повторных запусков
+    if not args.db_dir:
+        shutil.rmtree(db_dir, ignore_errors=True)
+
+    params = {key: value for key, value in vars(args).items() if key not in ('output', 'compare')}
+    write_results(args.output, 'queries', params, results)
+    if args.compare:
+        compare_results(args.compare, results, key=lambda result: f"{result['rows']}:{result['query']}",
+                        metric='p50_ms', higher_is_better=False)
+
+
+if __name__ == '__main__':
+    main()
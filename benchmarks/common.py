@@ -0,0 +1,89 @@
+import os
+import sys
+import json
+import time
+import platform
+import subprocess
+
+# Каталог проекта, чтобы импортировать bookAnalyzer при запуске из любой папки
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_DIR not in sys.path:
+    sys.path.insert(0, PROJECT_DIR)
+
+
+def git_commit():
+    # Текущий коммит, чтобы результаты разных версий можно было сравнить
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def peak_rss():
+    """
+    Пиковое потребление памяти текущего процесса и его дочерних процессов в байтах.\n
+    Возвращает:
+    Кортеж (процесс, дочерние процессы) или (None, None), если модуль resource недоступен (Windows).
+    """
+    try:
+        import resource
+    except ImportError:
+        return None, None
+    # В Linux ru_maxrss в килобайтах, в macOS -- в байтах
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale)
+
+
+def percentile(values, percent):
+    # Процентиль по отсортированному списку (без интерполяции)
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, int(round(percent / 100 * len(values))) - 1))
+    return values[index]
+
+
+def write_results(output_path, benchmark, params, results):
+    """
+    Сохраняет результаты замеров в JSON вместе с коммитом и параметрами окружения.
+    """
+    document = {
+        'benchmark': benchmark,
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'params': params,
+        'results': results,
+    }
+    with open(output_path, 'w', encoding='utf-8') as file:
+        json.dump(document, file, ensure_ascii=False, indent=2)
+    print(f"Результаты сохранены в {output_path}")
+
+
+def compare_results(old_path, results, key, metric, higher_is_better=True):
+    """
+    Печатает изменение метрики относительно сохраненного ранее файла результатов.\n
+    Аргументы:
+    old_path -- путь к JSON с прошлыми результатами
+    results -- текущие результаты (список словарей)
+    key -- функция, возвращающая ключ записи (например, режим)
+    metric -- имя сравниваемой метрики
+    higher_is_better -- больше -- лучше (скорость) или меньше -- лучше (задержка)
+    """
+    with open(old_path, encoding='utf-8') as file:
+        old = json.load(file)
+    old_results = {key(result): result for result in old['results']}
+
+    print(f"Сравнение с {old_path} (коммит {old.get('commit')}), метрика {metric}:")
+    for result in results:
+        previous = old_results.get(key(result))
+        if not previous or not previous.get(metric) or result.get(metric) is None:
+            continue
+        ratio = result[metric] / previous[metric]
+        worse = ratio < 1 if higher_is_better else ratio > 1
+        mark = " РЕГРЕССИЯ" if worse and abs(ratio - 1) > 0.1 else ""
+        print(f"  {key(result)}: {previous[metric]:.4g} -> {result[metric]:.4g} ({ratio:.2f}x){mark}")
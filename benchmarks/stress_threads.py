@@ -0,0 +1,151 @@
+"""
+Нагрузочная проверка BookAnalyzer из многих потоков: одни потоки читают (пул соединений
+только для чтения), другие переключают "избранное" и теги (общее соединение для записи).
+В конце проверяется, что ни один вызов не упал и что итоговое состояние БД совпадает
+с ожидаемым по числу переключений.
+
+Пример:
+    python benchmarks/stress_threads.py --rows 20000 --threads 16 --seconds 20
+"""
+import os
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+import threading
+import collections
+
+from common import percentile, write_results
+from bench_queries import populate, TITLE_WORDS, AUTHORS
+
+
+def read_cases(analyzer, rng, rows, paths):
+    # Запросы на чтение: (имя, функция без аргументов)
+    return [
+        ('get_all_books', lambda: analyzer.get_all_books(limit=30, offset=rng.randrange(rows))),
+        ('search_books_by_title', lambda: analyzer.search_books_by_title(rng.choice(TITLE_WORDS))),
+        ('search_books_by_author', lambda: analyzer.search_books_by_author(rng.choice(AUTHORS))),
+        ('get_largest_books', lambda: analyzer.get_largest_books(limit=30)),
+        ('get_library_totals', analyzer.get_library_totals),
+        ('get_file_extension_statistics', analyzer.get_file_extension_statistics),
+        ('get_tag_counts', analyzer.get_tag_counts),
+        ('get_book_preview_path', lambda: analyzer.get_book_preview_path(rng.choice(paths))),
+        ('get_book_metadata', lambda: analyzer.get_book_metadata(rng.choice(paths))),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Multi-threaded stress test for BookAnalyzer')
+    parser.add_argument('--rows', type=int, default=20_000, help='Library size')
+    parser.add_argument('--threads', type=int, default=16, help='Reader threads')
+    parser.add_argument('--writers', type=int, default=4, help='Writer threads')
+    parser.add_argument('--seconds', type=float, default=20, help='Test duration')
+    parser.add_argument('--pool_size', type=int, default=4, help='Read connection pool size')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    parser.add_argument('--output', default='stress_threads.json', help='JSON file for the results')
+    args = parser.parse_args()
+
+    from bookAnalyzer import BookAnalyzer
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix='stress_threads_'), 'books.db')
+    print(f"Заполнение БД на {args.rows} записей...")
+    populate(db_path, args.rows, preview_kb=4, seed=args.seed)
+    analyzer = BookAnalyzer(db_path, read_pool_size=args.pool_size)
+
+    conn = sqlite3.connect(db_path)
+    initial = dict(conn.execute('SELECT file_path, favorite FROM books'))
+    conn.close()
+    # Книги, которые переключают потоки записи (небольшой набор, чтобы потоки конкурировали за одни строки)
+    hot_paths = random.Random(args.seed).sample(sorted(initial), min(200, len(initial)))
+
+    timings = collections.defaultdict(list)
+    toggles = collections.Counter()
+    tagged = set()
+    errors = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.seconds
+
+    def reader(seed):
+        rng = random.Random(seed)
+        cases = read_cases(analyzer, rng, args.rows, hot_paths)
+        while time.perf_counter() < deadline:
+            name, call = rng.choice(cases)
+            started_at = time.perf_counter()
+            try:
+                call()
+            except Exception as e:
+                errors.append((name, repr(e)))
+            with lock:
+                timings[name].append(time.perf_counter() - started_at)
+
+    def writer(seed):
+        rng = random.Random(seed)
+        while time.perf_counter() < deadline:
+            started_at = time.perf_counter()
+            try:
+                if rng.random() < 0.8:
+                    file_path = rng.choice(hot_paths)
+                    analyzer.update_book_favorite_status(file_path)
+                    name = 'update_book_favorite_status'
+                    with lock:
+                        toggles[file_path] += 1
+                else:
+                    file_paths = rng.sample(hot_paths, 20)
+                    analyzer.tag_books(file_paths, [f"stress {seed}"])
+                    name = 'tag_books'
+                    with lock:
+                        tagged.update((file_path, f"stress {seed}") for file_path in file_paths)
+            except Exception as e:
+                errors.append(('write', repr(e)))
+                continue
+            with lock:
+                timings[name].append(time.perf_counter() - started_at)
+
+    threads = ([threading.Thread(target=reader, args=(args.seed * 1000 + i,)) for i in range(args.threads)]
+               + [threading.Thread(target=writer, args=(args.seed * 1000 + 500 + i,)) for i in range(args.writers)])
+    print(f"Потоков чтения: {args.threads}, записи: {args.writers}, {args.seconds:g} с...")
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    analyzer.close()
+
+    # Проверка итогового состояния: избранное после всех переключений, теги и сводная статистика
+    conn = sqlite3.connect(db_path)
+    final = dict(conn.execute('SELECT file_path, favorite FROM books'))
+    mismatched = [file_path for file_path, count in toggles.items()
+                  if final[file_path] != (initial[file_path] == 1) ^ (count % 2 == 1)]
+    stored_tags = set(conn.execute('''
+        SELECT b.file_path, t.name FROM book_tags bt JOIN books b ON b.id = bt.book_id JOIN tags t ON t.id = bt.tag_id
+    '''))
+    favorites = conn.execute("SELECT favorites FROM library_stats WHERE dimension = 'all'").fetchone()[0]
+    actual_favorites = conn.execute('SELECT COUNT(*) FROM books WHERE favorite = 1').fetchone()[0]
+    conn.close()
+
+    print(f"\n{'Вызов':<32}{'вызовов':>9}{'p50, мс':>10}{'p99, мс':>10}")
+    results = []
+    for name, values in sorted(timings.items()):
+        p50, p99 = percentile(values, 50), percentile(values, 99)
+        print(f"{name:<32}{len(values):>9}{p50 * 1000:>10.2f}{p99 * 1000:>10.2f}")
+        results.append({'call': name, 'calls': len(values), 'p50_ms': p50 * 1000, 'p99_ms': p99 * 1000})
+
+    checks = {
+        'errors': len(errors),
+        'favorite_mismatches': len(mismatched),
+        'missing_tags': len(tagged - stored_tags),
+        'statistics_consistent': favorites == actual_favorites,
+    }
+    print(f"\nОшибок: {checks['errors']}, расхождений избранного: {checks['favorite_mismatches']}, "
+          f"потерянных тегов: {checks['missing_tags']}, сводная статистика "
+          f"{'согласована' if checks['statistics_consistent'] else 'НЕ согласована'}")
+    for name, error in errors[:10]:
+        print(f"  {name}: {error}")
+
+    write_results(args.output, 'stress_threads', vars(args), {'calls': results, 'checks': checks})
+    ok = not errors and not mismatched and checks['missing_tags'] == 0 and checks['statistics_consistent']
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
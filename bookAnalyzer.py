@@ -4,14 +4,26 @@ import argparse
 import math
 import fitz
 import re
+import html
+import random
+import zlib
+import csv
+import json
+import time
+import queue
+import tempfile
+import threading
+import multiprocessing
+from multiprocessing.connection import wait as wait_connections
+from concurrent.futures import ThreadPoolExecutor
+from array import array
 import ebooklib #для работы с ePub-файлами
 from ebooklib import epub
 import sqlite3
 import matplotlib.pyplot as plt
 from typing import List, Tuple
 from PyPDF2 import PdfReader
-from PIL import Image, ImageDraw, ImageFont
-from pdf2image import convert_from_path
+from PIL import Image
 from docx import Document
 from docx.opc.exceptions import PackageNotFoundError
 import docx2txt
@@ -21,47 +33,428 @@ from odf import meta
 from odf import text
 from odf import teletype
 import aspose.words as aw
+import web_catalog
+import book_charts
+import text_stats
+import text_preview
+import book_facets
+import book_frames
+from book_rows import (yes_no_indicator, pretty_size, pretty_sizes, yes_no_indicators, BookRow, PagesRow,
+                       ExtensionRow, SizeRow, RecentRow, NoAuthorRow, NoMetadataRow, MetadataRow, SimilarCoverRow,
+                       DuplicateGroupRow, FailureRow, TextStatisticsRow)
+import pdf_probe
+import book_archive
+import file_hash
+import cover_hash
+import library_transfer
+from scan_checkpoint import ScanCheckpoint
+from query_cache import QueryCache, cached_query, QUERY_CACHE_ENTRIES, QUERY_CACHE_BYTES
+
+def open_pdf(source):
+    # PDF из файла или из памяти (книга внутри архива, см. book_archive)
+    if isinstance(source, io.BytesIO):
+        return fitz.open(stream=source, filetype='pdf')
+    return fitz.open(source)
+
+
+# Сколько символов текста начала книги используется для поиска похожих книг
+SAMPLE_TEXT_LENGTH = 2000
+
+# Параметры MinHash: 64 хеш-функции, разбитые на 16 полос по 4 значения (LSH)
+MINHASH_PERMUTATIONS = 64
+MINHASH_BANDS = 16
+MINHASH_ROWS = MINHASH_PERMUTATIONS // MINHASH_BANDS
+_MINHASH_PRIME = (1 << 61) - 1
+_minhash_random = random.Random(42)
+_MINHASH_COEFFS = [(_minhash_random.randrange(1, _MINHASH_PRIME), _minhash_random.randrange(0, _MINHASH_PRIME))
+                   for _ in range(MINHASH_PERMUTATIONS)]
+
+def normalize_text(value) -> str:
+    """
+    Приводит строку к виду, удобному для сравнения: нижний регистр,
+    только буквы и цифры, одиночные пробелы.\n
+    Аргументы:
+    value -- исходная строка (может быть None)\n
+    Возвращает:
+    Нормализованную строку.
+    """
+    if not value:
+        return ""
+    value = re.sub(r"[^\w]+", " ", str(value).lower().replace("ё", "е"))
+    return " ".join(value.replace("_", " ").split())
 
-def yes_no_indicator(value):
-    if value == 0:
-        return "Нет"
-    elif value == 1:
-        return "Да"
-    else:
-        return "Недопустимое значение"
+def book_signature(title, author, num_pages) -> str:
+    """
+    Строит сигнатуру книги из нормализованных названия, автора и количества страниц.\n
+    Возвращает:
+    Строку вида "название|автор|страницы".
+    """
+    pages = str(num_pages) if num_pages else ""
+    return f"{normalize_text(title)}|{normalize_text(author)}|{pages}"
 
-def pretty_size(size_bytes: int) -> str:
+def minhash_signature(sample_text, shingle_size=3):
     """
-    Конвертирует размер файла в формат, понятный человеку.\n
+    Вычисляет MinHash-сигнатуру текста по шинглам из слов.\n
     Аргументы:
-    size_bytes -- размер файла в байтах\n
+    sample_text -- текст (например, первая страница книги)
+    shingle_size -- количество слов в шингле\n
     Возвращает:
-    Строку, содержащую размер файла в формате, понятном человеку.
-    Например: "10.5 МБ", "678 КБ", "5 ГБ" и т.д.
+    Массив array('I') из MINHASH_PERMUTATIONS значений или None, если текста нет.
+    """
+    words = normalize_text(sample_text).split()
+    if not words:
+        return None
+    shingles = {zlib.crc32(" ".join(words[i:i + shingle_size]).encode('utf-8'))
+                for i in range(max(1, len(words) - shingle_size + 1))}
+    return array('I', (min(((a * h + b) % _MINHASH_PRIME) & 0xFFFFFFFF for h in shingles)
+                       for a, b in _MINHASH_COEFFS))
+
+def minhash_bands(signature):
+    # Разбиваем сигнатуру на полосы, каждая полоса хешируется в одно число (корзину)
+    for band in range(MINHASH_BANDS):
+        chunk = signature[band * MINHASH_ROWS:(band + 1) * MINHASH_ROWS]
+        yield band, zlib.crc32(chunk.tobytes())
+
+def minhash_similarity(first, second) -> float:
+    # Оценка коэффициента Жаккара по доле совпавших значений сигнатур
+    if not first or not second:
+        return 0.0
+    return sum(1 for a, b in zip(first, second) if a == b) / len(first)
+
+# Перцептивный хеш превью ищет одинаковые обложки; текстовые карточки DOCX и ODT обложками не являются
+COVER_EXTENSIONS = ('.pdf', '.epub')
+COVER_HASH_METHOD = 'dhash'
+
+def preview_cover_hash(file_path, preview):
+    # Хеш обложки в виде INTEGER SQLite (со знаком) или None, если превью нет или это не обложка
+    if not preview or not file_path.lower().endswith(COVER_EXTENSIONS):
+        return None
+    try:
+        value = cover_hash.image_hash(preview, COVER_HASH_METHOD)
+    except (OSError, ValueError):
+        # Превью, которое PIL не может прочитать
+        return None
+    return cover_hash.to_signed(value) if value is not None else None
+
+# Номер интервала гистограммы по шкале 1-2-5 (1, 2, 5, 10, 20, 50, ...): 3 интервала на каждый десятичный порядок
+_BUCKET_SQL = ("(CASE WHEN {value} IS NULL OR {value} <= 0 THEN 0 "
+               "ELSE length({value}) * 3 + (substr({value}, 1, 1) >= '2') + (substr({value}, 1, 1) >= '5') - 2 END)")
+
+# Разрезы сводной статистики: (имя, SQL-выражение ключа для строки {row} таблицы books)
+STATISTICS_DIMENSIONS = [
+    ('all', "''"),
+    ('ext', "COALESCE({row}.file_ext, '')"),
+    ('author', "COALESCE({row}.author, '')"),
+    # Каталог файла: отрезаем от пути все символы после последнего разделителя
+    ('directory', "rtrim(rtrim(replace({row}.file_path, '\\', '/'), replace(replace({row}.file_path, '\\', '/'), '/', '')), '/')"),
+    ('size_bucket', _BUCKET_SQL.format(value='{row}.file_size')),
+    ('pages_bucket', _BUCKET_SQL.format(value='{row}.num_pages')),
+]
+
+# Триггеры сводной статистики (на время массового импорта отключаются)
+STATISTICS_TRIGGERS = ('books_stats_insert', 'books_stats_delete', 'books_stats_update')
+
+# Столбцы books, от которых зависит статистика: обновление других столбцов ее не меняет
+STATISTICS_COLUMNS = ('file_ext', 'author', 'file_path', 'file_size', 'num_pages', 'favorite')
+
+def statistics_sql(row, sign):
+    # SQL для триггера: прибавить (sign=1) или вычесть (sign=-1) строку row во всех разрезах статистики
+    statements = []
+    for dimension, key in STATISTICS_DIMENSIONS:
+        statements.append(f"""
+            INSERT INTO library_stats (dimension, key, books, total_size, total_pages, favorites)
+            VALUES ('{dimension}', {key.format(row=row)}, {sign}, {sign} * COALESCE({row}.file_size, 0),
+                    {sign} * COALESCE({row}.num_pages, 0), {sign} * ({row}.favorite = 1))
+            ON CONFLICT (dimension, key) DO UPDATE SET
+                books = books + excluded.books,
+                total_size = total_size + excluded.total_size,
+                total_pages = total_pages + excluded.total_pages,
+                favorites = favorites + excluded.favorites;""")
+        if sign < 0:
+            # Опустеть может только строка, из которой вычли; удаляем ее по первичному ключу
+            statements.append(f"""
+            DELETE FROM library_stats WHERE dimension = '{dimension}' AND key = {key.format(row=row)} AND books <= 0;""")
+    return "\n".join(statements)
+
+def statistics_triggers():
+    # Определения триггеров сводной статистики {имя: SQL} (в том виде, в каком SQLite хранит их в sqlite_master)
+    changed = " OR ".join(f"OLD.{column} IS NOT NEW.{column}" for column in STATISTICS_COLUMNS)
+    return {
+        'books_stats_insert': f"""CREATE TRIGGER books_stats_insert AFTER INSERT ON books BEGIN
+            {statistics_sql('NEW', 1)}
+        END""",
+        'books_stats_delete': f"""CREATE TRIGGER books_stats_delete AFTER DELETE ON books BEGIN
+            {statistics_sql('OLD', -1)}
+        END""",
+        # Повторная обработка перезаписывает эти столбцы теми же значениями -- такие обновления пропускаются
+        'books_stats_update': f"""CREATE TRIGGER books_stats_update
+        AFTER UPDATE OF {', '.join(STATISTICS_COLUMNS)} ON books
+        WHEN {changed} BEGIN
+            {statistics_sql('OLD', -1)}
+            {statistics_sql('NEW', 1)}
+        END""",
+    }
+
+def bucket_lower_bound(bucket) -> int:
     """
-    units = ['байт', 'КБ', 'МБ', 'ГБ', 'ТБ', 'ПБ']
-    if size_bytes < 1024:
-        return f"{size_bytes:.0f} {units[0]}"
-    exp = int(math.log(size_bytes, 1024))
-    size = size_bytes / 1024 ** exp
-    size_str = f"{size:.1f}"
-    return f"{size_str} {units[exp]}"
+    Нижняя граница интервала гистограммы по его номеру (шкала 1-2-5).\n
+    Например: 1 -> 1, 2 -> 2, 3 -> 5, 4 -> 10, 5 -> 20.
+    """
+    if bucket <= 0:
+        return 0
+    digits, step = divmod(bucket - 1, 3)
+    return (1, 2, 5)[step] * 10 ** digits
+
+class StageTimer:
+    """
+    Замер длительности и объема данных этапов обработки одного файла.
+    """
+    __slots__ = ('stages', '_stage', '_started_at')
+
+    def __init__(self):
+        self.stages = {}
+        self._stage = None
+        self._started_at = time.perf_counter()
+
+    def switch(self, stage):
+        # Завершаем текущий этап и начинаем следующий
+        now = time.perf_counter()
+        if self._stage is not None:
+            self.stages.setdefault(self._stage, [0.0, 0])[0] += now - self._started_at
+        self._stage = stage
+        self._started_at = now
+
+    def add_bytes(self, stage, size):
+        self.stages.setdefault(stage, [0.0, 0])[1] += size
+
+    def finish(self):
+        # Возвращает словарь {этап: [секунды, байты]}
+        self.switch(None)
+        return self.stages
+
+
+class IngestProfile:
+    """
+    Сводка замеров обработки каталога: по каждому файлу и по форматам.
+    """
+    def __init__(self):
+        self.records = []
+
+    def add(self, file_path, file_ext, timings):
+        for stage, (duration, size) in timings.items():
+            self.records.append((file_path, file_ext, stage, duration, size))
+
+    def summary(self):
+        """
+        Агрегирует замеры по формату и этапу.\n
+        Возвращает:
+        Список кортежей (формат, этап, файлов, всего секунд, среднее мс, максимум мс, байт, МБ/с),
+        отсортированный по формату и убыванию общего времени.
+        """
+        groups = {}
+        for file_path, file_ext, stage, duration, size in self.records:
+            group = groups.setdefault((file_ext, stage), [0, 0.0, 0.0, 0])
+            group[0] += 1
+            group[1] += duration
+            group[2] = max(group[2], duration)
+            group[3] += size
+
+        rows = []
+        for (file_ext, stage), (count, total, longest, size) in groups.items():
+            speed = size / total / 1024 ** 2 if total > 0 and size else None
+            rows.append((file_ext, stage, count, total, total / count * 1000, longest * 1000, size, speed))
+        rows.sort(key=lambda row: (row[0], -row[3]))
+        return rows
+
+    def print_summary(self):
+        print(f"{'Формат':<8}{'Этап':<10}{'Файлов':>8}{'Всего, с':>11}{'Сред., мс':>11}{'Макс., мс':>11}{'Объем':>12}{'МБ/с':>9}")
+        for file_ext, stage, count, total, mean, longest, size, speed in self.summary():
+            speed_str = f"{speed:.1f}" if speed is not None else "-"
+            print(f"{file_ext:<8}{stage:<10}{count:>8}{total:>11.2f}{mean:>11.1f}{longest:>11.1f}{pretty_size(size):>12}{speed_str:>9}")
+
+    def write_trace(self, trace_path):
+        # Сохраняет замеры по каждому файлу в JSON или CSV (по расширению файла)
+        columns = ('file_path', 'file_ext', 'stage', 'seconds', 'bytes')
+        if trace_path.lower().endswith('.csv'):
+            with open(trace_path, 'w', newline='', encoding='utf-8') as file:
+                writer = csv.writer(file)
+                writer.writerow(columns)
+                writer.writerows(self.records)
+        else:
+            with open(trace_path, 'w', encoding='utf-8') as file:
+                json.dump([dict(zip(columns, record)) for record in self.records], file, ensure_ascii=False, indent=1)
+
+
+# Ограничения для обработки одного файла в отдельном процессе
+FILE_TIMEOUT = 120                      # секунд на файл
+WORKER_MEMORY_LIMIT = 4 * 1024 ** 3     # байт адресного пространства процесса
+FILES_PER_WORKER = 50                   # после стольких файлов процесс перезапускается
+
+# Соединения с БД
+READ_POOL_SIZE = 4                      # соединений только для чтения
+READ_CACHE_SIZE = 64 * 1024             # КБ кеша страниц на весь пул (делится между соединениями)
+DB_TIMEOUT = 30                         # секунд ожидания блокировки БД
+
+
+class ReadConnectionPool:
+    """
+    Пул соединений SQLite только для чтения.\n
+    Соединения открываются один раз и переиспользуются потоками, поэтому запрос не тратит
+    время на подключение к БД. Если все соединения заняты, acquire ждет освобождения.
+    """
+    def __init__(self, db_path, size, cache_size=READ_CACHE_SIZE):
+        self.connections = queue.Queue()
+        for _ in range(size):
+            conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False, timeout=DB_TIMEOUT)
+            conn.execute('PRAGMA query_only = 1')
+            conn.execute(f'PRAGMA cache_size = -{max(1, cache_size // size)}')
+            self.connections.put(conn)
+
+    def acquire(self):
+        return self.connections.get()
+
+    def release(self, conn):
+        self.connections.put(conn)
+
+    def fetch(self, query, params=()):
+        conn = self.acquire()
+        try:
+            return conn.execute(query, params).fetchall()
+        finally:
+            self.release(conn)
+
+    def close(self):
+        while not self.connections.empty():
+            self.connections.get().close()
+
 
 class BookAnalyzer:
-    def __init__(self, db_path: str, reset=False, convert_docx_to_pdf=False, convert_odt_to_pdf=False):
+    """
+    Методы можно вызывать из нескольких потоков одновременно: текущее соединение хранится
+    отдельно для каждого потока, запросы на чтение получают соединение из пула
+    (open_db(readonly=True)), а все записи идут через одно соединение, которое в каждый
+    момент принадлежит только одному потоку (open_db()).
+
+    Результаты запросов на чтение кешируются (query_cache); каждая транзакция записи,
+    изменившая данные, делает их устаревшими.
+    """
+    def __init__(self, db_path: str, reset=False, convert_docx_to_pdf=False, convert_odt_to_pdf=False, init_db=True,
+                 analyze_text=False, metadata_only=False, hash_mode='full', read_pool_size=READ_POOL_SIZE,
+                 query_cache_entries=QUERY_CACHE_ENTRIES, query_cache_bytes=QUERY_CACHE_BYTES):
         self.db_path = db_path
         self.reset = reset
         self.convert_docx_to_pdf = convert_docx_to_pdf
         self.convert_odt_to_pdf = convert_odt_to_pdf
-        self.init_database()
+        # Подсчет слов, символов и предложений по всему тексту книги (дополнительный этап обработки)
+        self.analyze_text = analyze_text
+        # Быстрый режим: только метаданные, количество страниц и хеш, без превью и текста
+        self.metadata_only = metadata_only
+        # Хеш содержимого: 'full' -- всего файла, 'sampled' -- размера и нескольких блоков (см. file_hash).
+        # Выборочный хеш не участвует в поиске точных дубликатов и в сопоставлении книг при импорте
+        self.hash_mode = hash_mode
+        self.current_stage = None
+        self.stage_callback = None
+        # Замер длительности этапов обработки (включается параметром profile в process_directory)
+        self.profile = False
+        self.stage_timer = None
+        self.last_profile = None
+        self.read_pool_size = read_pool_size
+        self.__local = threading.local()
+        self.__pool = None
+        self.__pool_lock = threading.Lock()
+        self.__writer = None
+        self.__write_lock = threading.Lock()
+        # Изменений строк соединением записи на момент последней фиксации
+        self.__writer_changes = 0
+        # Результаты запросов на чтение (query_cache_entries=0 -- без кеша)
+        self.query_cache = QueryCache(query_cache_entries, query_cache_bytes)
+        if init_db:
+            self.init_database()
+
+    @property
+    def conn(self):
+        # Соединение, открытое open_db в текущем потоке
+        return getattr(self.__local, 'conn', None)
+
+    def open_db(self, readonly=False):
+        """
+        Выдает текущему потоку соединение с БД до вызова close_db.\n
+        Аргументы:
+        readonly -- соединение из пула только для чтения; иначе -- соединение для записи,
+        которое другие потоки ждут до close_db\n
+        Возвращает:
+        Курсор соединения.
+        """
+        # Вложенный вызов потерял бы соединение вызывающего кода (а для записи -- и его транзакцию).
+        # После исключения соединение освобождает сам вызывающий код (close_db или rollback_db)
+        if self.conn is not None:
+            raise RuntimeError("Соединение с БД уже выдано этому потоку (вложенный вызов open_db)")
+
+        if readonly:
+            conn = self.__read_pool().acquire()
+        else:
+            self.__write_lock.acquire()
+            if self.__writer is None:
+                self.__writer = sqlite3.connect(self.db_path, check_same_thread=False, timeout=DB_TIMEOUT)
+            conn = self.__writer
+        self.__local.conn = conn
+        self.__local.readonly = readonly
+        return conn.cursor()
+
+    def __read_pool(self):
+        # Пул соединений для чтения создается при первом запросе
+        if self.__pool is None:
+            with self.__pool_lock:
+                if self.__pool is None:
+                    self.__pool = ReadConnectionPool(self.db_path, self.read_pool_size)
+        return self.__pool
 
-    def open_db(self):
-        self.conn = sqlite3.connect(self.db_path)
-        return self.conn.cursor()
-    
     def close_db(self):
-        self.conn.commit()
-        self.conn.close()
+        self.__release(rollback=False)
+
+    def rollback_db(self):
+        # Откатывает транзакцию и освобождает соединение текущего потока (для обработки исключений);
+        # если соединение не выдано, ничего не делает
+        if self.conn is not None:
+            self.__release(rollback=True)
+
+    def __release(self, rollback):
+        conn = self.__local.conn
+        self.__local.conn = None
+        if self.__local.readonly:
+            self.__pool.release(conn)
+            return
+        try:
+            if rollback:
+                conn.rollback()
+            else:
+                self.__commit(conn)
+        finally:
+            self.__write_lock.release()
+
+    def __commit(self, conn):
+        # Фиксирует транзакцию соединения для записи. Кеш сбрасывается после фиксации:
+        # запрос, начатый раньше, мог прочитать еще старые данные
+        conn.commit()
+        changes = conn.total_changes
+        if changes != self.__writer_changes:
+            self.query_cache.invalidate()
+        self.__writer_changes = changes
+
+    def invalidate_cache(self):
+        # Сбрасывает кеш запросов (например, после изменения БД другим процессом)
+        self.query_cache.invalidate()
+
+    def close(self):
+        # Закрывает пул чтения и соединение записи (например, при завершении сервера)
+        with self.__write_lock:
+            if self.__writer is not None:
+                self.__writer.close()
+                self.__writer = None
+        with self.__pool_lock:
+            if self.__pool is not None:
+                self.__pool.close()
+                self.__pool = None
 
     def init_database(self):
         # Создайте БД (если не существует) и определите таблицы для хранения метаданных книг и превью
@@ -71,11 +464,30 @@ class BookAnalyzer:
         # Создаем курсор для выполнения SQL-запросов
         cursor = conn.cursor()
 
+        # Режим инкрементальной очистки, чтобы освобождать место без полного VACUUM
+        # (для уже существующих БД вступает в силу после первого VACUUM в cleanup_database)
+        cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+
+        # WAL позволяет читать БД во время записи
+        cursor.execute('PRAGMA journal_mode = WAL')
+
         # Удаление таблицы в бд, если reset = True
         if self.reset:
             cursor.execute('''
                 DROP TABLE IF EXISTS books
             ''')
+            cursor.execute('''
+                DROP TABLE IF EXISTS book_minhash
+            ''')
+            cursor.execute('''
+                DROP TABLE IF EXISTS failures
+            ''')
+            cursor.execute('''
+                DROP TABLE IF EXISTS library_stats
+            ''')
+            for table in ('book_authors', 'authors', 'book_tags', 'tags', 'scan_files', 'scan_jobs', 'file_hashes',
+                          'cover_hash_bands'):
+                cursor.execute(f'DROP TABLE IF EXISTS {table}')
 
         # Создаем таблицу, если она не существует
         cursor.execute('''
@@ -89,132 +501,698 @@ class BookAnalyzer:
                 num_pages INTEGER,
                 preview BLOB,
                 metadata TEXT,
-                favorite INTEGER
+                favorite INTEGER,
+                content_hash TEXT,
+                signature TEXT,
+                minhash BLOB,
+                missing INTEGER DEFAULT 0,
+                char_count INTEGER,
+                word_count INTEGER,
+                sentence_count INTEGER,
+                script TEXT,
+                language TEXT,
+                preview_pending INTEGER DEFAULT 0,
+                cover_hash INTEGER
+            )
+        ''')
+
+        # Добавляем новые столбцы в таблицы, созданные старыми версиями программы
+        self.__add_missing_columns(cursor, 'books', {
+            'content_hash': 'TEXT',
+            'signature': 'TEXT',
+            'minhash': 'BLOB',
+            'missing': 'INTEGER DEFAULT 0',
+            'char_count': 'INTEGER',
+            'word_count': 'INTEGER',
+            'sentence_count': 'INTEGER',
+            'script': 'TEXT',
+            'language': 'TEXT',
+            'preview_pending': 'INTEGER DEFAULT 0',
+            'cover_hash': 'INTEGER',
+        })
+
+        # Полосы MinHash (LSH) для поиска похожих книг без попарного сравнения
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS book_minhash (
+                book_id INTEGER,
+                band INTEGER,
+                bucket INTEGER
+            )
+        ''')
+
+        # Части перцептивных хешей обложек для поиска похожих обложек (см. cover_hash)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS cover_hash_bands (
+                band INTEGER,
+                value INTEGER,
+                book_id INTEGER,
+                PRIMARY KEY (band, value, book_id)
+            ) WITHOUT ROWID
+        ''')
+
+        # Файлы, которые не удалось обработать
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS failures (
+                file_path TEXT PRIMARY KEY,
+                stage TEXT,
+                error TEXT,
+                duration REAL,
+                file_size INTEGER,
+                file_mtime REAL,
+                failed_at TEXT
             )
         ''')
 
+        # Задания обработки каталогов и их контрольные точки (см. scan_checkpoint)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS scan_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                directory TEXT,
+                params TEXT,
+                status TEXT,
+                walked INTEGER DEFAULT 0,
+                found INTEGER DEFAULT 0,
+                done INTEGER DEFAULT 0,
+                started_at TEXT,
+                updated_at TEXT
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS scan_files (
+                job_id INTEGER,
+                file_path TEXT,
+                done INTEGER DEFAULT 0,
+                PRIMARY KEY (job_id, file_path)
+            ) WITHOUT ROWID
+        ''')
+
+        # Кеш хешей содержимого: файл (устройство, inode) с размером и временем изменения на момент хеширования
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS file_hashes (
+                device INTEGER,
+                inode INTEGER,
+                mode TEXT,
+                size INTEGER,
+                mtime_ns INTEGER,
+                content_hash TEXT,
+                PRIMARY KEY (device, inode, mode)
+            ) WITHOUT ROWID
+        ''')
+
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_books_content_hash ON books (content_hash)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_books_signature ON books (signature)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_book_minhash_bucket ON book_minhash (band, bucket)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_book_minhash_book ON book_minhash (book_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_cover_hash_bands_book ON cover_hash_bands (book_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_books_word_count ON books (word_count)')
+        # Книги, превью которых еще не построено (частичный индекс только по таким строкам)
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_books_preview_pending ON books (id) WHERE preview_pending = 1')
+
+        self.__init_statistics(cursor)
+        self.__init_facets(cursor)
+
         # Сохраняем изменения и закрываем соединение
         conn.commit()
         conn.close()
+        # Таблицы могли быть пересозданы (reset) -- сохраненные результаты запросов не годятся
+        self.query_cache.invalidate()
+
+    def __init_statistics(self, cursor):
+        # Сводная статистика библиотеки, которую триггеры обновляют при каждом изменении таблицы books
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'library_stats'")
+        created = cursor.fetchone() is None
+        # Триггеры удаляются в одной транзакции с первым пакетом import_library и возвращаются в конце
+        # импорта. Если их нет, импорт был прерван и статистика не соответствует таблице books
+        cursor.execute(f"SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND name IN ({', '.join('?' * len(STATISTICS_TRIGGERS))})",
+                       STATISTICS_TRIGGERS)
+        existing = dict(cursor.fetchall())
+        interrupted = not created and len(existing) < len(STATISTICS_TRIGGERS)
 
-    def update_book_data(self, file_path):
-        # Создаем соединение с БД
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS library_stats (
+                dimension TEXT,
+                key,
+                books INTEGER,
+                total_size INTEGER,
+                total_pages INTEGER,
+                favorites INTEGER,
+                PRIMARY KEY (dimension, key)
+            )
+        ''')
 
-        file_ext = os.path.splitext(file_path)[1].lower()
+        # Триггеры, созданные прежними версиями (с другим текстом), пересоздаются
+        for name, sql in statistics_triggers().items():
+            if existing.get(name) != sql:
+                cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+                cursor.execute(sql)
+
+        # В уже заполненной БД (или после прерванного импорта) статистику нужно посчитать полностью
+        if created or interrupted:
+            self.__rebuild_statistics(cursor)
+
+    def __init_facets(self, cursor):
+        # Нормализованные авторы и теги книг; счетчики книг поддерживаются триггерами
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'authors'")
+        created = cursor.fetchone() is None
+
+        for entity, link, link_columns in (('authors', 'book_authors', 'author_id INTEGER, position INTEGER'),
+                                           ('tags', 'book_tags', "tag_id INTEGER, source TEXT DEFAULT 'user'")):
+            key = f"{entity[:-1]}_id"
+            cursor.execute(f'''
+                CREATE TABLE IF NOT EXISTS {entity} (
+                    id INTEGER PRIMARY KEY,
+                    name TEXT,
+                    name_key TEXT UNIQUE,
+                    books INTEGER DEFAULT 0
+                )
+            ''')
+            cursor.execute(f'''
+                CREATE TABLE IF NOT EXISTS {link} (
+                    book_id INTEGER,
+                    {link_columns},
+                    PRIMARY KEY (book_id, {key})
+                ) WITHOUT ROWID
+            ''')
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{link}_{key} ON {link} ({key}, book_id)')
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{entity}_books ON {entity} (books)')
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {link}_insert AFTER INSERT ON {link} BEGIN
+                    UPDATE {entity} SET books = books + 1 WHERE id = NEW.{key};
+                END
+            ''')
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {link}_delete AFTER DELETE ON {link} BEGIN
+                    UPDATE {entity} SET books = books - 1 WHERE id = OLD.{key};
+                    DELETE FROM {entity} WHERE id = OLD.{key} AND books <= 0;
+                END
+            ''')
+
+        # Связи удаленной книги удаляются вместе с ней
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS books_facets_delete AFTER DELETE ON books BEGIN
+                DELETE FROM book_authors WHERE book_id = OLD.id;
+                DELETE FROM book_tags WHERE book_id = OLD.id;
+            END
+        ''')
+
+        # В уже заполненной БД авторы один раз разбираются из столбца author
+        # (теги из метаданных появятся при повторной обработке файлов)
+        if created:
+            cursor.execute('SELECT id, author FROM books WHERE author IS NOT NULL')
+            for book_id, author in cursor.fetchall():
+                self.__save_authors(cursor, book_id, book_facets.split_authors(author))
+
+    @staticmethod
+    def __get_facet_id(cursor, table, name, key):
+        # id автора или тега по ключу нормализованного имени (новые добавляются)
+        cursor.execute(f'INSERT INTO {table} (name, name_key) VALUES (?, ?) ON CONFLICT (name_key) DO NOTHING', (name, key))
+        cursor.execute(f'SELECT id FROM {table} WHERE name_key = ?', (key,))
+        return cursor.fetchone()[0]
+
+    def __save_authors(self, cursor, book_id, authors):
+        cursor.execute('DELETE FROM book_authors WHERE book_id = ?', (book_id,))
+        for position, name in enumerate(authors):
+            author_id = self.__get_facet_id(cursor, 'authors', name, book_facets.name_key(name))
+            cursor.execute('INSERT OR IGNORE INTO book_authors (book_id, author_id, position) VALUES (?, ?, ?)',
+                           (book_id, author_id, position))
+
+    def __save_tags(self, cursor, book_id, tags, source='metadata'):
+        # Теги из метаданных заменяются целиком, теги пользователя сохраняются
+        if source == 'metadata':
+            cursor.execute("DELETE FROM book_tags WHERE book_id = ? AND source = 'metadata'", (book_id,))
+        for name in tags:
+            tag_id = self.__get_facet_id(cursor, 'tags', name, book_facets.tag_key(name))
+            cursor.execute('INSERT OR IGNORE INTO book_tags (book_id, tag_id, source) VALUES (?, ?, ?)',
+                           (book_id, tag_id, source))
+
+    @staticmethod
+    def __rebuild_statistics(cursor):
+        cursor.execute('DELETE FROM library_stats')
+        for dimension, key in STATISTICS_DIMENSIONS:
+            cursor.execute(f'''
+                INSERT INTO library_stats (dimension, key, books, total_size, total_pages, favorites)
+                SELECT '{dimension}', {key.format(row='books')}, COUNT(*), SUM(COALESCE(file_size, 0)),
+                       SUM(COALESCE(num_pages, 0)), SUM(favorite = 1)
+                FROM books GROUP BY 2
+            ''')
 
+    def rebuild_statistics(self):
+        # Полный пересчет сводной статистики (на случай, если данные менялись в обход триггеров)
+        cursor = self.open_db()
         try:
-            if file_ext == '.pdf':
-                with open(file_path, 'rb') as file:
-                    reader = PdfReader(file)
-                    metadata = reader.metadata
-                    num_pages = len(reader.pages)
-                    preview = self.__get_preview(file_path)
+            self.__rebuild_statistics(cursor)
+        finally:
+            self.close_db()
 
-                    # Извлечение данных о названии и авторе
-                    if metadata != None:
-                        title = metadata.get('/Title')
-                        author = metadata.get('/Author')
-                    else:
-                        title = None
-                        author = None
+    @staticmethod
+    def __add_missing_columns(cursor, table, columns):
+        # Узнаем, какие столбцы уже есть в таблице, и добавляем недостающие
+        cursor.execute(f"PRAGMA table_info({table})")
+        existing = {row[1] for row in cursor.fetchall()}
+        for name, column_type in columns.items():
+            if name not in existing:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}")
+
+    def update_book_data(self, file_path):
+        # Извлекаем данные о книге в текущем процессе и сохраняем их в БД
+        started_at = time.perf_counter()
+        cursor = None
 
-            elif file_ext == '.epub':
-                book = epub.read_epub(file_path)
-                metadata = book.metadata
-                num_pages = self.__count_generator_items(book.get_items_of_type(ebooklib.ITEM_DOCUMENT))
+        try:
+            book = self.extract_book_data(file_path)
+            # Соединение для записи занимается только на время сохранения
+            cursor = self.open_db()
+            self.__save_and_profile(cursor, book)
+        except Exception as e:
+            print(f"Ошибка в работе с файлом {file_path}. Причина: {e}")
+            # Частично записанные данные книги отменяются, сбой записывается отдельной транзакцией
+            self.rollback_db()
+            cursor = self.open_db()
+            self.record_failure(cursor, file_path, self.current_stage, str(e), time.perf_counter() - started_at)
+        finally:
+            # Сохраняем изменения и освобождаем соединение
+            if cursor is not None:
+                self.close_db()
+
+    def __set_stage(self, stage):
+        # Отмечаем текущий этап обработки файла (нужно для отчета о сбоях и замера времени)
+        self.current_stage = stage
+        if self.stage_callback is not None:
+            self.stage_callback(stage)
+        if self.stage_timer is not None:
+            self.stage_timer.switch(stage)
+
+    def __add_stage_bytes(self, stage, size):
+        # Объем данных, действительно прочитанных или обработанных на этапе (для МБ/с в профиле)
+        if self.stage_timer is not None:
+            self.stage_timer.add_bytes(stage, size)
+
+    def extract_book_data(self, file_path):
+        """
+        Извлекает данные о книге из файла, не обращаясь к БД.\n
+        Аргументы:
+        file_path -- путь к файлу книги\n
+        Возвращает:
+        Словарь со столбцами таблицы books (metadata уже преобразованы в строку).
+        """
+        file_ext = os.path.splitext(file_path)[1].lower()
+        self.stage_timer = StageTimer() if self.profile else None
+        self.__set_stage('open')
+        # Книга внутри архива читается в память целиком, каждая библиотека получает свой файловый объект
+        data = book_archive.read_member(file_path) if book_archive.is_member(file_path) else None
+        # Обычный файл на этом этапе не читается, поэтому объем учитывается только для книги из архива
+        self.__add_stage_bytes('open', len(data) if data is not None else 0)
+
+        def source():
+            return book_archive.open_source(file_path, data)
+
+        full_text = None
+        book = None
+        language = None
+        # В режиме metadata_only превью и текст не извлекаются
+        preview = None
+        sample_text = ""
+        # Все авторы (если формат хранит их по отдельности) и ключевые слова для тегов
+        creators = None
+        keywords = []
+
+        if file_ext == '.pdf':
+            self.__set_stage('metadata')
+            try:
+                # Быстрый путь: таблица xref, /Pages /Count и /Info без разбора дерева страниц
+                num_pages, metadata = pdf_probe.probe_pdf(file_path) if data is None else pdf_probe.probe_pdf_data(data)
+            except pdf_probe.PdfProbeError:
+                # Поврежденный или нестандартный файл -- полный разбор
+                reader = PdfReader(source())
+                metadata = reader.metadata
+                self.__set_stage('pages')
+                num_pages = len(reader.pages)
+            if not self.metadata_only:
+                self.__set_stage('preview')
+                preview = self.__get_preview(source())
+                self.__set_stage('text')
+                sample_text = self.__get_pdf_sample_text(source())
+
+            # Извлечение данных о названии и авторе
+            if metadata != None:
+                title = metadata.get('/Title')
+                author = metadata.get('/Author')
+                keywords = [metadata.get('/Keywords')]
+            else:
+                title = None
+                author = None
+
+        elif file_ext == '.epub':
+            book = epub.read_epub(source())
+            self.__set_stage('metadata')
+            metadata = book.metadata
+            self.__set_stage('pages')
+            num_pages = self.__count_generator_items(book.get_items_of_type(ebooklib.ITEM_DOCUMENT))
+            if not self.metadata_only:
+                self.__set_stage('preview')
                 preview = self.__get_epub_cover(book)
+                self.__set_stage('text')
+                sample_text = self.__get_epub_sample_text(book)
+
+            # Извлечение данных о названии и авторе
+            dc_metadata = metadata.get('http://purl.org/dc/elements/1.1/')
+            title = dc_metadata['title'][0][0] if dc_metadata and 'title' in dc_metadata else None
+            author = dc_metadata['creator'][0][0] if dc_metadata and 'creator' in dc_metadata else None
+            language = dc_metadata['language'][0][0] if dc_metadata and 'language' in dc_metadata else None
+            if dc_metadata:
+                creators = [creator[0] for creator in dc_metadata.get('creator', ())]
+                keywords = [subject[0] for subject in dc_metadata.get('subject', ())]
+
+        elif file_ext == '.docx':
+            if not self.metadata_only:
+                self.__set_stage('text')
+                full_text = docx2txt.process(source())
+                sample_text = full_text[:SAMPLE_TEXT_LENGTH]
+            if self.convert_docx_to_pdf:
+                self.__set_stage('convert')
+                metadata, num_pages, preview, title, author = self.__convert_to_pdf(source())
+                keywords = [metadata.get('/Keywords')] if metadata else []
+            else:
+                self.__set_stage('metadata')
+                document = Document(source())
+                # Заголовок файла будет использоваться как название
+                title = document.core_properties.title or os.path.splitext(os.path.basename(file_path))[0]
+                # Информация об авторе
+                author = document.core_properties.author
+                language = document.core_properties.language
+                keywords = [document.core_properties.keywords, document.core_properties.category]
+                # Количество страниц в docx файлах обычно не доступно
+                self.__set_stage('pages')
+                num_pages = self.__count_pages_docx(source())
+                # Метаданные из core_properties
+                metadata = {
+                    'author': document.core_properties.author,
+                    'title': document.core_properties.title,
+                    'subject': document.core_properties.subject,
+                    'keywords': document.core_properties.keywords,
+                    'last_modified_by': document.core_properties.last_modified_by,
+                    'created': document.core_properties.created,
+                    'modified': document.core_properties.modified,
+                    'category': document.core_properties.category,
+                    'comments': document.core_properties.comments,
+                    'content_status': document.core_properties.content_status,
+                    'identifier': document.core_properties.identifier,
+                    'language': document.core_properties.language,
+                    'version': document.core_properties.version,
+                    'last_printed': document.core_properties.last_printed,
+                    'revision': document.core_properties.revision,
+                }
+                if not self.metadata_only:
+                    self.__set_stage('preview')
+                    preview = self.__get_docx_preview(source())
+
+        elif file_ext == '.odt':
+            if not self.metadata_only:
+                self.__set_stage('text')
+                full_text = self.__get_odt_text(source())
+                sample_text = full_text[:SAMPLE_TEXT_LENGTH]
+            if self.convert_odt_to_pdf:
+                self.__set_stage('convert')
+                metadata, num_pages, preview, title, author = self.__convert_to_pdf(source())
+                keywords = [metadata.get('/Keywords')] if metadata else []
+            else:
+                # Извлечение метаданных из файла odt без преобразования в pdf
+                metadata = None
+                num_pages = None
+                title = None
+                author = None
+                if not self.metadata_only:
+                    self.__set_stage('preview')
+                    preview = self.__get_odt_preview(source())
 
-                # Извлечение данных о названии и авторе
-                dc_metadata = metadata.get('http://purl.org/dc/elements/1.1/')
-                title = dc_metadata['title'][0][0] if dc_metadata and 'title' in dc_metadata else None
-                author = dc_metadata['creator'][0][0] if dc_metadata and 'creator' in dc_metadata else None
-            
-            elif file_ext == '.docx':
-                if self.convert_docx_to_pdf:
-                    metadata, num_pages, preview, title, author = self.__convert_to_pdf(file_path)
-                else:
-                    document = Document(file_path)
-                    # Заголовок файла будет использоваться как название
-                    title = document.core_properties.title or os.path.splitext(os.path.basename(file_path))[0]
-                    # Информация об авторе
-                    author = document.core_properties.author
-                    # Количество страниц в docx файлах обычно не доступно
-                    num_pages = self.__count_pages_docx(file_path)
-                    # Метаданные из core_properties
-                    metadata = {
-                        'author': document.core_properties.author,
-                        'title': document.core_properties.title,
-                        'subject': document.core_properties.subject,
-                        'keywords': document.core_properties.keywords,
-                        'last_modified_by': document.core_properties.last_modified_by,
-                        'created': document.core_properties.created,
-                        'modified': document.core_properties.modified,
-                        'category': document.core_properties.category,
-                        'comments': document.core_properties.comments,
-                        'content_status': document.core_properties.content_status,
-                        'identifier': document.core_properties.identifier,
-                        'language': document.core_properties.language,
-                        'version': document.core_properties.version,
-                        'last_printed': document.core_properties.last_printed,
-                        'revision': document.core_properties.revision,
-                    }
-                    preview = self.__get_docx_preview(file_path)
-            elif file_ext == '.odt':
-                if self.convert_odt_to_pdf:
-                    metadata, num_pages, preview, title, author = self.__convert_to_pdf(file_path)
-                else:
-                    # Извлечение метаданных из файла odt без преобразования в pdf
-                    metadata = None
-                    num_pages = None
-                    title = None
-                    author = None
-                    preview = self.__get_odt_preview(file_path)
-                
-
-            # Если в метаданных нет названия, используем имя файла без расширения
-            if not title:
-                title = os.path.splitext(os.path.basename(file_path))[0]
-
-            # Извлечение размера файла
-            file_size = os.path.getsize(file_path)
-
-            # Проверяем, есть ли уже книга в БД
-            cursor.execute('SELECT * FROM books WHERE file_path = ?', (file_path,))
-            row = cursor.fetchone()
+        else:
+            raise ValueError(f"Неподдерживаемый тип файла: {file_ext}")
+
+        # Если в метаданных нет названия, используем имя файла без расширения
+        if not title:
+            title = os.path.splitext(os.path.basename(file_path))[0]
+
+        # Извлечение размера файла (для книги из архива -- распакованного элемента)
+        file_size = os.path.getsize(file_path) if data is None else len(data)
+
+        # Данные для поиска дубликатов: хеш содержимого, сигнатура и MinHash первой страницы
+        self.__set_stage('hash')
+        content_hash, hash_key = self.__get_content_hash(file_path, data)
+        signature = book_signature(title, author, num_pages)
+        minhash = minhash_signature(sample_text)
+        cover = preview_cover_hash(file_path, preview)
+
+        # Статистика всего текста книги (текст читается по страницам или документам)
+        text_statistics = {}
+        if self.analyze_text and not self.metadata_only:
+            self.__set_stage('analyze')
+            text_statistics = text_stats.analyze_text(self.__iter_text(source(), file_ext, book, full_text))
+
+        timings = None
+        if self.stage_timer is not None:
+            self.stage_timer.add_bytes('analyze', text_statistics.get('char_count', 0))
+            self.stage_timer.add_bytes('encode', len(preview) if preview else 0)
+            timings = self.stage_timer.finish()
+            self.stage_timer = None
+
+        return {
+            'file_path': file_path,
+            'title': title,
+            'author': author,
+            'file_ext': file_ext,
+            'file_size': file_size,
+            'metadata': str(metadata),
+            'num_pages': num_pages,
+            'preview': preview,
+            'content_hash': content_hash,
+            'hash_key': hash_key,
+            'hash_mode': self.hash_mode,
+            'signature': signature,
+            'minhash': minhash.tobytes() if minhash else None,
+            'cover_hash': cover,
+            'char_count': text_statistics.get('char_count'),
+            'word_count': text_statistics.get('word_count'),
+            'sentence_count': text_statistics.get('sentence_count'),
+            'script': text_statistics.get('script'),
+            'language': language,
+            'authors': book_facets.split_authors(creators or author),
+            'tags': book_facets.split_tags(*keywords),
+            'metadata_only': self.metadata_only,
+            'timings': timings,
+        }
 
-            if row is None:
-                # Если книги нет в БД, добавляем ее
-                # Выполняем запрос к базе данных
+    def save_book_data(self, cursor, book):
+        # Сохраняет данные, полученные из extract_book_data, в БД (без commit)
+        self.__set_stage('db')
+        file_path = book['file_path']
 
-                # Подготавливаем данные для вставки
-                data = (file_path, title, author, file_size, str(metadata), num_pages, preview, file_ext, 0)
+        # Проверяем, есть ли уже книга в БД
+        cursor.execute('SELECT id FROM books WHERE file_path = ?', (file_path,))
+        row = cursor.fetchone()
 
-                cursor.execute("""
-                    INSERT OR REPLACE INTO books (file_path, title, author, file_size, metadata, num_pages, preview, file_ext, favorite)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """, data)
-            else:
-                # Если книга уже есть в БД, обновляем ее
+        if row is None:
+            # Если книги нет в БД, добавляем ее
+            # Подготавливаем данные для вставки
+            # В режиме metadata_only превью строится позже (PreviewQueue или get_book_preview_path)
+            preview_pending = 1 if book.get('metadata_only') and book['preview'] is None else 0
+            data = (file_path, book['title'], book['author'], book['file_size'], book['metadata'], book['num_pages'],
+                    book['preview'], book['file_ext'], 0, book['content_hash'], book['signature'], book['minhash'],
+                    book['char_count'], book['word_count'], book['sentence_count'], book['script'], book['language'],
+                    preview_pending, book.get('cover_hash'))
+
+            cursor.execute("""
+                INSERT OR REPLACE INTO books (file_path, title, author, file_size, metadata, num_pages, preview, file_ext, favorite,
+                                              content_hash, signature, minhash, char_count, word_count, sentence_count, script, language,
+                                              preview_pending, cover_hash)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, data)
+            book_id = cursor.lastrowid
+        else:
+            # Если книга уже есть в БД, обновляем ее
+            book_id = row[0]
 
-                # Подготавливаем данные для вставки
-                data = (title, author, file_size, str(metadata), num_pages, preview, file_ext, 0, file_path)
+            # Подготавливаем данные для вставки
+            data = (book['title'], book['author'], book['file_size'], book['metadata'], book['num_pages'], book['preview'],
+                    book['file_ext'], 0, book['content_hash'], book['signature'], book['minhash'],
+                    book['char_count'], book['word_count'], book['sentence_count'], book['script'], book['language'],
+                    book.get('cover_hash'), file_path)
+
+            # Если текст не анализировался, ранее посчитанная статистика текста сохраняется,
+            # а в режиме metadata_only -- еще и превью с MinHash и хешем обложки
+            kept = "COALESCE(?, {})" if book.get('metadata_only') else "?"
+            preview_pending = "(preview IS NULL)" if book.get('metadata_only') else "0"
+            cursor.execute(f'''
+                UPDATE books SET title = ?, author = ?, file_size = ?, metadata = ?, num_pages = ?, preview = {kept.format('preview')},
+                                 file_ext = ?, favorite = ?, content_hash = ?, signature = ?, minhash = {kept.format('minhash')}, missing = 0,
+                                 char_count = COALESCE(?, char_count), word_count = COALESCE(?, word_count),
+                                 sentence_count = COALESCE(?, sentence_count), script = COALESCE(?, script), language = ?,
+                                 preview_pending = {preview_pending}, cover_hash = {kept.format('cover_hash')}
+                WHERE file_path = ?
+            ''', data)
 
+        # Обновляем полосы MinHash книги (в режиме metadata_only MinHash не вычисляется, прежние полосы остаются)
+        if book['minhash'] or not book.get('metadata_only'):
+            cursor.execute('DELETE FROM book_minhash WHERE book_id = ?', (book_id,))
+        if book['minhash']:
+            minhash = array('I', book['minhash'])
+            cursor.executemany('INSERT INTO book_minhash (book_id, band, bucket) VALUES (?, ?, ?)',
+                               [(book_id, band, bucket) for band, bucket in minhash_bands(minhash)])
+
+        # Части хеша обложки (как и полосы MinHash, в режиме metadata_only прежние остаются)
+        if book.get('cover_hash') is not None or not book.get('metadata_only'):
+            self.__save_cover_bands(cursor, book_id, book.get('cover_hash'))
+
+        # Запоминаем хеш файла, чтобы не вычислять его повторно, пока файл не изменится
+        if book.get('hash_key') and book['content_hash']:
+            device, inode, size, mtime_ns = book['hash_key']
+            cursor.execute('''
+                INSERT OR REPLACE INTO file_hashes (device, inode, mode, size, mtime_ns, content_hash)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (device, inode, book.get('hash_mode', 'full'), size, mtime_ns, book['content_hash']))
+
+        # Нормализованные авторы и теги из метаданных
+        authors = book.get('authors')
+        self.__save_authors(cursor, book_id, authors if authors is not None else book_facets.split_authors(book['author']))
+        self.__save_tags(cursor, book_id, book.get('tags') or [])
+
+        # Файл успешно обработан, убираем его из списка сбоев
+        cursor.execute('DELETE FROM failures WHERE file_path = ?', (file_path,))
+
+    def __save_and_profile(self, cursor, book):
+        # Сохраняем книгу и, если включен замер, учитываем время записи в БД
+        if self.last_profile is None or book.get('timings') is None:
+            self.save_book_data(cursor, book)
+            return
+        started_at = time.perf_counter()
+        self.save_book_data(cursor, book)
+        timings = book['timings']
+        timings['db'] = [time.perf_counter() - started_at,
+                         len(book['preview'] or b'') + len(book['metadata'] or '') + len(book['minhash'] or b'')]
+        self.last_profile.add(book['file_path'], book['file_ext'], timings)
+
+    @staticmethod
+    def record_failure(cursor, file_path, stage, error, duration):
+        # Запоминаем сбой вместе с размером и временем изменения файла,
+        # чтобы не обрабатывать файл повторно, пока он не изменится
+        try:
+            # Для книги из архива -- размер и время изменения архива
+            file_size, file_mtime = book_archive.source_stat(file_path)
+        except OSError:
+            file_size, file_mtime = None, None
+
+        cursor.execute('''
+            INSERT OR REPLACE INTO failures (file_path, stage, error, duration, file_size, file_mtime, failed_at)
+            VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ''', (file_path, stage, error, duration, file_size, file_mtime))
+
+    def __get_content_hash(self, file_path, data=None):
+        # Хеш содержимого файла и ключ кеша хешей (None для книги из архива, которая уже в памяти).
+        # Неизменившийся файл (тот же inode, размер и время изменения) повторно не хешируется
+        if data is not None:
+            self.__add_stage_bytes('hash', file_hash.hashed_size(len(data), self.hash_mode))
+            return file_hash.hash_buffer(data, self.hash_mode), None
+        stat = os.stat(file_path)
+        key = file_hash.stat_key(stat)
+        if key is not None:
+            cursor = self.open_db(readonly=True)
+            try:
                 cursor.execute('''
-                    UPDATE books SET title = ?, author = ?, file_size = ?, metadata = ?, num_pages = ?, preview = ?, file_ext = ?, favorite = ?
-                    WHERE file_path = ?
-                ''', data)
-        except Exception as e:
-            print(f"Ошибка в работе с файлом {file_path}. Причина: {e}")
-        
-        # Сохраняем изменения и закрываем соединение
-        conn.commit()
-        conn.close()
+                    SELECT content_hash FROM file_hashes
+                    WHERE device = ? AND inode = ? AND mode = ? AND size = ? AND mtime_ns = ?
+                ''', (key[0], key[1], self.hash_mode, key[2], key[3]))
+                row = cursor.fetchone()
+            finally:
+                self.close_db()
+            if row is not None:
+                return row[0], key
+        self.__add_stage_bytes('hash', file_hash.hashed_size(stat.st_size, self.hash_mode))
+        return file_hash.hash_file(file_path, self.hash_mode), key
+
+    @staticmethod
+    def __get_pdf_sample_text(source):
+        # Текст первых страниц PDF (пока не наберется SAMPLE_TEXT_LENGTH символов)
+        sample = ""
+        with open_pdf(source) as doc:
+            for page in doc:
+                sample += page.get_text() + "\n"
+                if len(sample) >= SAMPLE_TEXT_LENGTH:
+                    break
+        return sample[:SAMPLE_TEXT_LENGTH]
+
+    @staticmethod
+    def __get_epub_sample_text(book):
+        # Текст первых документов ePub без HTML-тегов
+        sample = ""
+        for item in book.get_items_of_type(ebooklib.ITEM_DOCUMENT):
+            content = item.get_content().decode('utf-8', errors='ignore')
+            sample += re.sub(r"<[^>]+>", " ", content)
+            if len(normalize_text(sample)) >= SAMPLE_TEXT_LENGTH:
+                break
+        return sample[:SAMPLE_TEXT_LENGTH * 4]
 
-    def __get_preview(self, book_path: str) -> bytes:
+    @staticmethod
+    def __iter_text(source, file_ext, book=None, full_text=None):
+        # Текст книги по частям: PDF -- по страницам, ePub -- по документам, DOCX и ODT -- целиком
+        if full_text is not None:
+            yield full_text
+        elif file_ext == '.pdf':
+            with open_pdf(source) as doc:
+                for page in doc:
+                    yield page.get_text()
+        elif file_ext == '.epub':
+            for item in book.get_items_of_type(ebooklib.ITEM_DOCUMENT):
+                content = item.get_content().decode('utf-8', errors='ignore')
+                yield html.unescape(re.sub(r"<[^>]+>", " ", content))
+
+    @staticmethod
+    def __get_odt_text(source):
+        doc = load(source)
+        return "\n".join(teletype.extractText(p) for p in doc.getElementsByType(text.P))
+
+    def extract_preview(self, file_path):
+        """
+        Строит превью книги отдельно от остальных данных (для превью, отложенных в режиме metadata_only).\n
+        Аргументы:
+        file_path -- путь к файлу книги\n
+        Возвращает:
+        Изображение превью в виде байтов или None.
+        """
+        file_ext = os.path.splitext(file_path)[1].lower()
+        self.__set_stage('preview')
+        data = book_archive.read_member(file_path) if book_archive.is_member(file_path) else None
+        source = book_archive.open_source(file_path, data)
+        if file_ext == '.pdf':
+            return self.__get_preview(source)
+        if file_ext == '.epub':
+            return self.__get_epub_cover(epub.read_epub(source))
+        if file_ext == '.docx':
+            return self.__get_docx_preview(source)
+        if file_ext == '.odt':
+            return self.__get_odt_preview(source)
+        raise ValueError(f"Неподдерживаемый тип файла: {file_ext}")
+
+    @staticmethod
+    def store_preview(cursor, file_path, preview):
+        # Сохраняет отложенное превью и хеш обложки (без commit)
+        cover = preview_cover_hash(file_path, preview)
+        cursor.execute('UPDATE books SET preview = ?, preview_pending = 0, cover_hash = ? WHERE file_path = ?',
+                       (preview, cover, file_path))
+        cursor.execute('SELECT id FROM books WHERE file_path = ?', (file_path,))
+        row = cursor.fetchone()
+        if row is not None:
+            BookAnalyzer.__save_cover_bands(cursor, row[0], cover)
+
+    @staticmethod
+    def __save_cover_bands(cursor, book_id, cover):
+        # Заменяет части хеша обложки книги в индексе cover_hash_bands
+        cursor.execute('DELETE FROM cover_hash_bands WHERE book_id = ?', (book_id,))
+        if cover is not None:
+            cursor.executemany('INSERT INTO cover_hash_bands (band, value, book_id) VALUES (?, ?, ?)',
+                               [(band, value, book_id) for band, value in cover_hash.hash_bands(cover)])
+
+    def __get_preview(self, book_path) -> bytes:
         # Возвращает изображение превью (скриншот 1-й страницы) книги в виде байтов
-        doc = fitz.open(book_path)
+        doc = open_pdf(book_path)
         page = doc[0]  # Возьмем первую страницу
 
         # Рендерим страницу в изображение
@@ -222,6 +1200,7 @@ class BookAnalyzer:
         image = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
 
         # Конвертируем PIL Image в bytes
+        self.__set_stage('encode')
         byte_arr = io.BytesIO()
         image.save(byte_arr, format='PNG')
         return byte_arr.getvalue()
@@ -248,6 +1227,7 @@ class BookAnalyzer:
 
         # Преобразование обложки в байты
         cover_image = Image.open(io.BytesIO(cover_item.get_content()))
+        self.__set_stage('encode')
         byte_arr = io.BytesIO()
         cover_image.save(byte_arr, format='PNG')
         return byte_arr.getvalue()
@@ -257,21 +1237,13 @@ class BookAnalyzer:
         text = docx2txt.process(docx_file_path)
         return text.count('\f')  # '\f' является символом подачи формы, представляющим разрывы страниц
     
-    def __get_docx_preview(self, file_path: str) -> bytes:
+    def __get_docx_preview(self, file_path) -> bytes:
         # Возвращает изображение превью (первые несколько параграфов) документа в виде байтов
         text = docx2txt.process(file_path)
-        lines = text.split('\n')[:10]  # Берем первые 10 строк текста
-        
+
         # Генерируем изображение из текста
-        font = ImageFont.truetype('arial', 15)
-        img = Image.new('RGB', (500, 200), color=(73, 109, 137))
-        d = ImageDraw.Draw(img)
-        for i, line in enumerate(lines):
-            d.text((10, 10 + i*15), line, fill=(255, 255, 0), font=font)
-        
-        byte_arr = io.BytesIO()
-        img.save(byte_arr, format='PNG')
-        return byte_arr.getvalue()
+        self.__set_stage('encode')
+        return text_preview.render_text_card(text)
     
     @staticmethod
     def extract_odt_metadata(file_path):
@@ -317,26 +1289,15 @@ class BookAnalyzer:
         
         return metadata
     
-    @staticmethod
-    def __get_odt_preview(file_path):
+    def __get_odt_preview(self, file_path):
         # Загружаем документ
         doc = load(file_path)
         # Извлекаем текст из каждого элемента 'P' и объединяем их с новыми строками
         all_text = "\n".join(teletype.extractText(p) for p in doc.getElementsByType(text.P))
-        # Берем первые 10 строк текста
-        lines = all_text.split('\n')[:10]
-        
+
         # Генерируем изображение из текста
-        font = ImageFont.truetype('arial', 15)
-        img = Image.new('RGB', (500, 200), color=(73, 109, 137))
-        d = ImageDraw.Draw(img)
-        for i, line in enumerate(lines):
-            d.text((10, 10 + i*15), line, fill=(255, 255, 0), font=font)
-        
-        # Преобразуем изображение в байты
-        byte_arr = io.BytesIO()
-        img.save(byte_arr, format='PNG')
-        return byte_arr.getvalue()
+        self.__set_stage('encode')
+        return text_preview.render_text_card(all_text)
     
     @staticmethod
     def __count_generator_items(generator):
@@ -345,35 +1306,38 @@ class BookAnalyzer:
     def __convert_to_pdf(self, file_path):
         # создаем объект Document и загружаем файл
         doc = aw.Document(file_path)
-        file_pdf = "Output.pdf"
-        # сохраняем документ в формате pdf
-        doc.save(file_pdf, aw.SaveFormat.PDF)
-        reader = PdfReader(file_pdf)
-        metadata = reader.metadata
-        num_pages = len(reader.pages)
-        preview = self.__get_preview(file_pdf)
-        # Извлечение данных о названии и авторе
-        try:
-            title = metadata.get('/Title')
-            author = metadata.get('/Author')
-        except Exception as e:
-            title = os.path.splitext(os.path.basename(file_pdf))[0]
-            author = None
-            
-        os.remove(file_pdf)
+        # Временный файл с уникальным именем, чтобы параллельные процессы не мешали друг другу
+        fd, file_pdf = tempfile.mkstemp(suffix='.pdf')
+        os.close(fd)
+        try:
+            # сохраняем документ в формате pdf
+            doc.save(file_pdf, aw.SaveFormat.PDF)
+            reader = PdfReader(file_pdf)
+            metadata = reader.metadata
+            num_pages = len(reader.pages)
+            preview = self.__get_preview(file_pdf)
+            # Извлечение данных о названии и авторе (если их нет, название возьмется из имени исходного файла)
+            try:
+                title = metadata.get('/Title')
+                author = metadata.get('/Author')
+            except Exception as e:
+                title = None
+                author = None
+        finally:
+            os.remove(file_pdf)
         return metadata, num_pages, preview, title, author
 
     
     def __get_all_previews(self):
         # Создаем соединение с БД
-        cursor = self.open_db()
-
-        # Получаем все превью из БД
-        cursor.execute('SELECT title, preview FROM books')
-        previews = cursor.fetchall()
-
-        # Закрываем соединение
-        self.close_db()
+        cursor = self.open_db(readonly=True)
+        try:
+            # Получаем все превью из БД
+            cursor.execute('SELECT title, preview FROM books')
+            previews = cursor.fetchall()
+        finally:
+            # Закрываем соединение
+            self.close_db()
 
         # Возвращаем список кортежей вида (название книги, превью)
         return previews
@@ -394,37 +1358,488 @@ class BookAnalyzer:
             plt.axis('off')
             plt.show()
     
-    def process_directory(self, directory, file_types, exclude, max_depth = 5, current_depth=0, convert_odt_to_pdf=None, convert_docx_to_pdf=None):
+    def process_directory(self, directory, file_types, exclude, max_depth = 5, current_depth=0, convert_odt_to_pdf=None, convert_docx_to_pdf=None,
+                          workers=None, timeout=FILE_TIMEOUT, memory_limit=WORKER_MEMORY_LIMIT, files_per_worker=FILES_PER_WORKER,
+                          profile=False, trace_path=None, analyze_text=None, metadata_only=None, checkpoint=True, scan_archives=True,
+                          hash_mode=None):
         if convert_odt_to_pdf is not None:
             self.convert_odt_to_pdf = convert_odt_to_pdf
         if convert_docx_to_pdf is not None:
             self.convert_docx_to_pdf = convert_docx_to_pdf
+        if analyze_text is not None:
+            self.analyze_text = analyze_text
+        if metadata_only is not None:
+            self.metadata_only = metadata_only
+        if hash_mode is not None:
+            self.hash_mode = hash_mode
+
         # Обработка каталога (рекурсивно), обновление информации о книгах в БД
+        file_paths = self.__collect_files(directory, file_types, exclude, max_depth, current_depth, scan_archives)
+        scan = None
+        if checkpoint:
+            # Задание с контрольными точками, чтобы прерванную обработку можно было продолжить (resume_scan)
+            cursor = self.open_db()
+            try:
+                scan = ScanCheckpoint.create(cursor, {
+                    'directory': directory,
+                    'file_types': list(file_types),
+                    'exclude': list(exclude),
+                    'max_depth': max_depth,
+                    'current_depth': current_depth,
+                    'scan_archives': scan_archives,
+                    'convert_odt_to_pdf': self.convert_odt_to_pdf,
+                    'convert_docx_to_pdf': self.convert_docx_to_pdf,
+                    'analyze_text': self.analyze_text,
+                    'metadata_only': self.metadata_only,
+                    'hash_mode': self.hash_mode,
+                })
+            finally:
+                self.close_db()
+            file_paths = scan.track(file_paths)
+        return self.__run_scan(file_paths, scan, workers, timeout, memory_limit, files_per_worker, profile, trace_path)
+
+    def get_unfinished_scan(self):
+        """
+        Возвращает последнее прерванное задание обработки каталога.\n
+        Возвращает:
+        Словарь (id, directory, found, done, walked, started_at, updated_at) или None.
+        """
+        cursor = self.open_db(readonly=True)
+        try:
+            cursor.execute("""
+                SELECT id, directory, found, done, walked, started_at, updated_at FROM scan_jobs
+                WHERE status = 'running' ORDER BY id DESC LIMIT 1
+            """)
+            row = cursor.fetchone()
+        finally:
+            self.close_db()
+
+        if row is None:
+            return None
+        return dict(zip(('id', 'directory', 'found', 'done', 'walked', 'started_at', 'updated_at'), row))
+
+    def resume_scan(self, job_id=None, workers=None, timeout=FILE_TIMEOUT, memory_limit=WORKER_MEMORY_LIMIT,
+                    files_per_worker=FILES_PER_WORKER, profile=False, trace_path=None):
+        """
+        Продолжает прерванную обработку каталога с теми же параметрами.\n
+        Обработанные файлы повторно не извлекаются; если обход каталога был завершен,
+        каталог не обходится заново.\n
+        Аргументы:
+        job_id -- id задания (None -- последнее прерванное)
+        workers, timeout, memory_limit, files_per_worker, profile, trace_path -- как в process_directory\n
+        Возвращает:
+        Профиль обработки (IngestProfile) или None.
+        """
+        cursor = self.open_db()
+        try:
+            scan = ScanCheckpoint.load(cursor, job_id)
+            if scan is None:
+                raise ValueError("Нет прерванной обработки каталога")
+            params = scan.params
+            self.convert_odt_to_pdf = params['convert_odt_to_pdf']
+            self.convert_docx_to_pdf = params['convert_docx_to_pdf']
+            self.analyze_text = params['analyze_text']
+            self.metadata_only = params['metadata_only']
+            self.hash_mode = params.get('hash_mode', 'full')
+            if scan.walked:
+                file_paths = scan.pending_paths(cursor)
+            else:
+                # Обход не был завершен: каталог обходится заново, обработанные файлы пропускаются
+                completed = scan.completed_paths(cursor)
+                walk = self.__collect_files(params['directory'], params['file_types'], params['exclude'],
+                                            params['max_depth'], params['current_depth'], params.get('scan_archives', True))
+                file_paths = (file_path for file_path in scan.track(walk) if file_path not in completed)
+        finally:
+            self.close_db()
+        print(f"Продолжение обработки {params['directory']} (задание {scan.job_id})")
+        return self.__run_scan(file_paths, scan, workers, timeout, memory_limit, files_per_worker, profile, trace_path)
+
+    def __run_scan(self, file_paths, scan, workers, timeout, memory_limit, files_per_worker, profile, trace_path):
+        # Замер длительности этапов; без него на каждом этапе выполняется лишь проверка на None
+        self.profile = profile or trace_path is not None
+        self.last_profile = IngestProfile() if self.profile else None
+
+        try:
+            if workers == 0:
+                # Обработка в текущем процессе, без изоляции
+                self.__process_files_inline(file_paths, scan)
+            else:
+                self.process_files(file_paths, workers, timeout, memory_limit, files_per_worker, checkpoint=scan)
+        finally:
+            self.profile = False
+
+        # Все файлы обработаны -- задание завершено (при исключении оно остается прерванным)
+        if scan is not None:
+            cursor = self.open_db()
+            try:
+                scan.finish(cursor)
+            finally:
+                self.close_db()
+
+        if self.last_profile is not None:
+            self.last_profile.print_summary()
+            if trace_path is not None:
+                self.last_profile.write_trace(trace_path)
+        return self.last_profile
+
+    def __process_files_inline(self, file_paths, scan, batch_size=50):
+        # Каждый файл сохраняется своей транзакцией, контрольная точка -- раз в batch_size файлов
+        try:
+            for file_path in file_paths:
+                self.update_book_data(file_path)
+                if scan is not None:
+                    scan.complete(file_path)
+                    if len(scan.completed) >= batch_size:
+                        self.__flush_checkpoint(scan)
+        finally:
+            if scan is not None:
+                self.__flush_checkpoint(scan)
+
+    def __flush_checkpoint(self, scan):
+        cursor = self.open_db()
+        try:
+            scan.flush(cursor)
+        finally:
+            self.close_db()
+
+    def __collect_files(self, directory, file_types, exclude, max_depth, current_depth=0, scan_archives=True):
+        # Рекурсивный обход каталога, возвращает пути к файлам подходящих типов
+        # (и составные пути книг внутри ZIP-архивов, если scan_archives)
         if current_depth > max_depth:
             return
 
         try:
             with os.scandir(directory) as entries:
                 for entry in entries:
-                    if entry.is_file() and any(entry.name.lower().endswith(ft) for ft in file_types):
+                    if scan_archives and entry.is_file() and book_archive.is_archive(entry.name):
+                        yield from book_archive.iter_members(entry.path, file_types)
+                    elif entry.is_file() and any(entry.name.lower().endswith(ft) for ft in file_types):
                         # Если это файл и его тип в списке разрешенных типов файлов, обрабатываем его
-                        self.update_book_data(str(entry.path))
+                        yield str(entry.path)
                     elif entry.is_dir() and entry.name not in exclude:
                         # Если это каталог и его имя не в списке исключений, рекурсивно обрабатываем его
-                        self.process_directory(entry.path, file_types, exclude, max_depth, current_depth + 1)
+                        yield from self.__collect_files(entry.path, file_types, exclude, max_depth, current_depth + 1, scan_archives)
         except PermissionError:
             print(f"Permission denied for directory: {directory}")
 
-    # ЗАПРОСЫ К БД
+    def worker_options(self, memory_limit=WORKER_MEMORY_LIMIT):
+        # Параметры для процессов ExtractionWorker
+        return {
+            'db_path': self.db_path,
+            'convert_docx_to_pdf': self.convert_docx_to_pdf,
+            'convert_odt_to_pdf': self.convert_odt_to_pdf,
+            'analyze_text': self.analyze_text,
+            'metadata_only': self.metadata_only,
+            'hash_mode': self.hash_mode,
+            'memory_limit': memory_limit,
+            'profile': self.profile,
+        }
+
+    def __load_failures(self, cursor):
+        # Файлы, на которых обработка уже падала: путь -> (размер, время изменения)
+        cursor.execute('SELECT file_path, file_size, file_mtime FROM failures')
+        return {file_path: (file_size, file_mtime) for file_path, file_size, file_mtime in cursor.fetchall()}
+
+    @staticmethod
+    def __is_unchanged(file_path, size_and_mtime):
+        try:
+            return book_archive.source_stat(file_path) == size_and_mtime
+        except OSError:
+            return False
+
+    def process_files(self, file_paths, workers=None, timeout=FILE_TIMEOUT, memory_limit=WORKER_MEMORY_LIMIT,
+                      files_per_worker=FILES_PER_WORKER, batch_size=50, checkpoint=None):
+        """
+        Обрабатывает файлы в отдельных процессах и сохраняет результаты в БД.\n
+        Аргументы:
+        file_paths -- пути к файлам
+        workers -- количество процессов (по умолчанию число ядер)
+        timeout -- максимальное время обработки одного файла в секундах
+        memory_limit -- ограничение памяти процесса в байтах (None -- без ограничения)
+        files_per_worker -- после скольких файлов процесс перезапускается
+        batch_size -- сколько результатов записывается одной транзакцией
+        checkpoint -- ScanCheckpoint, отметки которого записываются вместе с данными книг\n
+        Файлы, на которых обработка падала и которые с тех пор не менялись, пропускаются.
+        Соединение для записи занимается только на время записи пакета, поэтому во время обработки
+        остальные методы (избранное, теги, превью) могут писать в БД.
+        """
+        workers = workers or os.cpu_count() or 1
+        options = self.worker_options(memory_limit)
+
+        cursor = self.open_db(readonly=True)
+        try:
+            failures = self.__load_failures(cursor)
+        finally:
+            self.close_db()
+
+        def pending_files():
+            for file_path in file_paths:
+                if file_path in failures and self.__is_unchanged(file_path, failures[file_path]):
+                    if checkpoint is not None:
+                        checkpoint.complete(file_path)
+                    continue
+                yield file_path
+
+        pending = pending_files()
+
+        idle = [ExtractionWorker(options) for _ in range(workers)]
+        busy = {}
+        # Результаты, ожидающие записи: (путь, данные книги или None, (этап, ошибка, длительность) или None)
+        results = []
+
+        def save_results():
+            # Пакет результатов и отметки об обработке его файлов записываются одной транзакцией
+            cursor = self.open_db()
+            try:
+                for file_path, book, failure in results:
+                    if book is not None:
+                        self.__save_and_profile(cursor, book)
+                    else:
+                        self.record_failure(cursor, file_path, *failure)
+                if checkpoint is not None:
+                    for file_path, _, _ in results:
+                        checkpoint.complete(file_path)
+                    checkpoint.flush(cursor)
+            except BaseException:
+                self.rollback_db()
+                raise
+            finally:
+                results.clear()
+            self.close_db()
+
+        def finish(worker, restart):
+            # Возвращаем процесс в пул или заменяем его новым
+            if restart or worker.files_done >= files_per_worker:
+                worker.stop()
+                worker = ExtractionWorker(options)
+            idle.append(worker)
+
+        try:
+            while True:
+                # Раздаем файлы свободным процессам
+                while idle:
+                    file_path = next(pending, None)
+                    if file_path is None:
+                        break
+                    worker = idle.pop()
+                    worker.submit(file_path)
+                    busy[worker.conn] = worker
+
+                if not busy:
+                    break
+
+                # Ждем результата, но не дольше, чем до ближайшего истечения таймаута
+                now = time.perf_counter()
+                wait_time = max(0, min(worker.started_at + timeout for worker in busy.values()) - now)
+                for conn in wait_connections(list(busy), wait_time):
+                    worker = busy.pop(conn)
+                    duration = time.perf_counter() - worker.started_at
+                    try:
+                        status, payload = conn.recv()
+                    except (EOFError, OSError):
+                        # Процесс аварийно завершился (например, из-за нехватки памяти)
+                        worker.process.join(1)
+                        results.append((worker.file_path, None, (
+                            worker.get_stage(), f"Процесс обработки завершился с кодом {worker.process.exitcode}", duration)))
+                        finish(worker, restart=True)
+                        continue
+
+                    if status == 'ok':
+                        results.append((worker.file_path, payload, None))
+                    else:
+                        stage, error = payload
+                        print(f"Ошибка в работе с файлом {worker.file_path}. Причина: {error}")
+                        results.append((worker.file_path, None, (stage, error, duration)))
+                    finish(worker, restart=status == 'fatal')
+
+                if len(results) >= batch_size:
+                    save_results()
+
+                # Прерываем зависшие процессы
+                now = time.perf_counter()
+                for conn, worker in list(busy.items()):
+                    if now - worker.started_at >= timeout:
+                        del busy[conn]
+                        stage = worker.get_stage()
+                        worker.kill()
+                        print(f"Превышено время обработки файла {worker.file_path} ({timeout} с)")
+                        results.append((worker.file_path, None, (
+                            stage, f"Превышено время обработки ({timeout} с)", now - worker.started_at)))
+                        finish(worker, restart=True)
+        finally:
+            for worker in idle + list(busy.values()):
+                worker.stop()
+            # Уже полученные результаты и отметки об обработке сохраняются и при прерывании (Ctrl+C)
+            if results or checkpoint is not None:
+                save_results()
+
+    # Получить файлы, которые не удалось обработать
+    @cached_query
+    def get_failed_files(self):
+        cursor = self.open_db(readonly=True)
+        try:
+            query = "SELECT failed_at, stage, error, duration, file_path FROM failures ORDER BY failed_at DESC"
+
+            cursor.execute(query)
+            rows = cursor.fetchall()
+        finally:
+            self.close_db()
+
+        return FailureRow.from_rows(rows)
+
+    @staticmethod
+    def __list_container(key):
+        # Один вызов scandir на каталог (или чтение оглавления архива) вместо отдельного stat для каждой книги
+        path, is_archive = key
+        if is_archive:
+            return book_archive.list_members(path)
+        try:
+            with os.scandir(path or '.') as entries:
+                return {entry.name for entry in entries if entry.is_file()}
+        except OSError:
+            return set()
+
+    def find_missing_files(self, workers=8):
+        # Возвращает id записей, файлы которых больше не существуют, и общее число проверенных записей
+        cursor = self.open_db(readonly=True)
+        try:
+            cursor.execute('SELECT id, file_path FROM books')
+            rows = cursor.fetchall()
+        finally:
+            self.close_db()
+
+        # Группируем записи по каталогам и архивам (книга из архива есть, если есть ее элемент в архиве)
+        by_directory = {}
+        for book_id, file_path in rows:
+            archive_path, member = book_archive.split_path(file_path)
+            if member is not None:
+                by_directory.setdefault((archive_path, True), []).append((book_id, member))
+            else:
+                directory, name = os.path.split(file_path)
+                by_directory.setdefault((directory, False), []).append((book_id, name))
+
+        # Читаем каталоги и оглавления архивов параллельно
+        missing = []
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for key, names in zip(by_directory, executor.map(self.__list_container, by_directory)):
+                missing.extend(book_id for book_id, name in by_directory[key] if name not in names)
+
+        return missing, len(rows)
+
+    def cleanup_database(self, delete_missing=True, workers=8):
+        """
+        Удаляет (или помечает) записи об отсутствующих файлах и сжимает БД.\n
+        Аргументы:
+        delete_missing -- удалять записи (True) или только помечать их в столбце missing (False)
+        workers -- количество потоков для проверки каталогов\n
+        Возвращает:
+        Словарь с количеством проверенных записей, отсутствующих файлов и освобожденных байт.
+        """
+        missing, checked = self.find_missing_files(workers)
 
-    def get_book_metadata(self, file_path):
         cursor = self.open_db()
-        query = f"SELECT metadata FROM books WHERE file_path = '{file_path}'"
+        try:
+            cursor.execute('PRAGMA page_size')
+            page_size = cursor.fetchone()[0]
+            cursor.execute('PRAGMA page_count')
+            pages_before = cursor.fetchone()[0]
+
+            # Удаляем или помечаем записи порциями, чтобы не превысить ограничение числа параметров SQLite
+            for start in range(0, len(missing), 500):
+                chunk = missing[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                if delete_missing:
+                    cursor.execute(f'DELETE FROM book_minhash WHERE book_id IN ({placeholders})', chunk)
+                    cursor.execute(f'DELETE FROM cover_hash_bands WHERE book_id IN ({placeholders})', chunk)
+                    cursor.execute(f'DELETE FROM books WHERE id IN ({placeholders})', chunk)
+                else:
+                    cursor.execute(f'UPDATE books SET missing = 1 WHERE id IN ({placeholders})', chunk)
+            # Хеши файлов, которых больше нет ни у одной книги
+            cursor.execute('''
+                DELETE FROM file_hashes WHERE content_hash NOT IN (
+                    SELECT content_hash FROM books WHERE content_hash IS NOT NULL)
+            ''')
+            self.__commit(self.conn)
+
+            # Инкрементальная очистка доступна только в режиме auto_vacuum = INCREMENTAL (2),
+            # старые БД переводятся в этот режим одним полным VACUUM
+            cursor.execute('PRAGMA auto_vacuum')
+            if cursor.fetchone()[0] == 2:
+                # executescript выполняет прагму до конца (execute освобождает лишь одну страницу за шаг)
+                self.conn.executescript('PRAGMA incremental_vacuum')
+            else:
+                cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+                cursor.execute('VACUUM')
 
-        cursor.execute(query)
-        row = cursor.fetchone()
+            # Обновляем статистику для планировщика запросов
+            cursor.execute('ANALYZE')
+            cursor.execute('PRAGMA optimize')
+
+            cursor.execute('PRAGMA page_count')
+            pages_after = cursor.fetchone()[0]
+        finally:
+            self.close_db()
 
-        self.close_db()
+        return {
+            'checked': checked,
+            'missing': len(missing),
+            'reclaimed_bytes': max(0, (pages_before - pages_after) * page_size),
+        }
+
+    def update_cover_hashes(self, batch_size=500):
+        """
+        Вычисляет хеши обложек для книг, сохраненных до их появления (по уже построенным превью).\n
+        Аргументы:
+        batch_size -- количество книг в одной транзакции\n
+        Возвращает:
+        Количество книг, для которых хеш обложки вычислен.
+        """
+        extensions = ','.join('?' * len(COVER_EXTENSIONS))
+        query = f"""
+            SELECT id, file_path, preview FROM books
+            WHERE id > ? AND cover_hash IS NULL AND preview IS NOT NULL AND file_ext IN ({extensions})
+            ORDER BY id LIMIT ?
+        """
+        updated = 0
+        last_id = 0
+        while True:
+            cursor = self.open_db(readonly=True)
+            try:
+                cursor.execute(query, (last_id, *COVER_EXTENSIONS, batch_size))
+                rows = cursor.fetchall()
+            finally:
+                self.close_db()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            # Превью декодируются без соединения для записи, оно занимается только для записи пакета.
+            # Однотонные и нечитаемые превью пропускаются (хеш остается NULL)
+            covers = [(cover, book_id) for book_id, cover in
+                      ((book_id, preview_cover_hash(file_path, preview)) for book_id, file_path, preview in rows)
+                      if cover is not None]
+            cursor = self.open_db()
+            try:
+                for cover, book_id in covers:
+                    cursor.execute('UPDATE books SET cover_hash = ? WHERE id = ?', (cover, book_id))
+                    self.__save_cover_bands(cursor, book_id, cover)
+            except BaseException:
+                self.rollback_db()
+                raise
+            self.close_db()
+            updated += len(covers)
+        return updated
+
+    # ЗАПРОСЫ К БД
+
+    def get_book_metadata(self, file_path):
+        cursor = self.open_db(readonly=True)
+        try:
+            query = "SELECT metadata FROM books WHERE file_path = ?"
+
+            cursor.execute(query, (file_path,))
+            row = cursor.fetchone()
+        finally:
+            self.close_db()
 
         # Возвращаем метаданные, если они найдены, иначе None
         return eval(row[0]) if row else None
@@ -434,12 +1849,12 @@ class BookAnalyzer:
             cursor = self.open_db()
 
             # Получение текущего статуса избранного для книги
-            query = f"SELECT favorite FROM books WHERE file_path = '{file_path}'"
+            query = "SELECT favorite FROM books WHERE file_path = ?"
 
-            cursor.execute(query)
+            cursor.execute(query, (file_path,))
             rows = cursor.fetchall()
 
-            if rows is None:
+            if not rows:
                 raise ValueError("Книга не найдена")
 
             # Инвертирование статуса избранного
@@ -455,230 +1870,1119 @@ class BookAnalyzer:
                 WHERE file_path = ?
             ''', data)
 
-            self.close_db()
-
         except Exception as e:
             print("Ошибка обновления статуса избранное у книги:", str(e))
+        finally:
+            # Соединение для записи нужно освободить в любом случае, иначе его будут ждать другие потоки
+            if self.conn is not None:
+                self.close_db()
 
+    @cached_query
     def get_all_books(self, only_favorites=False, limit=None, offset=None):
-        cursor = self.open_db()
-        query = "SELECT favorite, title, author, file_ext, file_path, file_size, num_pages, metadata FROM books"
+        cursor = self.open_db(readonly=True)
+        try:
+            query = "SELECT favorite, title, author, file_ext, file_path, file_size, num_pages, metadata FROM books"
+
+            if only_favorites:
+                query += " WHERE favorite = 1"
 
+            if limit is not None and offset is not None:
+                query += f" LIMIT {limit} OFFSET {offset}"
+
+            cursor.execute(query)
+            rows = cursor.fetchall()
+        finally:
+            self.close_db()
+
+        # Значения как в БД: "Да"/"Нет" и размер в КБ/МБ получаются при выводе (display_rows)
+        return BookRow.from_rows(rows)
+    
+    # Массовая выборка для анализа в ноутбуках (см. book_frames): столбцы без форматирования, пакетами
+    def iter_book_rows(self, columns=None, only_favorites=False, batch_size=book_frames.BATCH_SIZE):
+        """
+        Читает строки таблицы books пакетами.\n
+        Соединение берется из пула напрямую, а не через open_db, поэтому между пакетами можно
+        вызывать другие методы. Пока генератор не исчерпан или не закрыт, соединение занято.\n
+        Аргументы:
+        columns -- столбцы из book_frames.COLUMN_TYPES (None -- book_frames.DEFAULT_COLUMNS)
+        only_favorites -- только избранные книги
+        batch_size -- строк в пакете\n
+        Возвращает:
+        Генератор списков кортежей (значения в порядке columns).
+        """
+        columns = book_frames.check_columns(columns)
+        query = f"SELECT {', '.join(columns)} FROM books"
         if only_favorites:
             query += " WHERE favorite = 1"
+        pool = self.__read_pool()
+        conn = pool.acquire()
+        try:
+            cursor = conn.execute(query + " ORDER BY id")
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+            cursor.close()
+        finally:
+            pool.release(conn)
+
+    def get_book_rows_page(self, columns=None, only_favorites=False, after_id=0, limit=book_frames.BATCH_SIZE, offset=0):
+        """
+        Читает одну страницу таблицы books по возрастанию id (постраничная выборка по ключу).\n
+        В отличие от iter_book_rows соединение не удерживается между страницами, поэтому
+        медленный потребитель (например, клиент сервера) не занимает соединение пула.\n
+        Аргументы:
+        columns -- столбцы из book_frames.COLUMN_TYPES (None -- book_frames.DEFAULT_COLUMNS)
+        only_favorites -- только избранные книги
+        after_id -- id последней строки предыдущей страницы (0 -- с начала)
+        limit -- строк на странице
+        offset -- сколько строк пропустить после after_id\n
+        Возвращает:
+        Кортеж (id последней строки страницы, список кортежей в порядке columns).
+        """
+        columns = book_frames.check_columns(columns)
+        query = f"SELECT id, {', '.join(columns)} FROM books WHERE id > ?"
+        if only_favorites:
+            query += " AND favorite = 1"
+        cursor = self.open_db(readonly=True)
+        try:
+            cursor.execute(query + " ORDER BY id LIMIT ? OFFSET ?", (after_id, limit, offset))
+            rows = cursor.fetchall()
+        finally:
+            self.close_db()
 
-        if limit is not None and offset is not None:
-            query += f" LIMIT {limit} OFFSET {offset}"
-
-        cursor.execute(query)
-        rows = cursor.fetchall()
+        return (rows[-1][0] if rows else after_id), [row[1:] for row in rows]
+
+    def iter_book_columns(self, columns=None, only_favorites=False, batch_size=book_frames.BATCH_SIZE):
+        # Пакеты строк в виде словарей массивов NumPy (см. iter_book_rows)
+        columns = book_frames.check_columns(columns)
+        labels = {}
+        for rows in self.iter_book_rows(columns, only_favorites, batch_size):
+            yield book_frames.to_arrays(columns, rows, labels)
+
+    def get_book_columns(self, columns=None, only_favorites=False):
+        """
+        Все книги в виде массивов NumPy по столбцам.\n
+        Аргументы:
+        columns -- столбцы из book_frames.COLUMN_TYPES (None -- book_frames.DEFAULT_COLUMNS)
+        only_favorites -- только избранные книги\n
+        Возвращает:
+        Словарь {столбец: массив}; NULL в числовых столбцах -- NaN, в текстовых -- None.
+        """
+        columns = book_frames.check_columns(columns)
+        return book_frames.concat_arrays(columns, list(self.iter_book_columns(columns, only_favorites)))
+
+    def get_books_dataframe(self, columns=None, only_favorites=False):
+        # Все книги в виде pandas.DataFrame (нужен пакет pandas), столбцы -- как в get_book_columns
+        import pandas as pd
+        return pd.DataFrame(self.get_book_columns(columns, only_favorites), copy=False)
+
+    def get_books_arrow(self, columns=None, only_favorites=False):
+        """
+        Все книги в виде таблицы Arrow (нужен пакет pyarrow).\n
+        Аргументы:
+        columns -- столбцы из book_frames.COLUMN_TYPES (None -- book_frames.DEFAULT_COLUMNS)
+        only_favorites -- только избранные книги\n
+        Возвращает:
+        pyarrow.Table; целые столбцы с NULL остаются int64.
+        """
+        import pyarrow as pa
+        columns = book_frames.check_columns(columns)
+        schema = book_frames.arrow_schema(columns)
+        return pa.Table.from_batches([book_frames.to_record_batch(schema, rows)
+                                      for rows in self.iter_book_rows(columns, only_favorites)], schema=schema)
+
+    @cached_query
+    def get_book(self, file_path):
+        # Запись книги по пути (значения как в БД) или None
+        cursor = self.open_db(readonly=True)
+        try:
+            cursor.execute("SELECT favorite, title, author, file_ext, file_path, file_size, num_pages, metadata FROM books "
+                           "WHERE file_path = ?", (file_path,))
+            row = cursor.fetchone()
+        finally:
+            self.close_db()
 
-        self.close_db()
+        return BookRow._make(row) if row else None
+
+    @cached_query
+    def get_book_preview_info(self, book_id=None, file_path=None):
+        """
+        Сведения о превью книги без чтения самого изображения (например, для ETag).\n
+        Аргументы:
+        book_id -- id книги
+        file_path -- путь к файлу книги (если book_id не указан)\n
+        Возвращает:
+        Кортеж (id, хеш содержимого, размер превью в байтах или None) или None, если книги нет.
+        """
+        cursor = self.open_db(readonly=True)
+        try:
+            condition, value = ("id = ?", book_id) if book_id is not None else ("file_path = ?", file_path)
+            cursor.execute(f"SELECT id, content_hash, length(preview) FROM books WHERE {condition}", (value,))
+            row = cursor.fetchone()
+        finally:
+            self.close_db()
 
-        # Преобразуем размер файла в человеко-читаемый формат
-        rows = [(yes_no_indicator(favorite), title, author, file_ext, file_path, pretty_size(file_size), num_pages, metadata) for favorite, title, author, file_ext, file_path, file_size, num_pages, metadata in rows]
+        return row
 
-        return rows
-    
     def get_book_preview(self, book_id):
-        cursor = self.open_db()
-        query = f"SELECT preview FROM books WHERE id = ?"
-
-        cursor.execute(query, (book_id,))
-        row = cursor.fetchone()
+        cursor = self.open_db(readonly=True)
+        try:
+            query = f"SELECT preview FROM books WHERE id = ?"
 
-        self.close_db()
+            cursor.execute(query, (book_id,))
+            row = cursor.fetchone()
+        finally:
+            self.close_db()
 
         return row[0] if row else None
     
     def get_book_preview_path(self, file_path):
-        cursor = self.open_db()
-        query = f"SELECT preview FROM books WHERE file_path = ?"
+        cursor = self.open_db(readonly=True)
+        try:
+            query = f"SELECT preview, preview_pending FROM books WHERE file_path = ?"
 
-        cursor.execute(query, (file_path,))
-        row = cursor.fetchone()
+            cursor.execute(query, (file_path,))
+            row = cursor.fetchone()
+        finally:
+            self.close_db()
 
-        self.close_db()
+        # Превью отложено (обработка в режиме metadata_only) -- строим его сейчас
+        if row is not None and row[0] is None and row[1] == 1:
+            try:
+                preview = self.extract_preview(file_path)
+            except Exception as e:
+                print(f"Не удалось построить превью {file_path}. Причина: {e}")
+                preview = None
+            cursor = self.open_db()
+            try:
+                self.store_preview(cursor, file_path, preview)
+            finally:
+                # Превью и хеш обложки входят в результаты кешируемых запросов (get_book_preview_info,
+                # find_similar_covers), поэтому кеш сбрасывается как при любой записи
+                self.close_db()
+            row = (preview, 0)
 
         return row[0] if row else None
 
     # Поиск книг по названию
+    @cached_query
     def search_books_by_title(self, title, only_favorites=False):
-        cursor = self.open_db()
-        query = f"SELECT favorite, title, author, num_pages, file_path FROM books WHERE title LIKE '%{title}%'"
-
-        if only_favorites:
-            query += " AND favorite = 1"
+        cursor = self.open_db(readonly=True)
+        try:
+            query = "SELECT favorite, title, author, num_pages, file_path FROM books WHERE title LIKE ?"
 
-        cursor.execute(query)
-        rows = cursor.fetchall()
+            if only_favorites:
+                query += " AND favorite = 1"
 
-        self.close_db()
+            cursor.execute(query, (f"%{title}%",))
+            rows = cursor.fetchall()
+        finally:
+            self.close_db()
 
-        return [(yes_no_indicator(favorite), title, author, num_pages, file_path) for favorite, title, author, num_pages, file_path in rows]
+        return PagesRow.from_rows(rows)
 
     # Поиск книг по автору
+    @cached_query
     def search_books_by_author(self, author, only_favorites=False):
-        cursor = self.open_db()
-        query = f"SELECT favorite, title, author, num_pages, file_path FROM books WHERE author LIKE '%{author}%'"
+        cursor = self.open_db(readonly=True)
+        try:
+            # Подстрока ищется в небольшой таблице authors, книги выбираются по индексу book_authors
+            query = """
+                SELECT favorite, title, author, num_pages, file_path FROM books WHERE id IN (
+                    SELECT book_id FROM book_authors WHERE author_id IN (
+                        SELECT id FROM authors WHERE name LIKE ? OR name_key LIKE ?))
+            """
 
-        if only_favorites:
-            query += " AND favorite = 1"
+            if only_favorites:
+                query += " AND favorite = 1"
 
-        cursor.execute(query)
-        rows = cursor.fetchall()
+            cursor.execute(query, (f"%{author}%", f"%{book_facets.name_key(author)}%"))
+            rows = cursor.fetchall()
+        finally:
+            self.close_db()
 
-        self.close_db()
+        return PagesRow.from_rows(rows)
 
-        return [(yes_no_indicator(favorite), title, author, num_pages, file_path) for favorite, title, author, num_pages, file_path in rows]
+    # Авторы с количеством книг
+    @cached_query
+    def get_author_counts(self, limit=50, offset=0, prefix=None):
+        cursor = self.open_db(readonly=True)
+        try:
+            query = "SELECT name, books FROM authors"
+            params = []
 
-    # Поиск книг по расширению файла
-    def search_books_by_extension(self, file_ext, only_favorites=False):
+            if prefix:
+                query += " WHERE name LIKE ?"
+                params.append(f"{prefix}%")
+
+            query += " ORDER BY books DESC, name LIMIT ? OFFSET ?"
+            cursor.execute(query, (*params, limit, offset))
+            rows = cursor.fetchall()
+        finally:
+            self.close_db()
+
+        return rows
+
+    # Книги автора (точное совпадение нормализованного имени)
+    @cached_query
+    def get_books_by_author(self, author, only_favorites=False):
+        cursor = self.open_db(readonly=True)
+        try:
+            query = """
+                SELECT b.favorite, b.title, b.author, b.num_pages, b.file_path
+                FROM authors a JOIN book_authors ba ON ba.author_id = a.id JOIN books b ON b.id = ba.book_id
+                WHERE a.name_key = ?
+            """
+
+            if only_favorites:
+                query += " AND b.favorite = 1"
+
+            cursor.execute(query + " ORDER BY b.title", (book_facets.name_key(author),))
+            rows = cursor.fetchall()
+        finally:
+            self.close_db()
+
+        return PagesRow.from_rows(rows)
+
+    # Теги с количеством книг; избранное показывается первым тегом
+    @cached_query
+    def get_tag_counts(self, limit=50, offset=0):
+        cursor = self.open_db(readonly=True)
+        try:
+            cursor.execute("SELECT favorites FROM library_stats WHERE dimension = 'all'")
+            row = cursor.fetchone()
+            cursor.execute("SELECT name, books FROM tags ORDER BY books DESC, name LIMIT ? OFFSET ?", (limit, offset))
+            rows = cursor.fetchall()
+        finally:
+            self.close_db()
+
+        favorites = row[0] if row else 0
+        return ([(book_facets.FAVORITE_TAG, favorites)] if offset == 0 and favorites else []) + rows
+
+    # Книги с тегом
+    @cached_query
+    def get_books_by_tag(self, tag, only_favorites=False):
+        cursor = self.open_db(readonly=True)
+        try:
+            if book_facets.tag_key(tag) == book_facets.tag_key(book_facets.FAVORITE_TAG):
+                query = "SELECT favorite, title, author, num_pages, file_path FROM books WHERE favorite = 1"
+                params = ()
+            else:
+                query = """
+                    SELECT b.favorite, b.title, b.author, b.num_pages, b.file_path
+                    FROM tags t JOIN book_tags bt ON bt.tag_id = t.id JOIN books b ON b.id = bt.book_id
+                    WHERE t.name_key = ?
+                """
+                params = (book_facets.tag_key(tag),)
+                if only_favorites:
+                    query += " AND b.favorite = 1"
+
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+        finally:
+            self.close_db()
+
+        return PagesRow.from_rows(rows)
+
+    # Теги книги
+    @cached_query
+    def get_book_tags(self, file_path):
+        cursor = self.open_db(readonly=True)
+        try:
+            cursor.execute("""
+                SELECT t.name FROM books b JOIN book_tags bt ON bt.book_id = b.id JOIN tags t ON t.id = bt.tag_id
+                WHERE b.file_path = ? ORDER BY t.name
+            """, (file_path,))
+            rows = cursor.fetchall()
+            cursor.execute("SELECT favorite FROM books WHERE file_path = ?", (file_path,))
+            favorite = cursor.fetchone()
+        finally:
+            self.close_db()
+
+        return ([book_facets.FAVORITE_TAG] if favorite and favorite[0] == 1 else []) + [name for name, in rows]
+
+    def tag_books(self, file_paths, tags, remove=False):
+        """
+        Добавляет теги (или снимает их) сразу многим книгам одной транзакцией.\n
+        Аргументы:
+        file_paths -- пути к файлам книг
+        tags -- названия тегов; тег FAVORITE_TAG ("Избранное") меняет столбец favorite
+        remove -- снять теги вместо добавления\n
+        Возвращает:
+        Количество найденных книг.
+        """
+        favorite_key = book_facets.tag_key(book_facets.FAVORITE_TAG)
+        tags = book_facets.split_tags(list(tags))
         cursor = self.open_db()
-        query = f"SELECT favorite, title, author, file_ext, file_path FROM books WHERE file_ext LIKE '%{file_ext}%'"
+        try:
+            # id книг порциями, чтобы не превысить ограничение числа параметров SQLite
+            file_paths = list(file_paths)
+            book_ids = []
+            for start in range(0, len(file_paths), 500):
+                chunk = file_paths[start:start + 500]
+                cursor.execute(f"SELECT id FROM books WHERE file_path IN ({', '.join('?' * len(chunk))})", chunk)
+                book_ids.extend(book_id for book_id, in cursor.fetchall())
+
+            for tag in tags:
+                if book_facets.tag_key(tag) == favorite_key:
+                    cursor.executemany('UPDATE books SET favorite = ? WHERE id = ?',
+                                       [(0 if remove else 1, book_id) for book_id in book_ids])
+                elif remove:
+                    cursor.executemany('DELETE FROM book_tags WHERE book_id = ? AND tag_id = (SELECT id FROM tags WHERE name_key = ?)',
+                                       [(book_id, book_facets.tag_key(tag)) for book_id in book_ids])
+                else:
+                    tag_id = self.__get_facet_id(cursor, 'tags', tag, book_facets.tag_key(tag))
+                    # Тег из метаданных, выбранный пользователем, становится тегом пользователя
+                    cursor.executemany("""
+                        INSERT INTO book_tags (book_id, tag_id, source) VALUES (?, ?, 'user')
+                        ON CONFLICT (book_id, tag_id) DO UPDATE SET source = 'user'
+                    """, [(book_id, tag_id) for book_id in book_ids])
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            self.close_db()
+        return len(book_ids)
 
-        if only_favorites:
-            query += " AND favorite = 1"
+    # Поиск книг по расширению файла
+    @cached_query
+    def search_books_by_extension(self, file_ext, only_favorites=False):
+        cursor = self.open_db(readonly=True)
+        try:
+            query = "SELECT favorite, title, author, file_ext, file_path FROM books WHERE file_ext LIKE ?"
 
-        cursor.execute(query)
-        rows = cursor.fetchall()
+            if only_favorites:
+                query += " AND favorite = 1"
 
-        self.close_db()
+            cursor.execute(query, (f"%{file_ext}%",))
+            rows = cursor.fetchall()
+        finally:
+            self.close_db()
 
-        return [(yes_no_indicator(favorite), title, author, file_ext, file_path) for favorite, title, author, file_ext, file_path in rows]
+        return ExtensionRow.from_rows(rows)
 
     # Получить самые большие книги
+    @cached_query
     def get_largest_books(self, limit=5, offset=0, only_favorites=False):
-        cursor = self.open_db()
-        query = f"SELECT favorite, title, author, file_size, file_path FROM books ORDER BY file_size DESC LIMIT {limit} OFFSET {offset}"
-
-        if only_favorites:
-            query = f"SELECT favorite, title, author, file_size, file_path FROM books WHERE favorite = 1 ORDER BY file_size DESC LIMIT {limit} OFFSET {offset}"
+        cursor = self.open_db(readonly=True)
+        try:
+            query = f"SELECT favorite, title, author, file_size, file_path FROM books ORDER BY file_size DESC LIMIT {limit} OFFSET {offset}"
 
-        cursor.execute(query)
-        rows = cursor.fetchall()
+            if only_favorites:
+                query = f"SELECT favorite, title, author, file_size, file_path FROM books WHERE favorite = 1 ORDER BY file_size DESC LIMIT {limit} OFFSET {offset}"
 
-        self.close_db()
+            cursor.execute(query)
+            rows = cursor.fetchall()
+        finally:
+            self.close_db()
 
-        # Преобразуем размер файла в человеко-читаемый формат
-        return [(yes_no_indicator(favorite), title, author, pretty_size(file_size), file_path) for favorite, title, author, file_size, file_path in rows]
+        return SizeRow.from_rows(rows)
 
     # Получить книги с наибольшим количеством страниц
+    @cached_query
     def get_books_with_most_pages(self, limit=5, offset=0, only_favorites=False): 
-        cursor = self.open_db()
-        query = f"SELECT favorite, title, author, num_pages, file_path FROM books ORDER BY num_pages DESC LIMIT {limit} OFFSET {offset}"
-
-        if only_favorites:
-            query = f"SELECT favorite, title, author, num_pages, file_path FROM books WHERE favorite = 1 ORDER BY num_pages DESC LIMIT {limit} OFFSET {offset}"
+        cursor = self.open_db(readonly=True)
+        try:
+            query = f"SELECT favorite, title, author, num_pages, file_path FROM books ORDER BY num_pages DESC LIMIT {limit} OFFSET {offset}"
 
-        cursor.execute(query)
-        rows = cursor.fetchall()
+            if only_favorites:
+                query = f"SELECT favorite, title, author, num_pages, file_path FROM books WHERE favorite = 1 ORDER BY num_pages DESC LIMIT {limit} OFFSET {offset}"
 
-        self.close_db()
+            cursor.execute(query)
+            rows = cursor.fetchall()
+        finally:
+            self.close_db()
 
-        return [(yes_no_indicator(favorite), title, author, num_pages, file_path) for favorite, title, author, num_pages, file_path in rows]
+        return PagesRow.from_rows(rows)
 
     # Получить книги, добавленные последними
+    @cached_query
     def get_recently_added_books(self, limit=5, offset=0, only_favorites=False):
-        cursor = self.open_db()
-        query = f"SELECT favorite, title, author, file_path FROM books ORDER BY id DESC LIMIT {limit} OFFSET {offset}"
-
-        if only_favorites:
-            query = f"SELECT favorite, title, author, file_path FROM books WHERE favorite = 1 ORDER BY id DESC LIMIT {limit} OFFSET {offset}"
+        cursor = self.open_db(readonly=True)
+        try:
+            query = f"SELECT favorite, title, author, file_path FROM books ORDER BY id DESC LIMIT {limit} OFFSET {offset}"
 
-        cursor.execute(query)
-        rows = cursor.fetchall()
+            if only_favorites:
+                query = f"SELECT favorite, title, author, file_path FROM books WHERE favorite = 1 ORDER BY id DESC LIMIT {limit} OFFSET {offset}"
 
-        self.close_db()
+            cursor.execute(query)
+            rows = cursor.fetchall()
+        finally:
+            self.close_db()
 
-        return [(yes_no_indicator(favorite), title, author, file_path) for favorite, title, author, file_path in rows]
+        return RecentRow.from_rows(rows)
 
     # Получить книги без автора
+    @cached_query
     def get_books_without_author(self, only_favorites=False):
-        cursor = self.open_db()
-        query = f"SELECT favorite, title, num_pages, file_path FROM books WHERE author IS NULL"
-
-        if only_favorites:
-            query += " AND favorite = 1"
+        cursor = self.open_db(readonly=True)
+        try:
+            query = f"SELECT favorite, title, num_pages, file_path FROM books WHERE author IS NULL"
 
-        cursor.execute(query)
-        rows = cursor.fetchall()
+            if only_favorites:
+                query += " AND favorite = 1"
 
-        self.close_db()
+            cursor.execute(query)
+            rows = cursor.fetchall()
+        finally:
+            self.close_db()
 
-        return [(yes_no_indicator(favorite), title, num_pages, file_path) for favorite, title, num_pages, file_path in rows]
+        return NoAuthorRow.from_rows(rows)
 
     # Получить книги без метаданных
+    @cached_query
     def get_books_without_metadata(self, only_favorites=False):
-        cursor = self.open_db()
-        query = f"SELECT favorite, title, file_ext, file_size, file_path FROM books WHERE metadata like 'None'"
+        cursor = self.open_db(readonly=True)
+        try:
+            query = f"SELECT favorite, title, file_ext, file_size, file_path FROM books WHERE metadata like 'None'"
 
-        if only_favorites:
-            query += " AND favorite = 1"
+            if only_favorites:
+                query += " AND favorite = 1"
+
+            cursor.execute(query)
+            rows = cursor.fetchall()
+        finally:
+            self.close_db()
+
+        return NoMetadataRow.from_rows(rows)
+
+    # Статистика текста книги
+    @cached_query
+    def get_text_statistics(self, file_path):
+        """
+        Возвращает статистику текста книги, посчитанную при обработке с analyze_text=True.\n
+        Аргументы:
+        file_path -- путь к файлу книги\n
+        Возвращает:
+        Словарь (char_count, word_count, sentence_count, avg_sentence_length, reading_minutes, script, language)
+        или None, если книги нет в БД.
+        """
+        cursor = self.open_db(readonly=True)
+        try:
+            cursor.execute('SELECT char_count, word_count, sentence_count, script, language FROM books WHERE file_path = ?', (file_path,))
+            row = cursor.fetchone()
+        finally:
+            self.close_db()
+
+        if row is None:
+            return None
+        char_count, word_count, sentence_count, script, language = row
+        return {
+            'char_count': char_count,
+            'word_count': word_count,
+            'sentence_count': sentence_count,
+            'avg_sentence_length': round(word_count / sentence_count, 1) if word_count and sentence_count else None,
+            'reading_minutes': text_stats.reading_minutes(word_count),
+            'script': script,
+            'language': language,
+        }
 
-        cursor.execute(query)
-        rows = cursor.fetchall()
+    # Книги, упорядоченные по статистике текста (только книги, текст которых анализировался)
+    @cached_query
+    def get_books_by_text_statistics(self, order_by='word_count', limit=5, offset=0, only_favorites=False):
+        order_columns = {
+            'word_count': 'word_count',
+            'char_count': 'char_count',
+            'reading_minutes': 'word_count',
+            'avg_sentence_length': 'CAST(word_count AS REAL) / MAX(sentence_count, 1)',
+        }
+        if order_by not in order_columns:
+            raise ValueError(f"Неизвестный столбец сортировки: {order_by}")
 
-        self.close_db()
+        cursor = self.open_db(readonly=True)
+        try:
+            query = """
+                SELECT favorite, title, author, word_count, char_count, sentence_count, script, language, file_path
+                FROM books WHERE word_count IS NOT NULL
+            """
+            if only_favorites:
+                query += " AND favorite = 1"
+            query += f" ORDER BY {order_columns[order_by]} DESC LIMIT ? OFFSET ?"
+
+            cursor.execute(query, (limit, offset))
+            rows = cursor.fetchall()
+        finally:
+            self.close_db()
 
-        # Преобразуем размер файла в человеко-читаемый формат
-        return [(yes_no_indicator(favorite), title, file_ext, pretty_size(file_size), file_path) for favorite, title, file_ext, file_size, file_path in rows]
+        return TextStatisticsRow.from_rows(rows)
 
     # Получить статистику по расширениям файлов
+    @cached_query
     def get_file_extension_statistics(self):
-        cursor = self.open_db()
-        query = f"SELECT file_ext, COUNT(*) as count FROM books GROUP BY file_ext"
+        # Читаем готовые значения из сводной статистики вместо GROUP BY по всей таблице
+        cursor = self.open_db(readonly=True)
+        try:
+            query = "SELECT key, books FROM library_stats WHERE dimension = 'ext' ORDER BY key"
+
+            cursor.execute(query)
+            rows = cursor.fetchall()
+        finally:
+            self.close_db()
+
+        return [(file_ext or None, count) for file_ext, count in rows]
+
+    # Получить общие показатели библиотеки
+    @cached_query
+    def get_library_totals(self):
+        cursor = self.open_db(readonly=True)
+        try:
+            query = "SELECT books, total_size, total_pages, favorites FROM library_stats WHERE dimension = 'all'"
 
-        cursor.execute(query)
-        rows = cursor.fetchall()
+            cursor.execute(query)
+            row = cursor.fetchone()
+        finally:
+            self.close_db()
+
+        books, total_size, total_pages, favorites = row if row else (0, 0, 0, 0)
+        return {'books': books, 'total_size': total_size, 'total_pages': total_pages, 'favorites': favorites}
+
+    # Получить сводную статистику по расширениям, авторам или каталогам
+    @cached_query
+    def get_library_statistics(self, dimension, limit=None, order_by='books'):
+        """
+        Возвращает строки сводной статистики.\n
+        Аргументы:
+        dimension -- 'ext', 'author' или 'directory'
+        limit -- сколько строк вернуть (None -- все)
+        order_by -- 'books', 'total_size', 'total_pages' или 'favorites'\n
+        Возвращает:
+        Список кортежей (ключ, книг, общий размер, всего страниц, избранных), по убыванию order_by.
+        """
+        if dimension not in ('ext', 'author', 'directory'):
+            raise ValueError(f"Неизвестный разрез статистики: {dimension}")
+        if order_by not in ('books', 'total_size', 'total_pages', 'favorites'):
+            raise ValueError(f"Неизвестный столбец сортировки: {order_by}")
+
+        cursor = self.open_db(readonly=True)
+        try:
+            query = f"SELECT key, books, total_size, total_pages, favorites FROM library_stats WHERE dimension = ? ORDER BY {order_by} DESC"
+            params = (dimension,)
+            if limit is not None:
+                query += " LIMIT ?"
+                params += (limit,)
 
-        self.close_db()
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+        finally:
+            self.close_db()
 
         return rows
+
+    # Получить гистограмму размеров файлов или количества страниц
+    @cached_query
+    def get_histogram(self, column='file_size'):
+        """
+        Возвращает гистограмму по шкале 1-2-5.\n
+        Аргументы:
+        column -- 'file_size' или 'num_pages'\n
+        Возвращает:
+        Список кортежей (нижняя граница, верхняя граница, книг); граница 0 -- значения неизвестны.
+        """
+        dimension = {'file_size': 'size_bucket', 'num_pages': 'pages_bucket'}[column]
+        cursor = self.open_db(readonly=True)
+        try:
+            query = "SELECT key, books FROM library_stats WHERE dimension = ? ORDER BY key"
+
+            cursor.execute(query, (dimension,))
+            rows = cursor.fetchall()
+        finally:
+            self.close_db()
+
+        return [(bucket_lower_bound(bucket), bucket_lower_bound(bucket + 1), books) for bucket, books in rows]
     
     # Поиск книг по части метаданных
-    def search_books_by_metadata(self, metadata):
-        cursor = self.open_db()
-        query = f"SELECT title, author, metadata FROM books WHERE metadata LIKE '%{metadata}%'"
+    @cached_query
+    def search_books_by_metadata(self, metadata, only_favorites=False):
+        cursor = self.open_db(readonly=True)
+        try:
+            query = "SELECT favorite, title, author, file_path, metadata FROM books WHERE metadata LIKE ?"
 
-        cursor.execute(query)
-        rows = cursor.fetchall()
+            if only_favorites:
+                query += " AND favorite = 1"
 
-        self.close_db()
+            cursor.execute(query, (f"%{metadata}%",))
+            rows = cursor.fetchall()
+        finally:
+            self.close_db()
 
-        return rows
-    
-    def plot_books_pages(self):
-        cursor = self.open_db()
-        query = "SELECT title, num_pages FROM books WHERE num_pages IS NOT NULL"
+        return MetadataRow.from_rows(rows)
+
+    # Найти точные дубликаты (одинаковый хеш содержимого)
+    @cached_query
+    def get_exact_duplicates(self):
+        cursor = self.open_db(readonly=True)
+        try:
+            query = """
+                SELECT b.content_hash, b.title, b.file_ext, b.file_size, b.file_path
+                FROM books b
+                JOIN (SELECT content_hash FROM books
+                      WHERE content_hash IS NOT NULL AND substr(content_hash, 1, 1) != ?
+                      GROUP BY content_hash HAVING COUNT(*) > 1) d ON d.content_hash = b.content_hash
+                ORDER BY b.content_hash, b.id
+            """
+
+            # Выборочные хеши (режим sampled) не доказывают одинаковое содержимое
+            cursor.execute(query, (file_hash.SAMPLED_PREFIX,))
+            rows = cursor.fetchall()
+        finally:
+            self.close_db()
 
-        cursor.execute(query)
-        rows = cursor.fetchall()
+        groups = {}
+        for content_hash, title, file_ext, file_size, file_path in rows:
+            groups.setdefault(content_hash, []).append((title, file_ext, file_size, file_path))
+        # Группы -- кортежи: результат хранится в кеше запросов и не должен меняться вызывающим
+        return [tuple(group) for group in groups.values()]
 
-        self.close_db()
-        
-        # Разделяем данные на названия книг и количество страниц
-        titles = [row[0] for row in rows]
-        num_pages = [row[1] for row in rows]
-
-        # Создаем график
-        plt.figure(figsize=(10, 6))
-        plt.barh(titles, num_pages, color='skyblue')
-        plt.xlabel('Number of Pages')
-        plt.ylabel('Book Titles')
-        plt.title('Number of Pages in Each Book')
-        plt.tight_layout()
+    # Найти похожие книги (одинаковая сигнатура или близкий MinHash первой страницы)
+    @cached_query
+    def get_near_duplicates(self, threshold=0.5):
+        cursor = self.open_db(readonly=True)
+        try:
+            # Кандидаты: книги, попавшие в одну корзину хотя бы одной полосы LSH, или с одинаковой сигнатурой.
+            # Сравниваются только книги внутри корзин, поэтому нет попарного сравнения всей библиотеки
+            cursor.execute("""
+                SELECT GROUP_CONCAT(book_id) FROM book_minhash
+                GROUP BY band, bucket HAVING COUNT(*) > 1
+            """)
+            minhash_buckets = [row[0] for row in cursor.fetchall()]
+
+            cursor.execute("""
+                SELECT GROUP_CONCAT(id) FROM books
+                WHERE signature IS NOT NULL AND signature NOT LIKE '|%'
+                GROUP BY signature HAVING COUNT(*) > 1
+            """)
+            signature_buckets = [row[0] for row in cursor.fetchall()]
+
+            candidate_ids = {int(book_id) for bucket in minhash_buckets + signature_buckets for book_id in bucket.split(',')}
+            books = {}
+            candidate_list = list(candidate_ids)
+            # Загружаем данные кандидатов порциями, чтобы не упереться в ограничение числа параметров SQLite
+            for start in range(0, len(candidate_list), 500):
+                chunk = candidate_list[start:start + 500]
+                cursor.execute(f"""
+                    SELECT id, title, file_ext, file_size, file_path, content_hash, minhash FROM books
+                    WHERE id IN ({','.join('?' * len(chunk))})
+                """, chunk)
+                for book_id, title, file_ext, file_size, file_path, content_hash, minhash in cursor.fetchall():
+                    signature = array('I', minhash) if minhash else None
+                    # Книга с выборочным хешем не считается точной копией другой книги
+                    content_key = content_hash if file_hash.is_full_hash(content_hash) else book_id
+                    books[book_id] = (title, file_ext, file_size, file_path, content_key, signature)
+        finally:
+            self.close_db()
+
+        # Объединяем книги в группы (система непересекающихся множеств)
+        parent = {book_id: book_id for book_id in books}
+
+        def find(book_id):
+            while parent[book_id] != book_id:
+                parent[book_id] = parent[parent[book_id]]
+                book_id = parent[book_id]
+            return book_id
+
+        def union(first, second):
+            parent[find(first)] = find(second)
+
+        for bucket in signature_buckets:
+            ids = [int(book_id) for book_id in bucket.split(',')]
+            for book_id in ids[1:]:
+                union(ids[0], book_id)
+
+        for bucket in minhash_buckets:
+            ids = [int(book_id) for book_id in bucket.split(',')]
+            for i, first in enumerate(ids):
+                for second in ids[i + 1:]:
+                    if find(first) != find(second) and minhash_similarity(books[first][5], books[second][5]) >= threshold:
+                        union(first, second)
+
+        groups = {}
+        for book_id, book in books.items():
+            groups.setdefault(find(book_id), []).append(book)
+
+        # Группы, целиком состоящие из точных копий, уже показываются среди точных дубликатов
+        return [tuple(book[:4] for book in group) for group in groups.values()
+                if len(group) > 1 and len({book[4] for book in group}) > 1]
+
+    # Получить все группы дубликатов с объемом, который можно освободить
+    @cached_query
+    def get_duplicate_groups(self, threshold=0.5):
+        result = []
+        for kind, groups in (("Точные", self.get_exact_duplicates()), ("Похожие", self.get_near_duplicates(threshold))):
+            for group in groups:
+                # Оставляем самый большой файл группы, остальные можно удалить
+                sizes = [file_size or 0 for _, _, file_size, _ in group]
+                reclaimable = sum(sizes) - max(sizes)
+                result.append((kind, len(group), reclaimable, group))
+
+        result.sort(key=lambda item: item[2], reverse=True)
+        return DuplicateGroupRow.from_rows(result)
+
+    # Книги с похожей обложкой (перцептивный хеш превью отличается не более чем в max_distance битах)
+    @cached_query
+    def find_similar_covers(self, file_path, max_distance=cover_hash.COVER_DISTANCE, limit=100):
+        """
+        Ищет книги, обложка которых похожа на обложку данной книги.\n
+        Аргументы:
+        file_path -- путь к файлу книги
+        max_distance -- максимальное расстояние Хэмминга между хешами обложек (из 64 бит)
+        limit -- максимальное количество книг в результате\n
+        Возвращает:
+        Список кортежей (расстояние, избранное, название, автор, количество страниц, путь к файлу),
+        упорядоченный по расстоянию. Пустой список, если у книги нет хеша обложки.
+        """
+        cursor = self.open_db(readonly=True)
+        try:
+            cursor.execute('SELECT id, cover_hash FROM books WHERE file_path = ?', (file_path,))
+            row = cursor.fetchone()
+            if row is None or row[1] is None:
+                return []
+            book_id, value = row
+
+            # Кандидаты: книги, у которых хотя бы одна часть хеша отличается не больше чем в radius битах
+            radius = max_distance // cover_hash.COVER_BANDS
+            candidate_ids = set()
+            for band, band_value in cover_hash.hash_bands(value):
+                variants = cover_hash.band_variants(band_value, radius)
+                for start in range(0, len(variants), 500):
+                    chunk = variants[start:start + 500]
+                    cursor.execute(f"""
+                        SELECT book_id FROM cover_hash_bands WHERE band = ? AND value IN ({','.join('?' * len(chunk))})
+                    """, (band, *chunk))
+                    candidate_ids.update(candidate for candidate, in cursor.fetchall())
+            candidate_ids.discard(book_id)
+
+            # Проверяем расстояние по полному хешу
+            candidate_ids = list(candidate_ids)
+            result = []
+            for start in range(0, len(candidate_ids), 500):
+                chunk = candidate_ids[start:start + 500]
+                cursor.execute(f"""
+                    SELECT cover_hash, favorite, title, author, num_pages, file_path FROM books
+                    WHERE id IN ({','.join('?' * len(chunk))}) AND cover_hash IS NOT NULL
+                """, chunk)
+                for candidate_hash, favorite, title, author, num_pages, path in cursor.fetchall():
+                    distance = cover_hash.hamming(value, candidate_hash)
+                    if distance <= max_distance:
+                        result.append(SimilarCoverRow(distance, favorite, title, author, num_pages, path))
+        finally:
+            self.close_db()
+
+        result.sort(key=lambda item: (item[0], item[2] or ''))
+        return result[:limit]
+
+    def export_library(self, output_path, previews_path=None, batch_size=1000):
+        """
+        Экспортирует каталог для переноса на другую машину.\n
+        Аргументы:
+        output_path -- файл .jsonl, .jsonl.gz или .parquet (нужен пакет pyarrow)
+        previews_path -- tar-архив для превью (None -- превью не экспортируются)
+        batch_size -- сколько строк читается и записывается за раз\n
+        Возвращает:
+        Количество экспортированных книг.
+        """
+        columns = [column for column in library_transfer.EXPORT_COLUMNS if column != 'preview']
+        writer = library_transfer.open_writer(output_path)
+        previews = library_transfer.PreviewArchiveWriter(previews_path) if previews_path else None
+        cursor = self.open_db(readonly=True)
+        exported = 0
+        try:
+            cursor.execute(f"SELECT {', '.join(columns)}{', preview' if previews else ''} FROM books ORDER BY id")
+            # В памяти одновременно находится только один пакет строк
+            for rows in iter(lambda: cursor.fetchmany(batch_size), []):
+                batch = []
+                for row in rows:
+                    book = dict(zip(columns, row))
+                    preview = row[len(columns)] if previews else None
+                    book['preview'] = previews.add(exported, preview) if preview else None
+                    batch.append(book)
+                    exported += 1
+                writer.write(batch)
+        finally:
+            writer.close()
+            if previews:
+                previews.close()
+            self.close_db()
+        return exported
+
+    def import_library(self, input_path, previews_path=None, path_map=None, batch_size=500):
+        """
+        Импортирует каталог, сохраненный export_library.\n
+        Книга сопоставляется с существующей записью по пути (после замены корней), а если
+        такого пути нет -- по хешу содержимого (тот же файл в другом месте; локальный путь
+        при этом сохраняется). Остальные книги добавляются.\n
+        Аргументы:
+        input_path -- файл экспорта (.jsonl, .jsonl.gz или .parquet)
+        previews_path -- tar-архив превью из export_library (None -- превью не меняются)
+        path_map -- список пар (корень на исходной машине, корень на этой машине)
+        batch_size -- сколько строк записывается одной транзакцией\n
+        Возвращает:
+        Словарь {'inserted': добавлено, 'updated': обновлено}.
+        """
+        previews = library_transfer.PreviewArchiveReader(previews_path) if previews_path else None
+        # Записи, уже сопоставленные с импортируемыми книгами: с ними нельзя сопоставить еще одну книгу
+        claimed = set()
+        report = {'inserted': 0, 'updated': 0}
+
+        cursor = self.open_db()
+        try:
+            # Триггеры сводной статистики на время импорта отключаются (они в несколько раз
+            # замедляют вставку), статистика пересчитывается один раз в конце. Если процесс прервется,
+            # отсутствие триггеров останется в БД, и init_database пересчитает статистику
+            for trigger in STATISTICS_TRIGGERS:
+                cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+            for batch in library_transfer.read_batches(input_path, batch_size):
+                for book in batch:
+                    book['file_path'] = library_transfer.remap_path(book['file_path'], path_map)
+                    name = book.get('preview')
+                    book['preview'] = previews.get(name) if previews and name else None
+                self.__import_batch(cursor, batch, claimed, report)
+                self.__commit(self.conn)
+        finally:
+            if previews:
+                previews.close()
+            self.conn.rollback()
+            self.__init_statistics(cursor)
+            self.__rebuild_statistics(cursor)
+            self.close_db()
+        return report
+
+    def __import_batch(self, cursor, batch, claimed, report):
+        columns = [column for column in library_transfer.EXPORT_COLUMNS if column not in ('file_path', 'preview')]
+
+        # Существующие записи с теми же путями и хешами -- двумя запросами на пакет
+        paths = [book['file_path'] for book in batch]
+        cursor.execute(f"SELECT file_path, id FROM books WHERE file_path IN ({', '.join('?' * len(paths))})", paths)
+        by_path = dict(cursor.fetchall())
+        # Сопоставление по хешу -- только по хешу всего содержимого
+        hashes = [book['content_hash'] for book in batch if file_hash.is_full_hash(book.get('content_hash'))]
+        by_hash = {}
+        if hashes:
+            cursor.execute(f"SELECT content_hash, id FROM books WHERE content_hash IN ({', '.join('?' * len(hashes))}) ORDER BY id", hashes)
+            for content_hash, book_id in cursor.fetchall():
+                by_hash.setdefault(content_hash, []).append(book_id)
+
+        updates = []
+        # Полосы MinHash и части хеша обложки по книгам: при повторе книги остаются данные последней строки
+        bands = {}
+        cover_bands = {}
+        for book in batch:
+            book['favorite'] = book.get('favorite') or 0
+            values = [book.get(column) for column in columns]
+            book_id = by_path.get(book['file_path'])
+            if book_id is None and file_hash.is_full_hash(book.get('content_hash')):
+                book_id = next((candidate for candidate in by_hash.get(book['content_hash'], ()) if candidate not in claimed), None)
+
+            if book_id is None:
+                cursor.execute(f"""
+                    INSERT INTO books (file_path, preview, {', '.join(columns)})
+                    VALUES (?, ?, {', '.join('?' * len(columns))})
+                """, [book['file_path'], book['preview'], *values])
+                book_id = cursor.lastrowid
+                # Тот же путь может встретиться в импорте еще раз (в том числе после замены корней)
+                by_path[book['file_path']] = book_id
+                report['inserted'] += 1
+            else:
+                updates.append((*values, book['preview'], book_id))
+                report['updated'] += 1
+            claimed.add(book_id)
+            self.__save_authors(cursor, book_id, book_facets.split_authors(book.get('author')))
+
+            bands[book_id] = [(book_id, band, bucket) for band, bucket in minhash_bands(array('I', book['minhash']))] \
+                if book.get('minhash') else []
+            cover_bands[book_id] = [(band, value, book_id) for band, value in cover_hash.hash_bands(book['cover_hash'])] \
+                if book.get('cover_hash') is not None else []
+
+        if updates:
+            assignments = ', '.join(f"{column} = ?" for column in columns)
+            cursor.executemany(f"UPDATE books SET {assignments}, preview = COALESCE(?, preview), missing = 0 WHERE id = ?", updates)
+            cursor.executemany('DELETE FROM book_minhash WHERE book_id = ?', [(update[-1],) for update in updates])
+            cursor.executemany('DELETE FROM cover_hash_bands WHERE book_id = ?', [(update[-1],) for update in updates])
+        cursor.executemany('INSERT INTO book_minhash (book_id, band, bucket) VALUES (?, ?, ?)',
+                           [row for rows in bands.values() for row in rows])
+        cursor.executemany('INSERT INTO cover_hash_bands (band, value, book_id) VALUES (?, ?, ?)',
+                           [row for rows in cover_bands.values() for row in rows])
+
+    def generate_web_page(self, output_path, page_size=100, title="Каталог книг"):
+        """
+        Экспортирует каталог в статические HTML-страницы.\n
+        Аргументы:
+        output_path -- путь к первой странице каталога (например, catalog/index.html)
+        page_size -- количество книг на странице
+        title -- заголовок страниц\n
+        Рядом с первой страницей создаются page_N.html, превью в каталоге thumbs
+        и поисковый индекс search_index.js. Записи читаются из БД курсором по одной,
+        поэтому в памяти одновременно находится не больше одной страницы каталога.
+        """
+        output_dir = os.path.dirname(os.path.abspath(output_path))
+        first_page = os.path.basename(output_path) or 'index.html'
+        os.makedirs(output_dir, exist_ok=True)
+
+        def write_page(page, books):
+            # Размеры и признак избранного форматируются сразу для всей страницы
+            sizes = pretty_sizes([book[4] or 0 for book in books])
+            favorites = yes_no_indicators([book[6] for book in books])
+            rows = [web_catalog.render_row(thumb_path, book_title, author, file_ext, size, num_pages, favorite)
+                    for (thumb_path, book_title, author, file_ext, _, num_pages, _), size, favorite
+                    in zip(books, sizes, favorites)]
+            web_catalog.write_page(output_dir, first_page, title, page, pages, total, rows)
+
+        search_index = web_catalog.SearchIndexWriter(output_dir)
+        cursor = self.open_db(readonly=True)
+        try:
+            cursor.execute('SELECT COUNT(*) FROM books')
+            total = cursor.fetchone()[0]
+            pages = max(1, math.ceil(total / page_size))
+
+            # Курсор SQLite отдает строки по мере чтения, весь результат в память не загружается
+            cursor.execute('SELECT id, favorite, title, author, file_ext, file_size, num_pages, preview FROM books ORDER BY id')
+            page = 1
+            books = []
+            for book_id, favorite, book_title, author, file_ext, file_size, num_pages, preview in cursor:
+                thumb_path = web_catalog.write_thumbnail(output_dir, book_id, preview) if preview else None
+                books.append((thumb_path, book_title, author, file_ext, file_size, num_pages, favorite))
+                search_index.add(book_title, author, page)
+                if len(books) == page_size:
+                    write_page(page, books)
+                    page += 1
+                    books = []
+            if books or total == 0:
+                write_page(page, books)
+        finally:
+            search_index.close()
+            self.close_db()
+
+        return os.path.join(output_dir, first_page)
+
+    def plot_books_pages(self, output_path=None):
+        # Гистограмма количества страниц по интервалам (а не столбец на каждую книгу),
+        # поэтому график строится одинаково быстро при любом размере библиотеки
+        self.plot_chart('pages', output_path)
+
+    def plot_chart(self, kind, output_path=None, top_n=10):
+        """
+        Строит график по сводной статистике.\n
+        Аргументы:
+        kind -- 'pages', 'sizes', 'extensions', 'authors' или 'directories'
+        output_path -- файл для сохранения (PNG, SVG, PDF); если не указан, график показывается в окне
+        top_n -- сколько значений показывать отдельно (остальные объединяются в "Другие")
+        """
+        if output_path is not None:
+            return book_charts.save_chart(self, kind, output_path, top_n)
+        book_charts.draw_chart(plt.figure(figsize=(10, 6)), self, kind, top_n)
         plt.show()
 
+def _extraction_worker_main(conn, stage, options):
+    # Точка входа процесса, извлекающего данные о книгах
+    if options['memory_limit']:
+        try:
+            import resource
+            resource.setrlimit(resource.RLIMIT_AS, (options['memory_limit'], options['memory_limit']))
+        except (ImportError, ValueError, OSError):
+            # На Windows модуля resource нет, ограничение памяти не применяется
+            pass
+
+    analyzer = BookAnalyzer(options['db_path'], convert_docx_to_pdf=options['convert_docx_to_pdf'],
+                            convert_odt_to_pdf=options['convert_odt_to_pdf'], init_db=False,
+                            analyze_text=options['analyze_text'], metadata_only=options['metadata_only'],
+                            hash_mode=options['hash_mode'], read_pool_size=1, query_cache_entries=0)
+    analyzer.profile = options['profile']
+
+    def set_stage(name):
+        stage.value = name.encode()[:len(stage) - 1]
+    analyzer.stage_callback = set_stage
+
+    while True:
+        task = conn.recv()
+        if task is None:
+            break
+        kind, file_path = task
+        try:
+            if kind == 'preview':
+                conn.send(('ok', analyzer.extract_preview(file_path)))
+            else:
+                conn.send(('ok', analyzer.extract_book_data(file_path)))
+        except MemoryError:
+            # После нехватки памяти состояние процесса ненадежно, поэтому он будет перезапущен
+            conn.send(('fatal', (analyzer.current_stage, "Превышен лимит памяти")))
+            break
+        except Exception as e:
+            conn.send(('error', (analyzer.current_stage, str(e))))
+
+
+class ExtractionWorker:
+    """
+    Отдельный процесс для извлечения данных из файлов.\n
+    Зависание или падение библиотеки на одном файле не останавливает обработку каталога:
+    процесс можно принудительно завершить и заменить новым.
+    """
+    def __init__(self, options):
+        self.stage = multiprocessing.Array('c', 32, lock=False)
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_extraction_worker_main, args=(child_conn, self.stage, options), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.files_done = 0
+        self.file_path = None
+        self.started_at = None
+
+    def submit(self, file_path, kind='extract'):
+        # kind -- 'extract' (все данные книги) или 'preview' (только превью)
+        self.stage.value = b''
+        self.file_path = file_path
+        self.started_at = time.perf_counter()
+        self.files_done += 1
+        self.conn.send((kind, file_path))
+
+    def get_stage(self):
+        return self.stage.value.decode() or None
+
+    def stop(self):
+        # Просим процесс завершиться, если не получилось -- завершаем принудительно
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(1)
+        self.kill()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.conn.close()
+
+
 def main():
     # Создаем парсер аргументов командной строки
     parser = argparse.ArgumentParser(description='Book Analyzer')
     parser.add_argument('--db_path', default='books.db', help='Path to the database file')
-    parser.add_argument('--dir_path', required=True, help='Path to the directory to analyze')
+    parser.add_argument('--dir_path', help='Path to the directory to analyze')
     parser.add_argument('--file_types', nargs='+', default=['pdf'], help='File types to process')
     parser.add_argument('--exclude', nargs='+', default=[], help='Directories to exclude')
     parser.add_argument('--max_depth', type=int, default=5, help='Maximum directory depth to process')
+    parser.add_argument('--resume', action='store_true', help='Continue the last interrupted directory scan')
+    parser.add_argument('--skip_archives', action='store_true', help='Do not look for books inside ZIP archives')
     parser.add_argument('--web_page', help='Path to the generated web page')
+    parser.add_argument('--metadata_only', action='store_true', help='Fast scan: metadata, page count and hash only, no previews or text')
+    parser.add_argument('--hash_mode', choices=file_hash.HASH_MODES, default='full',
+                        help='Content hash of the whole file or of its size and sampled blocks (faster for large files, '
+                             'but not used to detect exact duplicates)')
+    parser.add_argument('--analyze_text', action='store_true', help='Count words, characters and sentences of the full text')
+    parser.add_argument('--profile', action='store_true', help='Print per-stage timing summary after processing')
+    parser.add_argument('--trace', help='Write per-file stage timings to a .json or .csv file')
+    parser.add_argument('--chart', choices=sorted(book_charts.CHART_KINDS), help='Chart to render to --chart_output')
+    parser.add_argument('--chart_output', default='chart.png', help='Output file of the chart (.png, .svg, .pdf)')
+    parser.add_argument('--export', help='Export the catalog to a .jsonl, .jsonl.gz or .parquet file')
+    parser.add_argument('--import', dest='import_path', help='Import a catalog exported with --export')
+    parser.add_argument('--previews', help='With --export/--import, tar archive of the previews')
+    parser.add_argument('--map_path', nargs=2, action='append', metavar=('OLD', 'NEW'),
+                        help='With --import, replace the OLD root of file paths with NEW (repeatable)')
+    parser.add_argument('--cleanup', action='store_true', help='Remove rows of missing files and compact the database')
+    parser.add_argument('--flag_missing', action='store_true', help='With --cleanup, flag missing files instead of deleting them')
+    parser.add_argument('--cover_hashes', action='store_true', help='Compute cover hashes for books saved without them')
+    parser.add_argument('--similar_covers', help='Print books whose cover looks like the cover of this file')
 
     # Анализируем аргументы командной строки
     args = parser.parse_args()
@@ -686,8 +2990,47 @@ def main():
     # Создаем экземпляр BookAnalyzer
     analyzer = BookAnalyzer(args.db_path)
 
+    # Импортируем каталог, перенесенный с другой машины
+    if args.import_path is not None:
+        report = analyzer.import_library(args.import_path, args.previews, args.map_path)
+        print(f"Добавлено книг: {report['inserted']}, обновлено: {report['updated']}")
+
+    # Продолжаем прерванную обработку каталога
+    if args.resume:
+        if analyzer.get_unfinished_scan() is None:
+            print("Нет прерванной обработки каталога")
+        else:
+            analyzer.resume_scan(profile=args.profile, trace_path=args.trace)
+
     # Обрабатываем указанный каталог
-    analyzer.process_directory(args.dir_path, args.file_types, args.exclude, args.max_depth)
+    if args.dir_path is not None:
+        analyzer.process_directory(args.dir_path, args.file_types, args.exclude, args.max_depth,
+                                   profile=args.profile, trace_path=args.trace, analyze_text=args.analyze_text,
+                                   metadata_only=args.metadata_only, scan_archives=not args.skip_archives,
+                                   hash_mode=args.hash_mode)
+
+    # Удаляем записи об отсутствующих файлах и сжимаем БД
+    if args.cleanup:
+        report = analyzer.cleanup_database(delete_missing=not args.flag_missing)
+        print(f"Проверено записей: {report['checked']}, отсутствующих файлов: {report['missing']}, "
+              f"освобождено: {pretty_size(report['reclaimed_bytes'])}")
+
+    # Хеши обложек для книг, сохраненных до их появления
+    if args.cover_hashes:
+        print(f"Вычислено хешей обложек: {analyzer.update_cover_hashes()}")
+
+    # Книги с похожей обложкой
+    if args.similar_covers is not None:
+        for distance, favorite, title, author, num_pages, file_path in analyzer.find_similar_covers(args.similar_covers):
+            print(f"{distance:>3}  {title} ({author or 'автор не указан'}) -- {file_path}")
+
+    # Экспортируем каталог
+    if args.export is not None:
+        print(f"Экспортировано книг: {analyzer.export_library(args.export, args.previews)}")
+
+    # Сохраняем график в файл
+    if args.chart is not None:
+        analyzer.plot_chart(args.chart, args.chart_output)
 
     # Генерируем веб-страницу, если указан соответствующий аргумент
     if args.web_page is not None:
@@ -1,7 +1,11 @@
 import os
 import tkinter as tk
 from tkinter import messagebox, filedialog, simpledialog, Menu, ttk
-from bookAnalyzer import BookAnalyzer
+from bookAnalyzer import BookAnalyzer, pretty_size
+from book_rows import display_rows
+from preview_queue import PreviewQueue
+import book_charts
+import book_archive
 import matplotlib.pyplot as plt
 from PIL import Image, ImageTk
 import numpy as np
@@ -13,6 +17,10 @@ class App:
         self.root = root
         self.analyzer = analyzer
 
+        # Фоновое построение превью, отложенных при обработке в режиме metadata_only
+        self.preview_queue = PreviewQueue(analyzer)
+        self.preview_queue.start()
+
         self.tree = ttk.Treeview(self.root, columns=('Title', 'Author', 'Num Pages'), show='headings')
         self.tree.heading('Title', text='Title')
         self.tree.heading('Author', text='Author')
@@ -47,6 +55,8 @@ class App:
         menubar.add_cascade(label="Основные функции", menu=file_menu)
         file_menu.add_command(label="Поиск книг по названию", command=self.search_books_by_title)
         file_menu.add_command(label="Поиск книг по автору", command=self.search_books_by_author)
+        file_menu.add_command(label="Авторы", command=self.display_authors)
+        file_menu.add_command(label="Теги", command=self.display_tags)
         file_menu.add_command(label="Поиск книг по расширению", command=self.search_books_by_extension)
         file_menu.add_command(label="Самые большие книги", command=self.display_largest_books)
         file_menu.add_command(label="Книги с наибольшим количеством страниц", command=self.display_books_with_most_pages)
@@ -56,6 +66,22 @@ class App:
         file_menu.add_command(label="Показать статистику расширений файлов", command=self.display_file_extension_statistics)
         file_menu.add_command(label="Показать график количества страниц", command=self.display_books_pages_chart)
 
+        file_menu.add_command(label="Сводная статистика библиотеки", command=self.display_library_statistics)
+        file_menu.add_command(label="Статистика текста книг", command=self.display_text_statistics)
+        file_menu.add_command(label="Дубликаты книг", command=self.display_duplicate_groups)
+        file_menu.add_command(label="Продолжить обработку директории", command=self.resume_scan)
+        file_menu.add_command(label="Очистка базы данных", command=self.cleanup_database)
+        file_menu.add_command(label="Вычислить хеши обложек", command=self.update_cover_hashes)
+        file_menu.add_command(label="Проблемные файлы", command=self.display_failed_files)
+        file_menu.add_command(label="Экспорт каталога в HTML", command=self.export_web_page)
+
+        charts_menu = Menu(menubar, tearoff=0)
+        menubar.add_cascade(label="Графики", menu=charts_menu)
+        for kind, title in book_charts.CHART_KINDS.items():
+            charts_menu.add_command(label=title, command=lambda kind=kind: self.display_chart(kind))
+        charts_menu.add_separator()
+        charts_menu.add_command(label="Сохранить график в файл", command=self.save_chart)
+
 
         # Задаём растягиваемость строк и столбцов
         self.root.grid_columnconfigure(0, weight=1)
@@ -97,7 +123,8 @@ class App:
             def open_file(event):
                 item = self.tree.identify('item', event.x, event.y)
                 file_path = self.tree.item(item, "values")[4]  # предполагается, что путь к файлу хранится в 5-м столбце
-                os.startfile(file_path)
+                # Для книги внутри архива открывается сам архив
+                os.startfile(book_archive.split_path(file_path)[0])
 
             def show_preview(event):
                 try:
@@ -153,6 +180,8 @@ class App:
             self.tree.bind('<Double-3>', show_preview)  # Правый клик для предварительного просмотра
             self.tree.bind("<Control-f>", change_favorite) # ctrl + f
             self.tree.bind("<Control-m>", show_metadata) # ctrl + m
+            self.tag_selected(self.tree, path_index=4)
+            self.similar_covers(self.tree, path_index=4)
 
             only_favorites = self.favorites_var.get() == 1
 
@@ -191,9 +220,12 @@ class App:
                 self.tree.delete(i)
 
             # Вставляем новые данные
-            for book in books:
+            for book in display_rows(books):
                 self.tree.insert('', 'end', values=book)
 
+            # Сначала строим превью показанных книг
+            self.preview_queue.prioritize(book[4] for book in books)
+
             self.last_method = self.display_all_books
             self.last_args = dict(limit=limit, offset=offset)
 
@@ -210,8 +242,10 @@ class App:
         # Проверяем, являются ли данные числами или строками, и применяем соответствующую функцию сортировки
         if col == "File Size":
             l.sort(key=lambda t: float(t[0].split()[0]) * units[t[0].split()[1]], reverse=reverse)
-        elif col == "Num Pages" or col == "Rank":
+        elif col in ("Num Pages", "Rank", "Books", "Favorites", "Words", "Chars", "Reading Min"):
             l.sort(key=lambda t: int(t[0]), reverse=reverse)
+        elif col == "Sentence Length":
+            l.sort(key=lambda t: float(t[0]), reverse=reverse)
         else:
             l.sort(reverse=reverse)
 
@@ -235,6 +269,9 @@ class App:
             max_depth = tk.IntVar(value=1)
             convert_odt_to_pdf = tk.BooleanVar(value=False)
             convert_docx_to_pdf = tk.BooleanVar(value=False)
+            analyze_text = tk.BooleanVar(value=False)
+            metadata_only = tk.BooleanVar(value=False)
+            scan_archives = tk.BooleanVar(value=True)
 
             # Виджеты для ввода данных
             tk.Label(dialog, text="Типы файлов (через запятую):").pack()
@@ -254,13 +291,30 @@ class App:
             tk.Radiobutton(dialog, text="Да", variable=convert_docx_to_pdf, value=True).pack()
             tk.Radiobutton(dialog, text="Нет", variable=convert_docx_to_pdf, value=False).pack()
 
+            tk.Label(dialog, text="Анализировать текст (слова, предложения):").pack()
+            tk.Radiobutton(dialog, text="Да", variable=analyze_text, value=True).pack()
+            tk.Radiobutton(dialog, text="Нет", variable=analyze_text, value=False).pack()
+
+            tk.Label(dialog, text="Только метаданные (без превью и текста, быстро):").pack()
+            tk.Radiobutton(dialog, text="Да", variable=metadata_only, value=True).pack()
+            tk.Radiobutton(dialog, text="Нет", variable=metadata_only, value=False).pack()
+
+            tk.Label(dialog, text="Искать книги в ZIP-архивах:").pack()
+            tk.Radiobutton(dialog, text="Да", variable=scan_archives, value=True).pack()
+            tk.Radiobutton(dialog, text="Нет", variable=scan_archives, value=False).pack()
+
             def on_submit():
                 file_types_list = [file_type.strip() for file_type in file_types.get().split(',')]
                 exclude_dirs_list = [dir_.strip() for dir_ in exclude_dirs.get().split(',')]
                 self.analyzer.process_directory(directory, file_types=file_types_list, exclude=exclude_dirs_list,
                                             max_depth=max_depth.get(),
                                             convert_odt_to_pdf=convert_odt_to_pdf.get(),
-                                            convert_docx_to_pdf=convert_docx_to_pdf.get())
+                                            convert_docx_to_pdf=convert_docx_to_pdf.get(),
+                                            analyze_text=analyze_text.get(),
+                                            metadata_only=metadata_only.get(),
+                                            scan_archives=scan_archives.get())
+                # Новые книги без превью -- будим очередь
+                self.preview_queue.prioritize(())
                 messagebox.showinfo("Успех", "Директория обработана успешно")
                 dialog.destroy()
 
@@ -269,6 +323,26 @@ class App:
         except Exception as e:
             messagebox.showerror("Ошибка", str(e))
             
+    def resume_scan(self):
+        try:
+            scan = self.analyzer.get_unfinished_scan()
+            if scan is None:
+                messagebox.showinfo("Продолжение обработки", "Нет прерванной обработки директории")
+                return
+            found = f"{scan['found']}" if scan['walked'] else f"не менее {scan['found']}"
+            if not messagebox.askyesno("Продолжение обработки",
+                                       f"Продолжить обработку директории {scan['directory']}?\n"
+                                       f"Обработано файлов: {scan['done']} из {found}\n"
+                                       f"Начата: {scan['started_at']}"):
+                return
+            self.analyzer.resume_scan()
+            # Новые книги без превью -- будим очередь
+            self.preview_queue.prioritize(())
+            messagebox.showinfo("Успех", "Директория обработана успешно")
+            self.update_table()
+        except Exception as e:
+            messagebox.showerror("Ошибка", str(e))
+
     def reset_database(self):
         try:
             dialog = tk.Toplevel(self.root)
@@ -302,6 +376,68 @@ class App:
         except Exception as e:
             messagebox.showerror("Ошибка", str(e))
 
+    # Отображаем файлы, которые не удалось обработать
+    def display_failed_files(self):
+        try:
+            self.tree = ttk.Treeview(self.root, columns=('Failed At', 'Stage', 'Error', 'Duration', 'Path'), show='headings')
+            self.tree.heading('Failed At', text='Время сбоя', command=lambda: self.treeview_sort_column(self.tree, 'Failed At', False))
+            self.tree.heading('Stage', text='Этап', command=lambda: self.treeview_sort_column(self.tree, 'Stage', False))
+            self.tree.heading('Error', text='Ошибка')
+            self.tree.heading('Duration', text='Длительность')
+            self.tree.heading('Path', text='Путь к файлу')
+            self.tree.grid(row=1, column=0, columnspan=5, sticky="nsew")
+
+            self.open_file(self.tree)
+
+            failures = self.analyzer.get_failed_files()
+
+            # Очищаем таблицу
+            for i in self.tree.get_children():
+                self.tree.delete(i)
+
+            # Вставляем новые данные
+            for failure in display_rows(failures):
+                self.tree.insert('', 'end', values=failure)
+
+            # обновляем последний вызванный метод и его аргументы
+            self.last_method = self.display_failed_files
+            self.last_args = dict()
+
+        except Exception as e:
+            messagebox.showerror("Ошибка", str(e))
+
+    def export_web_page(self):
+        try:
+            output_path = filedialog.asksaveasfilename(title="Экспорт каталога", initialfile="index.html",
+                                                       defaultextension=".html", filetypes=[("HTML", "*.html")])
+            if not output_path:
+                return
+            first_page = self.analyzer.generate_web_page(output_path)
+            messagebox.showinfo("Успех", f"Каталог сохранен: {first_page}")
+        except Exception as e:
+            messagebox.showerror("Ошибка", str(e))
+
+    def cleanup_database(self):
+        try:
+            delete_missing = messagebox.askyesno("Очистка базы данных",
+                                                 "Удалить записи о книгах, файлов которых больше нет?\n"
+                                                 "(\"Нет\" — только пометить такие записи)")
+            report = self.analyzer.cleanup_database(delete_missing=delete_missing)
+            messagebox.showinfo("Успех", f"Проверено записей: {report['checked']}\n"
+                                         f"Отсутствующих файлов: {report['missing']}\n"
+                                         f"Освобождено: {pretty_size(report['reclaimed_bytes'])}")
+            self.update_table()
+        except Exception as e:
+            messagebox.showerror("Ошибка", str(e))
+
+    def update_cover_hashes(self):
+        # Хеши обложек для книг, сохраненных до их появления (поиск похожих обложек -- ctrl + l)
+        try:
+            updated = self.analyzer.update_cover_hashes()
+            messagebox.showinfo("Успех", f"Вычислено хешей обложек: {updated}")
+        except Exception as e:
+            messagebox.showerror("Ошибка", str(e))
+
     def show_metadata(self, tree):
         def show_metadata(event):
             # Получаем выбранный элемент в таблице
@@ -360,11 +496,38 @@ class App:
                 self.analyzer.update_book_favorite_status(file_path) 
         tree.bind("<Control-f>", change_favorite) # ctrl + f
 
+    def tag_selected(self, tree, path_index=-1):
+        # Добавление (ctrl + t) и снятие (ctrl + u) тегов сразу у всех выделенных книг
+        def change_tags(remove):
+            try:
+                file_paths = [tree.item(item, "values")[path_index] for item in tree.selection()]
+                if not file_paths:
+                    return
+                action = "снять с" if remove else "добавить к"
+                tags = simpledialog.askstring("Теги", f"Теги через запятую, которые нужно {action} {len(file_paths)} книг:")
+                if tags:
+                    self.analyzer.tag_books(file_paths, tags.split(','), remove=remove)
+            except Exception as e:
+                messagebox.showerror("Ошибка", str(e))
+
+        tree.bind("<Control-t>", lambda event: change_tags(remove=False))
+        tree.bind("<Control-u>", lambda event: change_tags(remove=True))
+
+    def similar_covers(self, tree, path_index=-1):
+        # Книги с похожей обложкой для выделенной книги (ctrl + l)
+        def show_similar(event):
+            selection = tree.selection()
+            if selection:
+                self.display_similar_covers(tree.item(selection[0], "values")[path_index])
+
+        tree.bind("<Control-l>", show_similar)
+
     def open_file(self, tree):
         def op_file(event):
             item = tree.identify('item', event.x, event.y)
             file_path = tree.item(item, "values")[-1]  # Путь к файлу хранится в последнем столбце
-            os.startfile(file_path)
+            # Для книги внутри архива открывается сам архив
+            os.startfile(book_archive.split_path(file_path)[0])
 
         tree.bind('<Double-1>', op_file) # реагирует на ЛКМ
 
@@ -422,7 +585,7 @@ class App:
                 self.tree.delete(i)
 
             # Вставляем новые данные
-            for book in books:
+            for book in display_rows(books):
                 self.tree.insert('', 'end', values=book)
 
             # обновляем последний вызванный метод и его аргументы
@@ -461,7 +624,7 @@ class App:
                 self.tree.delete(i)
 
             # Вставляем новые данные
-            for book in books:
+            for book in display_rows(books):
                 self.tree.insert('', 'end', values=book)
 
             # обновляем последний вызванный метод и его аргументы
@@ -470,6 +633,141 @@ class App:
         except Exception as e:
             messagebox.showerror("Ошибка", str(e))
 
+    # Авторы с количеством книг (двойной щелчок -- книги автора)
+    def display_authors(self, prefix=None, limit=500):
+        try:
+            self.tree = ttk.Treeview(self.root, columns=('Author', 'Books'), show='headings')
+            self.tree.heading('Author', text='Автор', command=lambda: self.treeview_sort_column(self.tree, 'Author', False))
+            self.tree.heading('Books', text='Книг', command=lambda: self.treeview_sort_column(self.tree, 'Books', False))
+            self.tree.grid(row=1, column=0, columnspan=2, sticky="nsew")
+
+            def open_author(event):
+                item = self.tree.identify('item', event.x, event.y)
+                if item:
+                    self.display_books_by_author(self.tree.item(item, "values")[0])
+
+            self.tree.bind('<Double-1>', open_author)
+
+            if prefix is None and self.last_method == self.display_authors:
+                prefix = self.last_args.get('prefix')
+            elif prefix is None:
+                prefix = simpledialog.askstring("Ввод", "Начало имени автора (пусто -- все авторы):") or ''
+
+            # Вставляем новые данные
+            for author, books in self.analyzer.get_author_counts(limit, 0, prefix):
+                self.tree.insert('', 'end', values=(author, books))
+
+            # обновляем последний вызванный метод и его аргументы
+            self.last_method = self.display_authors
+            self.last_args = dict(prefix=prefix, limit=limit)
+        except Exception as e:
+            messagebox.showerror("Ошибка", str(e))
+
+    # Теги с количеством книг (двойной щелчок -- книги с тегом)
+    def display_tags(self, limit=500):
+        try:
+            self.tree = ttk.Treeview(self.root, columns=('Tag', 'Books'), show='headings')
+            self.tree.heading('Tag', text='Тег', command=lambda: self.treeview_sort_column(self.tree, 'Tag', False))
+            self.tree.heading('Books', text='Книг', command=lambda: self.treeview_sort_column(self.tree, 'Books', False))
+            self.tree.grid(row=1, column=0, columnspan=2, sticky="nsew")
+
+            def open_tag(event):
+                item = self.tree.identify('item', event.x, event.y)
+                if item:
+                    self.display_books_by_tag(self.tree.item(item, "values")[0])
+
+            self.tree.bind('<Double-1>', open_tag)
+
+            # Вставляем новые данные
+            for tag, books in self.analyzer.get_tag_counts(limit):
+                self.tree.insert('', 'end', values=(tag, books))
+
+            # обновляем последний вызванный метод и его аргументы
+            self.last_method = self.display_tags
+            self.last_args = dict(limit=limit)
+        except Exception as e:
+            messagebox.showerror("Ошибка", str(e))
+
+    def __display_facet_books(self, books):
+        # Таблица книг автора или тега
+        self.tree = ttk.Treeview(self.root, columns=('Favorite', 'Title', 'Author', 'Num Pages', 'Path'), show='headings')
+        self.tree.column('Favorite', width=30)
+        self.tree.heading('Favorite', text='Избранное', command=lambda: self.treeview_sort_column(self.tree, 'Favorite', False))
+        self.tree.heading('Title', text='Название', command=lambda: self.treeview_sort_column(self.tree, 'Title', False))
+        self.tree.heading('Author', text='Автор', command=lambda: self.treeview_sort_column(self.tree, 'Author', False))
+        self.tree.heading('Num Pages', text='Кол-во страниц', command=lambda: self.treeview_sort_column(self.tree, 'Num Pages', False))
+        self.tree.heading('Path', text='Путь к файлу')
+        self.tree.grid(row=1, column=0, columnspan=5, sticky="nsew")
+
+        self.open_file(self.tree)
+        self.bind_preview(self.tree)
+        self.change_favorite(self.tree)
+        self.show_metadata(self.tree)
+        self.tag_selected(self.tree)
+        self.similar_covers(self.tree)
+
+        for book in display_rows(books):
+            self.tree.insert('', 'end', values=book)
+
+    # Книги автора
+    def display_books_by_author(self, author):
+        try:
+            only_favorites = self.favorites_var.get() == 1
+            self.__display_facet_books(self.analyzer.get_books_by_author(author, only_favorites))
+
+            # обновляем последний вызванный метод и его аргументы
+            self.last_method = self.display_books_by_author
+            self.last_args = dict(author=author)
+        except Exception as e:
+            messagebox.showerror("Ошибка", str(e))
+
+    # Книги с тегом
+    def display_books_by_tag(self, tag):
+        try:
+            only_favorites = self.favorites_var.get() == 1
+            self.__display_facet_books(self.analyzer.get_books_by_tag(tag, only_favorites))
+
+            # обновляем последний вызванный метод и его аргументы
+            self.last_method = self.display_books_by_tag
+            self.last_args = dict(tag=tag)
+        except Exception as e:
+            messagebox.showerror("Ошибка", str(e))
+
+    # Книги с похожей обложкой
+    def display_similar_covers(self, file_path):
+        try:
+            books = self.analyzer.find_similar_covers(file_path)
+            if not books:
+                messagebox.showinfo("Похожие обложки", "Книг с похожей обложкой не найдено "
+                                                        "(или для этой книги нет хеша обложки)")
+                return
+
+            self.tree = ttk.Treeview(self.root, columns=('Distance', 'Favorite', 'Title', 'Author', 'Num Pages', 'Path'), show='headings')
+            self.tree.column('Distance', width=30)
+            self.tree.heading('Distance', text='Отличие', command=lambda: self.treeview_sort_column(self.tree, 'Distance', False))
+            self.tree.column('Favorite', width=30)
+            self.tree.heading('Favorite', text='Избранное', command=lambda: self.treeview_sort_column(self.tree, 'Favorite', False))
+            self.tree.heading('Title', text='Название', command=lambda: self.treeview_sort_column(self.tree, 'Title', False))
+            self.tree.heading('Author', text='Автор', command=lambda: self.treeview_sort_column(self.tree, 'Author', False))
+            self.tree.heading('Num Pages', text='Кол-во страниц', command=lambda: self.treeview_sort_column(self.tree, 'Num Pages', False))
+            self.tree.heading('Path', text='Путь к файлу')
+            self.tree.grid(row=1, column=0, columnspan=6, sticky="nsew")
+
+            self.open_file(self.tree)
+            self.bind_preview(self.tree)
+            self.change_favorite2(self.tree)
+            self.show_metadata(self.tree)
+            self.similar_covers(self.tree)
+
+            for book in display_rows(books):
+                self.tree.insert('', 'end', values=book)
+
+            # обновляем последний вызванный метод и его аргументы
+            self.last_method = self.display_similar_covers
+            self.last_args = dict(file_path=file_path)
+        except Exception as e:
+            messagebox.showerror("Ошибка", str(e))
+
     # Поиск книг по расширению файла
     def search_books_by_extension(self, extension=None):
         try:
@@ -500,7 +798,7 @@ class App:
                 self.tree.delete(i)
 
             # Вставляем новые данные
-            for book in books:
+            for book in display_rows(books):
                 self.tree.insert('', 'end', values=book)
 
             # обновляем последний вызванный метод и его аргументы
@@ -564,7 +862,7 @@ class App:
                 self.tree.delete(i)
 
             # Вставляем новые данные
-            for i, book in enumerate(books, start=1 + offset):
+            for i, book in enumerate(display_rows(books), start=1 + offset):
                 self.tree.insert('', 'end', values=(i, *book))
 
             # обновляем последний вызванный метод и его аргументы
@@ -628,7 +926,7 @@ class App:
                 self.tree.delete(i)
 
             # Вставляем новые данные
-            for i, book in enumerate(books, start=1 + offset):
+            for i, book in enumerate(display_rows(books), start=1 + offset):
                 self.tree.insert('', 'end', values=(i, *book))
 
             # обновляем последний вызванный метод и его аргументы
@@ -691,7 +989,7 @@ class App:
                 self.tree.delete(i)
 
             # Вставляем новые данные
-            for i, book in enumerate(books, start=1 + offset):
+            for i, book in enumerate(display_rows(books), start=1 + offset):
                 self.tree.insert('', 'end', values=(i, *book))
 
             # обновляем последний вызванный метод и его аргументы
@@ -725,7 +1023,7 @@ class App:
                 self.tree.delete(i)
 
             # Вставляем новые данные
-            for book in books:
+            for book in display_rows(books):
                 self.tree.insert('', 'end', values=book)
 
             # обновляем последний вызванный метод и его аргументы
@@ -759,7 +1057,7 @@ class App:
                 self.tree.delete(i)
 
             # Вставляем новые данные
-            for book in books:
+            for book in display_rows(books):
                 self.tree.insert('', 'end', values=book)
 
             # обновляем последний вызванный метод и его аргументы
@@ -806,8 +1104,147 @@ class App:
         except Exception as e:
             messagebox.showerror("Ошибка", str(e))
 
+    def display_chart(self, kind):
+        try:
+            self.analyzer.plot_chart(kind)
+        except Exception as e:
+            messagebox.showerror("Ошибка", str(e))
+
+    def save_chart(self):
+        try:
+            kinds = list(book_charts.CHART_KINDS)
+            kind = simpledialog.askstring("График", f"Вид графика ({', '.join(kinds)}):", initialvalue=kinds[0])
+            if not kind:
+                return
+            output_path = filedialog.asksaveasfilename(title="Сохранить график", defaultextension=".png",
+                                                       filetypes=[("PNG", "*.png"), ("SVG", "*.svg"), ("PDF", "*.pdf")])
+            if output_path:
+                self.analyzer.plot_chart(kind.strip(), output_path)
+                messagebox.showinfo("Успех", f"График сохранен: {output_path}")
+        except Exception as e:
+            messagebox.showerror("Ошибка", str(e))
+
+    # Показать статистику текста книг (книги, обработанные с анализом текста)
+    def display_text_statistics(self, limit=None):
+        try:
+            self.tree = ttk.Treeview(self.root, columns=('Rank', 'Favorite', 'Title', 'Author', 'Words', 'Chars', 'Reading Min',
+                                                         'Sentence Length', 'Script', 'Language', 'Path'), show='headings')
+            self.tree.column('Rank', width=50)
+            self.tree.heading('Rank', text='Ранг', command=lambda: self.treeview_sort_column(self.tree, 'Rank', False))
+            self.tree.column('Favorite', width=30)
+            self.tree.heading('Favorite', text='Избранное', command=lambda: self.treeview_sort_column(self.tree, 'Favorite', False))
+            self.tree.heading('Title', text='Название', command=lambda: self.treeview_sort_column(self.tree, 'Title', False))
+            self.tree.heading('Author', text='Автор', command=lambda: self.treeview_sort_column(self.tree, 'Author', False))
+            self.tree.heading('Words', text='Слов', command=lambda: self.treeview_sort_column(self.tree, 'Words', False))
+            self.tree.heading('Chars', text='Символов', command=lambda: self.treeview_sort_column(self.tree, 'Chars', False))
+            self.tree.heading('Reading Min', text='Время чтения, мин', command=lambda: self.treeview_sort_column(self.tree, 'Reading Min', False))
+            self.tree.heading('Sentence Length', text='Слов в предложении', command=lambda: self.treeview_sort_column(self.tree, 'Sentence Length', False))
+            self.tree.heading('Script', text='Письменность', command=lambda: self.treeview_sort_column(self.tree, 'Script', False))
+            self.tree.heading('Language', text='Язык', command=lambda: self.treeview_sort_column(self.tree, 'Language', False))
+            self.tree.heading('Path', text='Путь к файлу')
+            self.tree.grid(row=1, column=0, columnspan=11, sticky="nsew")
+
+            self.open_file(self.tree)
+            self.bind_preview(self.tree)
+            self.show_metadata(self.tree)
+
+            if limit is None and self.last_method == self.display_text_statistics:
+                limit = self.last_args.get('limit')
+            elif limit is None:
+                limit = simpledialog.askinteger("Статистика текста", "Сколько книг показать?", initialvalue=100, minvalue=1)
+                if limit is None:
+                    return
+
+            only_favorites = self.favorites_var.get() == 1
+            books = self.analyzer.get_books_by_text_statistics('word_count', limit, 0, only_favorites)
+
+            # Очищаем таблицу
+            for i in self.tree.get_children():
+                self.tree.delete(i)
+
+            # Вставляем новые данные
+            for i, book in enumerate(display_rows(books), start=1):
+                self.tree.insert('', 'end', values=(i, *book))
+
+            # обновляем последний вызванный метод и его аргументы
+            self.last_method = self.display_text_statistics
+            self.last_args = dict(limit=limit)
+        except Exception as e:
+            messagebox.showerror("Ошибка", str(e))
+
+    # Отображаем сводную статистику (берется из готовых агрегатов, таблица книг не сканируется)
+    def display_library_statistics(self, limit=20):
+        try:
+            self.tree = ttk.Treeview(self.root, columns=('Dimension', 'Key', 'Books', 'File Size', 'Num Pages', 'Favorites'), show='headings')
+            self.tree.heading('Dimension', text='Разрез')
+            self.tree.heading('Key', text='Значение', command=lambda: self.treeview_sort_column(self.tree, 'Key', False))
+            self.tree.heading('Books', text='Книг', command=lambda: self.treeview_sort_column(self.tree, 'Books', False))
+            self.tree.heading('File Size', text='Общий размер', command=lambda: self.treeview_sort_column(self.tree, 'File Size', False))
+            self.tree.heading('Num Pages', text='Всего страниц', command=lambda: self.treeview_sort_column(self.tree, 'Num Pages', False))
+            self.tree.heading('Favorites', text='Избранных', command=lambda: self.treeview_sort_column(self.tree, 'Favorites', False))
+            self.tree.grid(row=1, column=0, columnspan=6, sticky="nsew")
+
+            # Очищаем таблицу
+            for i in self.tree.get_children():
+                self.tree.delete(i)
+
+            totals = self.analyzer.get_library_totals()
+            self.tree.insert('', 'end', values=('Вся библиотека', '', totals['books'], pretty_size(totals['total_size'] or 0),
+                                                totals['total_pages'], totals['favorites']))
+
+            dimension_names = {'ext': 'Расширение', 'author': 'Автор', 'directory': 'Каталог'}
+            for dimension, name in dimension_names.items():
+                for key, books, total_size, total_pages, favorites in self.analyzer.get_library_statistics(dimension, limit):
+                    self.tree.insert('', 'end', values=(name, key or '(не указано)', books, pretty_size(total_size or 0), total_pages, favorites))
+
+            # обновляем последний вызванный метод и его аргументы
+            self.last_method = self.display_library_statistics
+            self.last_args = dict(limit=limit)
+
+        except Exception as e:
+            messagebox.showerror("Ошибка", str(e))
+
+    # Отображаем группы дубликатов
+    def display_duplicate_groups(self):
+        try:
+            self.tree = ttk.Treeview(self.root, columns=('Rank', 'Type', 'Count', 'Reclaim', 'Title', 'File Ext', 'File Size', 'Path'), show='headings')
+            self.tree.column('Rank', width=50)
+            self.tree.heading('Rank', text='Группа', command=lambda: self.treeview_sort_column(self.tree, 'Rank', False))
+            self.tree.heading('Type', text='Тип', command=lambda: self.treeview_sort_column(self.tree, 'Type', False))
+            self.tree.heading('Count', text='Книг в группе')
+            self.tree.heading('Reclaim', text='Можно освободить')
+            self.tree.heading('Title', text='Название', command=lambda: self.treeview_sort_column(self.tree, 'Title', False))
+            self.tree.heading('File Ext', text='Расширение файла', command=lambda: self.treeview_sort_column(self.tree, 'File Ext', False))
+            self.tree.heading('File Size', text='Размер файла', command=lambda: self.treeview_sort_column(self.tree, 'File Size', False))
+            self.tree.heading('Path', text='Путь к файлу')
+            self.tree.grid(row=1, column=0, columnspan=8, sticky="nsew")
+
+            self.open_file(self.tree)
+            self.bind_preview(self.tree)
+            self.show_metadata(self.tree)
+
+            groups = self.analyzer.get_duplicate_groups()
+
+            # Очищаем таблицу
+            for i in self.tree.get_children():
+                self.tree.delete(i)
+
+            # Вставляем новые данные: по строке на каждую книгу группы
+            for i, (kind, count, reclaimable, group) in enumerate(display_rows(groups), start=1):
+                for title, file_ext, file_size, file_path in group:
+                    self.tree.insert('', 'end', values=(i, kind, count, reclaimable, title, file_ext, pretty_size(file_size or 0), file_path))
+
+            # обновляем последний вызванный метод и его аргументы
+            self.last_method = self.display_duplicate_groups
+            self.last_args = dict()
+
+        except Exception as e:
+            messagebox.showerror("Ошибка", str(e))
+
 
-root = tk.Tk()
-analyzer = BookAnalyzer('books.db')  # создайте свой экземпляр анализатора здесь
-app = App(root, analyzer)
-root.mainloop()
+# Защита нужна, потому что процессы обработки файлов заново импортируют главный модуль (Windows)
+if __name__ == '__main__':
+    root = tk.Tk()
+    analyzer = BookAnalyzer('books.db')  # создайте свой экземпляр анализатора здесь
+    app = App(root, analyzer)
+    root.mainloop()
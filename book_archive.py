@@ -0,0 +1,118 @@
+import io
+import os
+import zipfile
+
+# Книги внутри ZIP-архивов. Такая книга хранится в БД под составным путем "архив.zip!папка/книга.pdf"
+# и при обработке читается из архива в память (без временных файлов): PyMuPDF открывает PDF
+# из буфера, а EPUB, DOCX и ODT -- сами ZIP-архивы, которые библиотеки читают из файлового объекта.
+# В памяти одновременно находится не больше одного элемента архива, размер которого ограничен
+# MAX_MEMBER_SIZE. Вложенные архивы не просматриваются.
+
+ARCHIVE_EXTENSIONS = ('.zip',)
+ARCHIVE_SEPARATOR = '!'
+# Максимальный размер (в распакованном виде) элемента архива, который читается в память
+MAX_MEMBER_SIZE = 512 * 1024 ** 2
+
+
+class ArchiveMemberError(Exception):
+    pass
+
+
+def is_archive(file_path) -> bool:
+    return file_path.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def join_path(archive_path, member) -> str:
+    return f"{archive_path}{ARCHIVE_SEPARATOR}{member}"
+
+
+def split_path(file_path):
+    """
+    Разделяет составной путь книги внутри архива.\n
+    Аргументы:
+    file_path -- путь к файлу или "архив.zip!элемент"\n
+    Возвращает:
+    Кортеж (путь к архиву, имя элемента) или (file_path, None) для обычного файла.
+    """
+    lower = file_path.lower()
+    for extension in ARCHIVE_EXTENSIONS:
+        # Разделитель ищется сразу после расширения архива, поэтому "!" в именах каталогов не мешает
+        index = lower.find(extension + ARCHIVE_SEPARATOR)
+        if index != -1:
+            end = index + len(extension)
+            return file_path[:end], file_path[end + len(ARCHIVE_SEPARATOR):]
+    return file_path, None
+
+
+def is_member(file_path) -> bool:
+    return split_path(file_path)[1] is not None
+
+
+def iter_members(archive_path, file_types):
+    """
+    Перечисляет книги в архиве (читается только центральный каталог архива).\n
+    Аргументы:
+    archive_path -- путь к ZIP-архиву
+    file_types -- расширения файлов книг\n
+    Возвращает:
+    Генератор составных путей элементов архива.
+    """
+    try:
+        with zipfile.ZipFile(archive_path) as archive:
+            infos = archive.infolist()
+    except (OSError, zipfile.BadZipFile) as e:
+        print(f"Не удалось прочитать архив {archive_path}. Причина: {e}")
+        return
+    for info in infos:
+        if not info.is_dir() and any(info.filename.lower().endswith(ft) for ft in file_types):
+            yield join_path(archive_path, info.filename)
+
+
+def list_members(archive_path):
+    # Имена всех элементов архива (пустое множество, если архива нет или он поврежден)
+    try:
+        with zipfile.ZipFile(archive_path) as archive:
+            return set(archive.namelist())
+    except (OSError, zipfile.BadZipFile):
+        return set()
+
+
+def read_member(file_path, max_size=MAX_MEMBER_SIZE) -> bytes:
+    """
+    Читает элемент архива в память.\n
+    Аргументы:
+    file_path -- составной путь "архив.zip!элемент"
+    max_size -- максимальный размер элемента в байтах\n
+    Возвращает:
+    Содержимое элемента.
+    Выбрасывает ArchiveMemberError, если элемента нет, он зашифрован или слишком велик.
+    """
+    archive_path, member = split_path(file_path)
+    try:
+        with zipfile.ZipFile(archive_path) as archive:
+            info = archive.getinfo(member)
+            if info.flag_bits & 0x1:
+                raise ArchiveMemberError(f"Элемент архива зашифрован: {member}")
+            if info.file_size > max_size:
+                raise ArchiveMemberError(f"Элемент архива больше {max_size // 1024 ** 2} МБ: {member}")
+            with archive.open(info) as file:
+                # Размер в заголовке архива может не соответствовать данным -- читаем не больше лимита
+                data = file.read(max_size + 1)
+    except KeyError:
+        raise ArchiveMemberError(f"Элемент {member} не найден в архиве {archive_path}")
+    except zipfile.BadZipFile as e:
+        raise ArchiveMemberError(f"Поврежденный архив {archive_path}: {e}")
+    if len(data) > max_size:
+        raise ArchiveMemberError(f"Элемент архива больше {max_size // 1024 ** 2} МБ: {member}")
+    return data
+
+
+def open_source(file_path, data=None):
+    # Источник для библиотек чтения: путь к файлу или файловый объект в памяти (книга из архива)
+    return io.BytesIO(data) if data is not None else file_path
+
+
+def source_stat(file_path):
+    # Размер и время изменения файла книги, для книги из архива -- самого архива
+    stat = os.stat(split_path(file_path)[0])
+    return stat.st_size, stat.st_mtime
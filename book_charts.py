@@ -0,0 +1,111 @@
+from matplotlib.figure import Figure
+
+# Графики строятся по сводной статистике (таблица library_stats), поэтому время построения
+# не зависит от количества книг: гистограммы уже разбиты на интервалы, разрезы уже посчитаны.
+
+CHART_KINDS = {
+    'pages': 'Распределение книг по количеству страниц',
+    'sizes': 'Распределение книг по размеру файла',
+    'extensions': 'Книги по расширениям файлов',
+    'authors': 'Книги по авторам',
+    'directories': 'Книги по каталогам',
+}
+
+OTHER_LABEL = 'Другие'
+UNKNOWN_LABEL = '(не указано)'
+
+
+def _pretty_size(size_bytes):
+    # Короткая подпись размера для оси графика
+    for unit in ('байт', 'КБ', 'МБ', 'ГБ', 'ТБ'):
+        if size_bytes < 1024:
+            return f"{size_bytes:.3g} {unit}"
+        size_bytes /= 1024
+    return f"{size_bytes:.3g} ПБ"
+
+
+def histogram_labels(buckets, formatter=str):
+    """
+    Подписи интервалов гистограммы.\n
+    Аргументы:
+    buckets -- список (нижняя граница, верхняя граница, книг) из BookAnalyzer.get_histogram
+    formatter -- функция форматирования границы\n
+    Возвращает:
+    Кортеж (подписи, количества).
+    """
+    labels = []
+    counts = []
+    for lower, upper, books in buckets:
+        labels.append(UNKNOWN_LABEL if lower == 0 else f"{formatter(lower)}–{formatter(upper)}")
+        counts.append(books)
+    return labels, counts
+
+
+def top_n_with_other(rows, total):
+    """
+    Подписи для top-N значений и столбца "Другие".\n
+    Аргументы:
+    rows -- первые N строк (ключ, количество), отсортированные по убыванию количества
+    total -- общее количество книг; "Другие" -- остаток, остальные строки не читаются\n
+    Возвращает:
+    Кортеж (подписи, количества).
+    """
+    labels = [key or UNKNOWN_LABEL for key, _ in rows]
+    counts = [count for _, count in rows]
+    other = total - sum(counts)
+    if other > 0:
+        labels.append(OTHER_LABEL)
+        counts.append(other)
+    return labels, counts
+
+
+def chart_data(analyzer, kind, top_n=10):
+    # Подписи и значения для графика выбранного вида
+    if kind == 'pages':
+        return histogram_labels(analyzer.get_histogram('num_pages'))
+    if kind == 'sizes':
+        return histogram_labels(analyzer.get_histogram('file_size'), _pretty_size)
+
+    dimension = {'extensions': 'ext', 'authors': 'author', 'directories': 'directory'}[kind]
+    rows = analyzer.get_library_statistics(dimension, limit=top_n)
+    return top_n_with_other([(key, books) for key, books, *_ in rows], analyzer.get_library_totals()['books'])
+
+
+def draw_chart(figure, analyzer, kind, top_n=10):
+    """
+    Рисует график на переданной фигуре matplotlib.\n
+    Аргументы:
+    figure -- фигура (plt.figure() для окна или matplotlib.figure.Figure для файла)
+    analyzer -- экземпляр BookAnalyzer
+    kind -- вид графика из CHART_KINDS
+    top_n -- сколько значений показывать отдельно для разрезов по расширениям, авторам и каталогам
+    """
+    if kind not in CHART_KINDS:
+        raise ValueError(f"Неизвестный вид графика: {kind}")
+    labels, counts = chart_data(analyzer, kind, top_n)
+
+    ax = figure.add_subplot()
+    if kind in ('pages', 'sizes'):
+        ax.bar(range(len(counts)), counts, color='skyblue')
+        ax.set_xticks(range(len(labels)))
+        ax.set_xticklabels(labels, rotation=45, ha='right')
+        ax.set_xlabel('Страниц' if kind == 'pages' else 'Размер файла')
+        ax.set_ylabel('Книг')
+    else:
+        # Горизонтальные полосы сверху вниз по убыванию
+        ax.barh(range(len(counts)), counts, color='skyblue')
+        ax.set_yticks(range(len(labels)))
+        ax.set_yticklabels(labels)
+        ax.invert_yaxis()
+        ax.set_xlabel('Книг')
+    ax.set_title(CHART_KINDS[kind])
+    figure.tight_layout()
+    return figure
+
+
+def save_chart(analyzer, kind, output_path, top_n=10, figsize=(10, 6)):
+    # Сохраняет график в файл без графического окна; формат (PNG, SVG, PDF) -- по расширению
+    figure = Figure(figsize=figsize)
+    draw_chart(figure, analyzer, kind, top_n)
+    figure.savefig(output_path)
+    return output_path
@@ -0,0 +1,105 @@
+import re
+
+# Авторы и теги книг: разбор строк из метаданных (PDF /Author и /Keywords, dc:creator и dc:subject
+# в EPUB, core_properties в DOCX) в списки отдельных имен и нормализация для сравнения.
+# Сами таблицы authors, book_authors, tags и book_tags создает BookAnalyzer.init_database.
+
+# Тег, соответствующий столбцу favorite таблицы books (хранится в самой таблице books)
+FAVORITE_TAG = 'Избранное'
+
+# Значения, которые программы подставляют вместо автора
+_PLACEHOLDER_AUTHORS = {'unknown', 'anonymous', 'admin', 'administrator', 'user', 'author',
+                        'неизвестен', 'неизвестный', 'неизвестный автор', 'аноним', 'пользователь'}
+
+# Разделители нескольких авторов в одной строке
+_AUTHOR_SEPARATORS = re.compile(r"\s*;\s*|\s+&\s+|\s+and\s+|\s+и\s+|\s*/\s*|\s*\n\s*", re.IGNORECASE)
+_TAG_SEPARATORS = re.compile(r"\s*[,;\n]\s*")
+# Инициалы и имена во второй части "Фамилия, Имя" (одно-два слова)
+_GIVEN_NAMES = re.compile(r"^[\w.\-]+(?:\s+[\w.\-]+)?$")
+
+MAX_TAG_LENGTH = 64
+
+
+def name_key(name) -> str:
+    """
+    Ключ для сравнения имен: нижний регистр, только буквы и цифры, слова по алфавиту
+    (поэтому "Толстой Лев" и "Лев Толстой" совпадают).
+    """
+    words = re.sub(r"[\W_]+", " ", str(name).lower().replace("ё", "е")).split()
+    return " ".join(sorted(words))
+
+
+def tag_key(tag) -> str:
+    # Ключ для сравнения тегов: нижний регистр, только буквы и цифры (порядок слов сохраняется)
+    return " ".join(re.sub(r"[\W_]+", " ", str(tag).lower().replace("ё", "е")).split())
+
+
+def _clean(value):
+    # Одиночные пробелы, без кавычек и знаков препинания по краям
+    value = " ".join(str(value).split()).strip(" ,;:\"'«»")
+    # Имена, записанные целиком заглавными или строчными буквами, приводятся к обычному виду
+    if value.isupper() or value.islower():
+        value = value.title()
+    return value
+
+
+def _split_commas(value):
+    # "Толстой, Лев" -- одно имя в обратном порядке, "Лев Толстой, Иван Тургенев" -- два автора
+    parts = [part.strip() for part in value.split(',') if part.strip()]
+    if len(parts) == 2 and ' ' not in parts[0] and _GIVEN_NAMES.match(parts[1]):
+        return [f"{parts[1]} {parts[0]}"]
+    if len(parts) > 1 and all(' ' in part for part in parts):
+        return parts
+    return [value]
+
+
+def split_authors(value):
+    """
+    Разбивает значение поля автора на отдельные имена.\n
+    Аргументы:
+    value -- строка, список строк (несколько dc:creator в EPUB) или None\n
+    Возвращает:
+    Список имен без повторов и значений-заглушек, в исходном порядке.
+    """
+    if not value:
+        return []
+    values = value if isinstance(value, (list, tuple)) else [value]
+    names = []
+    seen = set()
+    for item in values:
+        if not item:
+            continue
+        for part in _AUTHOR_SEPARATORS.split(str(item)):
+            for name in _split_commas(part):
+                name = _clean(name)
+                key = name_key(name)
+                if not key or key in seen or name.lower() in _PLACEHOLDER_AUTHORS:
+                    continue
+                seen.add(key)
+                names.append(name)
+    return names
+
+
+def split_tags(*values):
+    """
+    Собирает теги из полей ключевых слов и тем.\n
+    Аргументы:
+    values -- строки с разделителями ",", ";" или переводом строки, списки строк или None\n
+    Возвращает:
+    Список тегов без повторов (без учета регистра), в исходном порядке.
+    """
+    tags = []
+    seen = set()
+    for value in values:
+        if not value:
+            continue
+        for item in value if isinstance(value, (list, tuple)) else [value]:
+            if not item:
+                continue
+            for tag in _TAG_SEPARATORS.split(str(item)):
+                tag = " ".join(tag.split()).strip(" .\"'«»")[:MAX_TAG_LENGTH]
+                key = tag_key(tag)
+                if key and key not in seen:
+                    seen.add(key)
+                    tags.append(tag)
+    return tags
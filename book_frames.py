@@ -0,0 +1,145 @@
+from operator import itemgetter
+
+import numpy as np
+
+# Массовая выборка каталога для анализа в ноутбуках: столбцы таблицы books без форматирования
+# ("Да"/"Нет", "10.5 МБ"), пакетами из SQLite прямо в массивы NumPy, таблицу Arrow или DataFrame.
+# Строка пакета не превращается в отдельный объект: столбцы пакета кортежей сразу становятся
+# массивами, после чего кортежи освобождаются.
+# Типы столбцов:
+#   int    -- целое без NULL (int64 в NumPy и Arrow);
+#   bool   -- признак 0/1 (bool);
+#   number -- целое, которое может быть NULL: float64 с NaN в NumPy (точно до 2**53), int64 с NULL в Arrow;
+#   text   -- строка или None (массив object в NumPy, string в Arrow);
+#   label  -- как text, но значений немного (расширение, автор, язык): в NumPy одинаковые строки
+#             хранятся одним объектом, а не отдельной копией для каждой книги.
+# pandas и pyarrow нужны только для соответствующих форматов.
+
+COLUMN_TYPES = {
+    'id': 'int',
+    'favorite': 'bool',
+    'missing': 'bool',
+    'title': 'text',
+    'author': 'label',
+    'file_ext': 'label',
+    'file_path': 'text',
+    'file_size': 'number',
+    'num_pages': 'number',
+    'char_count': 'number',
+    'word_count': 'number',
+    'sentence_count': 'number',
+    'script': 'label',
+    'language': 'label',
+    'content_hash': 'text',
+    'metadata': 'text',
+}
+DEFAULT_COLUMNS = ('id', 'favorite', 'title', 'author', 'file_ext', 'file_path', 'file_size', 'num_pages',
+                   'word_count', 'language')
+# Строк в одном пакете выборки
+BATCH_SIZE = 64 * 1024
+
+_NUMPY_TYPES = {'int': np.int64, 'bool': np.bool_, 'number': np.float64, 'text': object, 'label': object}
+
+
+def check_columns(columns=None):
+    # Проверенный список столбцов (имена подставляются в SQL, поэтому только из COLUMN_TYPES)
+    columns = list(columns or DEFAULT_COLUMNS)
+    unknown = [column for column in columns if column not in COLUMN_TYPES]
+    if unknown:
+        raise ValueError(f"Неизвестные столбцы: {', '.join(unknown)}")
+    return columns
+
+
+def to_arrays(columns, rows, labels=None):
+    """
+    Преобразует пакет строк в массивы NumPy по столбцам.\n
+    Аргументы:
+    columns -- имена столбцов в порядке значений строки
+    rows -- список кортежей, полученных из SQLite
+    labels -- словарь уже встречавшихся значений столбцов label (общий для всех пакетов выборки)\n
+    Возвращает:
+    Словарь {столбец: массив}.
+    """
+    labels = labels if labels is not None else {}
+    arrays = {}
+    for index, column in enumerate(columns):
+        kind = COLUMN_TYPES[column]
+        # Значения столбца без промежуточного транспонирования всего пакета (zip(*rows) в разы медленнее)
+        values = map(itemgetter(index), rows)
+        if kind in ('int', 'bool'):
+            array = np.fromiter(values, dtype=_NUMPY_TYPES[kind], count=len(rows))
+        elif kind == 'number':
+            # None становится NaN
+            array = np.array(list(values), dtype=np.float64)
+        else:
+            if kind == 'label':
+                seen = labels.setdefault(column, {})
+                values = map(seen.setdefault, values, map(itemgetter(index), rows))
+            array = np.empty(len(rows), dtype=object)
+            array[:] = list(values)
+        arrays[column] = array
+    return arrays
+
+
+def empty_arrays(columns):
+    return {column: np.empty(0, dtype=_NUMPY_TYPES[COLUMN_TYPES[column]]) for column in columns}
+
+
+def concat_arrays(columns, batches):
+    # Объединяет пакеты to_arrays (пустой результат -- массивы нулевой длины нужных типов)
+    if not batches:
+        return empty_arrays(columns)
+    return {column: np.concatenate([batch[column] for batch in batches]) for column in columns}
+
+
+def arrow_schema(columns):
+    import pyarrow as pa
+    types = {'int': pa.int64(), 'bool': pa.bool_(), 'number': pa.int64(), 'text': pa.string(), 'label': pa.string()}
+    return pa.schema([(column, types[COLUMN_TYPES[column]]) for column in columns])
+
+
+def to_record_batch(schema, rows):
+    # Пакет строк в RecordBatch Arrow (NULL сохраняются без перехода к float)
+    import pyarrow as pa
+    arrays = []
+    for index, field in enumerate(schema):
+        values = map(itemgetter(index), rows)
+        if field.type == pa.bool_():
+            # Arrow не преобразует целые 0/1 в bool сам
+            arrays.append(pa.array(np.fromiter(values, dtype=np.bool_, count=len(rows))))
+        else:
+            arrays.append(pa.array(list(values), type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def group_totals(arrays, by, values=('file_size', 'num_pages')):
+    """
+    Сводка по значениям одного столбца (количество книг и суммы числовых столбцов).\n
+    Аргументы:
+    arrays -- словарь массивов (результат BookAnalyzer.get_book_columns)
+    by -- столбец группировки (например, 'file_ext', 'author', 'language')
+    values -- числовые столбцы, которые суммируются (NULL считается нулем)\n
+    Возвращает:
+    Словарь массивов: by, 'books', 'total_<столбец>' и 'favorites' (если выбран столбец favorite),
+    по убыванию количества книг.
+    """
+    keys = arrays[by]
+    if keys.dtype == object:
+        # None не сравнивается со строками -- такие книги попадают в группу ''
+        keys = np.where(keys == None, '', keys)  # noqa: E711
+    groups, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    result = {by: groups, 'books': counts}
+    for column in values:
+        result[f"total_{column}"] = np.bincount(inverse, weights=np.nan_to_num(arrays[column]), minlength=len(groups))
+    if 'favorite' in arrays:
+        result['favorites'] = np.bincount(inverse, weights=arrays['favorite'], minlength=len(groups)).astype(np.int64)
+    order = np.argsort(-counts, kind='stable')
+    return {column: array[order] for column, array in result.items()}
+
+
+def quantiles(arrays, column, q=(0.5, 0.9, 0.99)):
+    # Квантили числового столбца без учета NULL (например, медианный размер файла)
+    values = arrays[column]
+    if not np.any(~np.isnan(values)):
+        return {level: None for level in q}
+    return dict(zip(q, np.nanquantile(values, q).tolist()))
@@ -0,0 +1,366 @@
+"""
+Несколько корней библиотеки (сетевые тома, папки отделов), каждый -- в общей или в отдельной БД (шарде).
+
+Список корней хранится в главной БД (таблица library_roots); главная БД сама является шардом
+для корней без отдельного файла. Запросы выполняются через одно соединение, к которому
+присоединены (ATTACH) все шарды: поиск объединяет результаты шардов, top-N запросы берут
+первые limit + offset строк из каждого шарда и сливают их.
+
+Пример:
+    python book_library.py --db_path library.db --add_root nas /mnt/nas --shard nas.db
+    python book_library.py --db_path library.db --scan
+    python book_library.py --db_path library.db --largest 20
+"""
+import os
+import heapq
+import sqlite3
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from bookAnalyzer import BookAnalyzer, pretty_size
+from book_rows import SizeRow, PagesRow, ExtensionRow
+
+# Ограничение SQLite на количество присоединенных БД (SQLITE_MAX_ATTACHED по умолчанию)
+MAX_ATTACHED = 10
+
+DEFAULT_FILE_TYPES = ['pdf', 'epub', 'docx', 'odt']
+
+
+class LibraryRoot:
+    __slots__ = ('name', 'path', 'shard_path', 'file_types', 'exclude', 'max_depth')
+
+    def __init__(self, name, path, shard_path, file_types, exclude, max_depth):
+        self.name = name
+        self.path = path
+        self.shard_path = shard_path
+        self.file_types = file_types
+        self.exclude = exclude
+        self.max_depth = max_depth
+
+    def contains(self, file_path):
+        return os.path.normpath(file_path).startswith(os.path.join(os.path.normpath(self.path), ''))
+
+
+class BookLibrary:
+    def __init__(self, db_path):
+        self.db_path = db_path
+        # BookAnalyzer каждого шарда создается один раз: у него свой пул чтения и соединение для записи
+        self.analyzers = {}
+        self.analyzers_lock = threading.Lock()
+        # Главная БД одновременно хранит список корней и книги корней без отдельного шарда
+        BookAnalyzer(db_path)
+        conn = sqlite3.connect(db_path)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS library_roots (
+                name TEXT PRIMARY KEY,
+                path TEXT,
+                shard_path TEXT,
+                file_types TEXT,
+                exclude TEXT,
+                max_depth INTEGER,
+                last_scan TEXT
+            )
+        ''')
+        conn.commit()
+        conn.close()
+
+    def add_root(self, name, path, shard_path=None, file_types=None, exclude=None, max_depth=5):
+        """
+        Добавляет (или изменяет) корень библиотеки.\n
+        Аргументы:
+        name -- имя корня
+        path -- каталог с книгами
+        shard_path -- отдельная БД для книг корня (None -- главная БД)
+        file_types -- расширения файлов для обработки
+        exclude -- имена исключаемых каталогов
+        max_depth -- максимальная глубина обхода
+        """
+        if shard_path is not None:
+            shard_path = os.path.abspath(shard_path)
+            # Создаем схему шарда
+            BookAnalyzer(shard_path)
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('''
+            INSERT OR REPLACE INTO library_roots (name, path, shard_path, file_types, exclude, max_depth)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (name, os.path.abspath(path), shard_path, ','.join(file_types or DEFAULT_FILE_TYPES),
+              ','.join(exclude or []), max_depth))
+        conn.commit()
+        conn.close()
+
+    def remove_root(self, name):
+        # Удаляет корень из списка; книги в его шарде остаются
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('DELETE FROM library_roots WHERE name = ?', (name,))
+        conn.commit()
+        conn.close()
+
+    def get_roots(self):
+        conn = sqlite3.connect(self.db_path)
+        rows = conn.execute('SELECT name, path, shard_path, file_types, exclude, max_depth FROM library_roots ORDER BY name').fetchall()
+        conn.close()
+        return [LibraryRoot(name, path, shard_path or self.db_path, file_types.split(','),
+                            [item for item in exclude.split(',') if item], max_depth)
+                for name, path, shard_path, file_types, exclude, max_depth in rows]
+
+    def get_shard_paths(self):
+        # Главная БД всегда первая, затем отдельные шарды без повторов
+        paths = [os.path.abspath(self.db_path)]
+        for root in self.get_roots():
+            shard_path = os.path.abspath(root.shard_path)
+            if shard_path not in paths:
+                paths.append(shard_path)
+        return paths
+
+    def scan(self, names=None, concurrency=None, workers=None, **options):
+        """
+        Обрабатывает корни библиотеки.\n
+        Корни из разных шардов обрабатываются одновременно (у каждого шарда своя БД и своя
+        блокировка записи), корни одного шарда -- по очереди.\n
+        Аргументы:
+        names -- имена корней (None -- все)
+        concurrency -- сколько шардов обрабатывать одновременно (по умолчанию все)
+        workers -- процессов извлечения на шард (по умолчанию ядра делятся между шардами)
+        options -- дополнительные параметры BookAnalyzer.process_directory\n
+        Возвращает:
+        Словарь имя корня -> сообщение об ошибке или None.
+        """
+        roots = [root for root in self.get_roots() if names is None or root.name in names]
+        unknown = set(names or []) - {root.name for root in roots}
+        if unknown:
+            raise ValueError(f"Неизвестные корни библиотеки: {', '.join(sorted(unknown))}")
+
+        by_shard = {}
+        for root in roots:
+            by_shard.setdefault(os.path.abspath(root.shard_path), []).append(root)
+        if not by_shard:
+            return {}
+
+        concurrency = concurrency or len(by_shard)
+        if workers is None:
+            workers = max(1, (os.cpu_count() or 1) // min(concurrency, len(by_shard)))
+
+        def scan_shard(shard_path, shard_roots):
+            analyzer = self.get_analyzer(shard_path)
+            results = {}
+            for root in shard_roots:
+                try:
+                    analyzer.process_directory(root.path, root.file_types, root.exclude, root.max_depth,
+                                               workers=workers, **options)
+                    self.__mark_scanned(root.name)
+                    results[root.name] = None
+                except Exception as e:
+                    print(f"Ошибка обработки корня {root.name}: {e}")
+                    results[root.name] = str(e)
+            return results
+
+        results = {}
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = [executor.submit(scan_shard, shard_path, shard_roots) for shard_path, shard_roots in by_shard.items()]
+            for future in futures:
+                results.update(future.result())
+        return results
+
+    def __mark_scanned(self, name):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute('UPDATE library_roots SET last_scan = CURRENT_TIMESTAMP WHERE name = ?', (name,))
+        conn.commit()
+        conn.close()
+
+    def open_db(self):
+        """
+        Открывает главную БД и присоединяет к ней шарды.\n
+        Соединение принадлежит вызывающему коду (каждый запрос открывает свое), поэтому
+        запросы из разных потоков не мешают друг другу; закрывать его нужно в finally.\n
+        Возвращает:
+        Кортеж (соединение, словарь схема -> путь к шарду; первая схема -- main).
+        """
+        shard_paths = self.get_shard_paths()
+        if len(shard_paths) - 1 > MAX_ATTACHED:
+            raise ValueError(f"Слишком много шардов: {len(shard_paths) - 1}, SQLite присоединяет не более {MAX_ATTACHED}")
+        conn = sqlite3.connect(self.db_path)
+        schemas = {'main': shard_paths[0]}
+        try:
+            for number, shard_path in enumerate(shard_paths[1:], start=1):
+                schema = f"shard_{number}"
+                conn.execute('ATTACH DATABASE ? AS ' + schema, (shard_path,))
+                schemas[schema] = shard_path
+        except Exception:
+            conn.close()
+            raise
+        return conn, schemas
+
+    @staticmethod
+    def __fan_out(conn, schemas, query, params=()):
+        # Выполняет запрос в каждом шарде ({books} -- таблица книг шарда), возвращает списки строк по шардам
+        return [conn.execute(query.format(books=f"{schema}.books", schema=schema), params).fetchall()
+                for schema in schemas]
+
+    def __top_books(self, column, limit, offset, only_favorites):
+        # Первые limit + offset строк каждого шарда по убыванию column, слитые в один список
+        conn, schemas = self.open_db()
+        try:
+            condition = " WHERE favorite = 1" if only_favorites else ""
+            per_shard = self.__fan_out(conn, schemas, f"""
+                SELECT {column}, favorite, title, author, file_path FROM {{books}}{condition}
+                ORDER BY {column} DESC LIMIT ?
+            """, (limit + offset,))
+        finally:
+            conn.close()
+
+        merged = heapq.merge(*per_shard, key=lambda row: row[0] if row[0] is not None else -1, reverse=True)
+        return [row for _, row in zip(range(limit + offset), merged)][offset:]
+
+    # Самые большие книги во всех шардах
+    def get_largest_books(self, limit=5, offset=0, only_favorites=False):
+        rows = self.__top_books('file_size', limit, offset, only_favorites)
+        return [SizeRow(favorite, title, author, file_size, file_path) for file_size, favorite, title, author, file_path in rows]
+
+    # Книги с наибольшим количеством страниц во всех шардах
+    def get_books_with_most_pages(self, limit=5, offset=0, only_favorites=False):
+        rows = self.__top_books('num_pages', limit, offset, only_favorites)
+        return [PagesRow(favorite, title, author, num_pages, file_path) for num_pages, favorite, title, author, file_path in rows]
+
+    def __search(self, column, value, only_favorites):
+        conn, schemas = self.open_db()
+        try:
+            condition = " AND favorite = 1" if only_favorites else ""
+            per_shard = self.__fan_out(conn, schemas, f"""
+                SELECT favorite, title, author, {'file_ext' if column == 'file_ext' else 'num_pages'}, file_path
+                FROM {{books}} WHERE {column} LIKE ?{condition}
+            """, (f"%{value}%",))
+        finally:
+            conn.close()
+        record = ExtensionRow if column == 'file_ext' else PagesRow
+        return [record._make(row) for rows in per_shard for row in rows]
+
+    # Поиск книг по названию во всех шардах
+    def search_books_by_title(self, title, only_favorites=False):
+        return self.__search('title', title, only_favorites)
+
+    # Поиск книг по автору во всех шардах
+    def search_books_by_author(self, author, only_favorites=False):
+        return self.__search('author', author, only_favorites)
+
+    # Поиск книг по расширению файла во всех шардах
+    def search_books_by_extension(self, file_ext, only_favorites=False):
+        return self.__search('file_ext', file_ext, only_favorites)
+
+    # Количество книг по расширениям (сумма сводной статистики шардов)
+    def get_file_extension_statistics(self):
+        conn, schemas = self.open_db()
+        try:
+            union = " UNION ALL ".join(f"SELECT key, books FROM {schema}.library_stats WHERE dimension = 'ext'"
+                                       for schema in schemas)
+            rows = conn.execute(f"SELECT key, SUM(books) FROM ({union}) GROUP BY key ORDER BY 2 DESC").fetchall()
+        finally:
+            conn.close()
+        return [(file_ext or None, count) for file_ext, count in rows]
+
+    # Общие показатели всех шардов
+    def get_library_totals(self):
+        conn, schemas = self.open_db()
+        try:
+            per_shard = self.__fan_out(conn, schemas, """
+                SELECT books, total_size, total_pages, favorites FROM {schema}.library_stats WHERE dimension = 'all'
+            """)
+        finally:
+            conn.close()
+        totals = {'books': 0, 'total_size': 0, 'total_pages': 0, 'favorites': 0}
+        for rows in per_shard:
+            for row in rows:
+                for key, value in zip(totals, row):
+                    totals[key] += value or 0
+        return totals
+
+    # Количество книг и размер по корням библиотеки
+    def get_root_statistics(self):
+        roots = self.get_roots()
+        conn, schemas = self.open_db()
+        try:
+            result = []
+            for root in roots:
+                schema = next(schema for schema, path in schemas.items() if path == os.path.abspath(root.shard_path))
+                prefix = os.path.join(os.path.normpath(root.path), '')
+                books, total_size = conn.execute(
+                    f"SELECT COUNT(*), SUM(file_size) FROM {schema}.books WHERE substr(file_path, 1, ?) = ?",
+                    (len(prefix), prefix)).fetchone()
+                result.append((root.name, root.path, root.shard_path, books, pretty_size(total_size or 0)))
+        finally:
+            conn.close()
+        return result
+
+    def get_root_for_path(self, file_path):
+        # Корень, которому принадлежит файл (самый длинный подходящий путь)
+        roots = [root for root in self.get_roots() if root.contains(file_path)]
+        return max(roots, key=lambda root: len(root.path)) if roots else None
+
+    def get_analyzer_for_path(self, file_path):
+        """
+        BookAnalyzer шарда, в котором хранится книга, -- для запросов и изменений одной книги
+        (get_book_metadata, get_book_preview_path, update_book_favorite_status и т.д.).
+        """
+        root = self.get_root_for_path(file_path)
+        return self.get_analyzer(root.shard_path if root else self.db_path)
+
+    def get_analyzer(self, shard_path):
+        # BookAnalyzer шарда (общий для всех вызовов до close)
+        shard_path = os.path.abspath(shard_path)
+        with self.analyzers_lock:
+            analyzer = self.analyzers.get(shard_path)
+            if analyzer is None:
+                analyzer = self.analyzers[shard_path] = BookAnalyzer(shard_path)
+            return analyzer
+
+    def close(self):
+        # Закрывает соединения всех созданных BookAnalyzer
+        with self.analyzers_lock:
+            for analyzer in self.analyzers.values():
+                analyzer.close()
+            self.analyzers.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Book library with several roots and database shards')
+    parser.add_argument('--db_path', default='library.db', help='Main database (root list and books of unsharded roots)')
+    parser.add_argument('--add_root', nargs=2, metavar=('NAME', 'PATH'), help='Add or update a library root')
+    parser.add_argument('--shard', help='With --add_root, separate database file for the root')
+    parser.add_argument('--file_types', nargs='+', default=DEFAULT_FILE_TYPES, help='With --add_root, file types to process')
+    parser.add_argument('--exclude', nargs='+', default=[], help='With --add_root, directories to exclude')
+    parser.add_argument('--max_depth', type=int, default=5, help='With --add_root, maximum directory depth')
+    parser.add_argument('--remove_root', help='Remove a library root (its books stay in the shard)')
+    parser.add_argument('--scan', nargs='*', metavar='NAME', help='Scan the given roots (all if no names are given)')
+    parser.add_argument('--concurrency', type=int, help='Shards scanned at the same time')
+    parser.add_argument('--workers', type=int, help='Extraction processes per shard')
+    parser.add_argument('--largest', type=int, metavar='N', help='Print N largest books of all shards')
+    parser.add_argument('--search', help='Search books by title in all shards')
+    args = parser.parse_args()
+
+    library = BookLibrary(args.db_path)
+
+    if args.add_root is not None:
+        name, path = args.add_root
+        library.add_root(name, path, args.shard, args.file_types, args.exclude, args.max_depth)
+    if args.remove_root is not None:
+        library.remove_root(args.remove_root)
+
+    if args.scan is not None:
+        results = library.scan(args.scan or None, args.concurrency, args.workers)
+        for name, error in results.items():
+            print(f"{name}: {'ошибка: ' + error if error else 'готово'}")
+
+    if args.largest is not None:
+        for favorite, title, author, file_size, file_path in library.get_largest_books(args.largest):
+            print(f"{pretty_size(file_size or 0):>10}  {title} ({author or '-'})  {file_path}")
+    if args.search is not None:
+        for favorite, title, author, num_pages, file_path in library.search_books_by_title(args.search):
+            print(f"{title} ({author or '-'})  {file_path}")
+
+    for name, path, shard_path, books, total_size in library.get_root_statistics():
+        print(f"{name:<20}{books:>8} книг {total_size:>12}  {path} -> {shard_path}")
+    library.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+import math
+from collections import namedtuple
+
+import numpy as np
+
+import text_stats
+
+# Записи, которые возвращают запросы BookAnalyzer: кортежи с именованными полями и значениями
+# из БД как есть (favorite -- 0/1, file_size -- байты). Строки для показа ("Да"/"Нет", "10.5 МБ")
+# строятся только для строк, которые действительно выводятся: display() для одной записи,
+# display_rows() для списка -- по столбцам, форматирование размеров векторизовано (NumPy).
+# Записи занимают столько же памяти, сколько обычные кортежи (__slots__ пустой).
+
+SIZE_UNITS = ('байт', 'КБ', 'МБ', 'ГБ', 'ТБ', 'ПБ')
+
+
+def yes_no_indicator(value):
+    if value == 0:
+        return "Нет"
+    elif value == 1:
+        return "Да"
+    else:
+        return "Недопустимое значение"
+
+def pretty_size(size_bytes: int) -> str:
+    """
+    Конвертирует размер файла в формат, понятный человеку.\n
+    Аргументы:
+    size_bytes -- размер файла в байтах\n
+    Возвращает:
+    Строку, содержащую размер файла в формате, понятном человеку.
+    Например: "10.5 МБ", "678 КБ", "5 ГБ" и т.д.
+    """
+    units = SIZE_UNITS
+    if size_bytes < 1024:
+        return f"{size_bytes:.0f} {units[0]}"
+    exp = int(math.log(size_bytes, 1024))
+    size = size_bytes / 1024 ** exp
+    size_str = f"{size:.1f}"
+    return f"{size_str} {units[exp]}"
+
+
+def yes_no_indicators(values):
+    # yes_no_indicator для столбца значений
+    values = np.array(values, dtype=object)
+    return np.where(values == 1, "Да", np.where(values == 0, "Нет", "Недопустимое значение")).tolist()
+
+
+def pretty_sizes(values):
+    """
+    pretty_size для столбца значений (вычисления -- NumPy по всему столбцу сразу).\n
+    Аргументы:
+    values -- размеры в байтах (None -- пустая строка)\n
+    Возвращает:
+    Список строк.
+    """
+    sizes = np.array(values, dtype=np.float64)
+    exps = np.zeros(len(sizes), dtype=np.int64)
+    large = sizes >= 1024
+    exps[large] = np.minimum(np.log(sizes[large]) / math.log(1024), len(SIZE_UNITS) - 1).astype(np.int64)
+    scaled = (sizes / 1024.0 ** exps).tolist()
+    # Остается только подстановка числа в готовый шаблон единицы (NaN != NaN -- значение NULL)
+    templates = [f"{{:.0f}} {SIZE_UNITS[0]}"] + [f"{{:.1f}} {unit}" for unit in SIZE_UNITS[1:]]
+    return ['' if size != size else templates[exp].format(size) for size, exp in zip(scaled, exps.tolist())]
+
+
+def pretty_duration(seconds) -> str:
+    # Длительность в секундах с одним знаком после запятой, например "12.3 с"
+    return f"{seconds:.1f} с"
+
+
+def _optional(formatter):
+    # NULL из БД показывается пустой строкой
+    return lambda value: '' if value is None else formatter(value)
+
+
+# Поля, которые показываются не так, как хранятся: (для одного значения, для столбца)
+FORMATTERS = {
+    'favorite': (yes_no_indicator, yes_no_indicators),
+    'file_size': (_optional(pretty_size), pretty_sizes),
+    'reclaimable': (_optional(pretty_size), pretty_sizes),
+    'duration': (_optional(pretty_duration), lambda values: list(map(_optional(pretty_duration), values))),
+}
+
+
+class Record(tuple):
+    """
+    Основа классов записей (см. record_type). Значения хранятся без форматирования.
+    """
+    __slots__ = ()
+
+    def display(self):
+        # Кортеж для вывода (например, values строки ttk.Treeview)
+        return tuple(FORMATTERS[field][0](value) if field in FORMATTERS else value
+                     for field, value in zip(self._fields, self))
+
+    @classmethod
+    def display_rows(cls, rows):
+        # display() для списка записей: форматируемые столбцы обрабатываются целиком
+        if not rows:
+            return []
+        columns = list(zip(*rows))
+        for index, field in enumerate(cls._fields):
+            if field in FORMATTERS:
+                columns[index] = FORMATTERS[field][1](columns[index])
+        return list(zip(*columns))
+
+    @classmethod
+    def from_rows(cls, rows):
+        # Кортежи из курсора -> записи (без копирования значений)
+        return list(map(cls._make, rows))
+
+
+def record_type(name, fields):
+    """
+    Создает класс записи с именованными полями.\n
+    Аргументы:
+    name -- имя класса
+    fields -- имена полей (столбцы запроса)\n
+    Возвращает:
+    Подкласс Record и namedtuple.
+    """
+    return type(name, (Record, namedtuple(name, fields)), {'__slots__': ()})
+
+
+def display_rows(rows):
+    # Строки для вывода списка записей одного типа (пустой список -- пустой результат)
+    return type(rows[0]).display_rows(rows) if rows else []
+
+
+BookRow = record_type('BookRow', ('favorite', 'title', 'author', 'file_ext', 'file_path', 'file_size', 'num_pages',
+                                  'metadata'))
+PagesRow = record_type('PagesRow', ('favorite', 'title', 'author', 'num_pages', 'file_path'))
+ExtensionRow = record_type('ExtensionRow', ('favorite', 'title', 'author', 'file_ext', 'file_path'))
+SizeRow = record_type('SizeRow', ('favorite', 'title', 'author', 'file_size', 'file_path'))
+RecentRow = record_type('RecentRow', ('favorite', 'title', 'author', 'file_path'))
+NoAuthorRow = record_type('NoAuthorRow', ('favorite', 'title', 'num_pages', 'file_path'))
+NoMetadataRow = record_type('NoMetadataRow', ('favorite', 'title', 'file_ext', 'file_size', 'file_path'))
+MetadataRow = record_type('MetadataRow', ('favorite', 'title', 'author', 'file_path', 'metadata'))
+SimilarCoverRow = record_type('SimilarCoverRow', ('distance', 'favorite', 'title', 'author', 'num_pages', 'file_path'))
+FailureRow = record_type('FailureRow', ('failed_at', 'stage', 'error', 'duration', 'file_path'))
+DuplicateGroupRow = record_type('DuplicateGroupRow', ('kind', 'count', 'reclaimable', 'group'))
+
+
+class TextStatisticsRow(record_type('_TextStatisticsRow', ('favorite', 'title', 'author', 'word_count', 'char_count',
+                                                            'sentence_count', 'script', 'language', 'file_path'))):
+    # Время чтения и средняя длина предложения вычисляются только при выводе
+    __slots__ = ()
+
+    def display(self):
+        return (yes_no_indicator(self.favorite), self.title, self.author, self.word_count, self.char_count,
+                text_stats.reading_minutes(self.word_count),
+                round(self.word_count / self.sentence_count, 1) if self.sentence_count else 0,
+                self.script or '', self.language or '', self.file_path)
+
+    @classmethod
+    def display_rows(cls, rows):
+        return [row.display() for row in rows]
@@ -0,0 +1,331 @@
+"""
+HTTP/JSON API над базой данных BookAnalyzer.
+
+Пример:
+    python book_server.py --db_path books.db --port 8080
+
+Маршруты (GET, если не указано иное):
+    /books?limit=&offset=&favorites=1          -- список книг (потоковый ответ)
+    /search?by=title|author|extension|metadata&q=&favorites=1
+    /top/largest|pages|recent?limit=&offset=&favorites=1
+    /without/author|metadata?favorites=1
+    /stats/extensions                          -- количество книг по расширениям
+    /preview?id= или /preview?path=            -- изображение превью (ETag, 304)
+    /metadata?path=                            -- метаданные книги
+    POST /favorite?path=                       -- переключить признак "избранное"
+"""
+import ast
+import json
+import zlib
+import asyncio
+import argparse
+from urllib.parse import urlsplit, parse_qs
+from concurrent.futures import ThreadPoolExecutor
+
+from bookAnalyzer import BookAnalyzer
+import web_catalog
+
+STREAM_BATCH = 500
+MAX_HEADER_SIZE = 64 * 1024
+
+STATUS_TEXT = {200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found',
+               405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+IMAGE_TYPES = {'.png': 'image/png', '.jpg': 'image/jpeg', '.gif': 'image/gif', '.bin': 'application/octet-stream'}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def query_param(params, name, default=None):
+    values = params.get(name)
+    return values[0] if values else default
+
+
+def int_param(params, name, default):
+    try:
+        return int(query_param(params, name, default))
+    except (TypeError, ValueError):
+        raise HttpError(400, f"Параметр {name} должен быть целым числом")
+
+
+def only_favorites(params):
+    return query_param(params, 'favorites') in ('1', 'true')
+
+
+def records_response(rows):
+    return json_response([row._asdict() for row in rows])
+
+
+def parse_metadata(value):
+    # Метаданные хранятся как str(dict); если строку не удается разобрать, отдаем ее как есть
+    if value is None or value == 'None':
+        return None
+    try:
+        return ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return value
+
+
+class BookServer:
+    def __init__(self, db_path, pool_size=8):
+        # BookAnalyzer переводит БД в режим WAL, чтобы ее можно было читать во время записи.
+        # Чтение идет через его пул соединений и кеш запросов, поэтому отдельный пул серверу не нужен
+        self.analyzer = BookAnalyzer(db_path, read_pool_size=pool_size)
+
+        self.readers = ThreadPoolExecutor(max_workers=pool_size)
+        # Все записи выполняются последовательно в одном потоке
+        self.writer = ThreadPoolExecutor(max_workers=1)
+        self.routes = {
+            ('GET', '/books'): self.list_books,
+            ('GET', '/search'): self.search_books,
+            ('GET', '/top/largest'): self.top_books,
+            ('GET', '/top/pages'): self.top_books,
+            ('GET', '/top/recent'): self.top_books,
+            ('GET', '/without/author'): self.books_without,
+            ('GET', '/without/metadata'): self.books_without,
+            ('GET', '/stats/extensions'): self.extension_statistics,
+            ('GET', '/preview'): self.preview,
+            ('GET', '/metadata'): self.metadata,
+            ('POST', '/favorite'): self.toggle_favorite,
+        }
+
+    async def read(self, method, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.readers, method, *args)
+
+    # Обработчики возвращают (статус, заголовки, тело) или асинхронный генератор частей тела
+
+    async def list_books(self, params, headers):
+        limit = int_param(params, 'limit', -1)
+        offset = int_param(params, 'offset', 0)
+        columns = ('id', 'favorite', 'title', 'author', 'file_ext', 'file_path', 'file_size', 'num_pages')
+        return self.stream_rows(columns, only_favorites(params), limit, offset)
+
+    async def search_books(self, params, headers):
+        methods_by_field = {'title': self.analyzer.search_books_by_title,
+                            'author': self.analyzer.search_books_by_author,
+                            'extension': self.analyzer.search_books_by_extension,
+                            'metadata': self.analyzer.search_books_by_metadata}
+        method = methods_by_field.get(query_param(params, 'by', 'title'))
+        if method is None:
+            raise HttpError(400, "Параметр by: title, author, extension или metadata")
+        rows = await self.read(method, query_param(params, 'q', ''), only_favorites(params))
+        return records_response(rows)
+
+    async def top_books(self, params, headers, path=None):
+        method = {'/top/largest': self.analyzer.get_largest_books,
+                  '/top/pages': self.analyzer.get_books_with_most_pages,
+                  '/top/recent': self.analyzer.get_recently_added_books}[path]
+        limit = int_param(params, 'limit', 5)
+        offset = int_param(params, 'offset', 0)
+        rows = await self.read(method, limit, offset, only_favorites(params))
+        return records_response(rows)
+
+    async def books_without(self, params, headers, path=None):
+        method = {'/without/author': self.analyzer.get_books_without_author,
+                  '/without/metadata': self.analyzer.get_books_without_metadata}[path]
+        rows = await self.read(method, only_favorites(params))
+        return records_response(rows)
+
+    async def extension_statistics(self, params, headers):
+        rows = await self.read(self.analyzer.get_file_extension_statistics)
+        return json_response({file_ext: count for file_ext, count in rows})
+
+    async def preview(self, params, headers):
+        if 'id' in params:
+            info = await self.read(self.analyzer.get_book_preview_info, int_param(params, 'id', None))
+        elif 'path' in params:
+            info = await self.read(self.analyzer.get_book_preview_info, None, query_param(params, 'path'))
+        else:
+            raise HttpError(400, "Нужен параметр id или path")
+
+        # Сначала проверяем ETag, чтобы не читать BLOB, если у клиента уже есть актуальная копия
+        if info is None or not info[2]:
+            raise HttpError(404, "Превью не найдено")
+        book_id, content_hash, preview_size = info
+        etag = f'"{content_hash}-{preview_size}"' if content_hash else None
+        cache_headers = {'Cache-Control': 'public, max-age=300'}
+        if etag:
+            cache_headers['ETag'] = etag
+            if headers.get('if-none-match') == etag:
+                return 304, cache_headers, b''
+
+        preview = await self.read(self.analyzer.get_book_preview, book_id)
+        if preview is None:
+            raise HttpError(404, "Превью не найдено")
+        if not etag:
+            cache_headers['ETag'] = f'"{book_id}-{zlib.crc32(preview):08x}"'
+            if headers.get('if-none-match') == cache_headers['ETag']:
+                return 304, cache_headers, b''
+        content_type = IMAGE_TYPES[web_catalog.image_extension(preview)]
+        return 200, {'Content-Type': content_type, **cache_headers}, preview
+
+    async def metadata(self, params, headers):
+        book = await self.read(self.analyzer.get_book, query_param(params, 'path'))
+        if book is None:
+            raise HttpError(404, "Книга не найдена")
+        return json_response(parse_metadata(book.metadata))
+
+    async def toggle_favorite(self, params, headers):
+        file_path = query_param(params, 'path')
+        if not file_path:
+            raise HttpError(400, "Нужен параметр path")
+        if await self.read(self.analyzer.get_book, file_path) is None:
+            raise HttpError(404, "Книга не найдена")
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.writer, self.analyzer.update_book_favorite_status, file_path)
+        # Запись сбросила кеш запросов, поэтому читаем уже новое значение
+        book = await self.read(self.analyzer.get_book, file_path)
+        return json_response({'file_path': file_path, 'favorite': book.favorite if book else None})
+
+    async def stream_rows(self, columns, favorites, limit, offset):
+        """
+        Отдает список книг частями по STREAM_BATCH строк, поэтому большой список не собирается
+        в памяти целиком. Каждая страница читается отдельным коротким запросом (по ключу id),
+        и медленный клиент не удерживает соединение пула, пока ждет отправки.
+        """
+        yield b'['
+        first = True
+        last_id = 0
+        while limit != 0:
+            page_size = STREAM_BATCH if limit < 0 else min(STREAM_BATCH, limit)
+            last_id, rows = await self.read(self.analyzer.get_book_rows_page, columns, favorites, last_id,
+                                            page_size, offset)
+            if not rows:
+                break
+            offset = 0
+            if limit > 0:
+                limit -= len(rows)
+            chunk = ",".join(json.dumps(dict(zip(columns, row)), ensure_ascii=False) for row in rows)
+            yield (chunk if first else "," + chunk).encode('utf-8')
+            first = False
+        yield b']'
+
+    async def handle_connection(self, reader, writer):
+        # Обрабатываем запросы одного соединения (keep-alive), пока клиент его не закроет
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                lines = head.decode('latin-1').split('\r\n')
+                try:
+                    method, target, version = lines[0].split(' ', 2)
+                except ValueError:
+                    await self.send(writer, *error_response(400, "Некорректный запрос"), keep_alive=False)
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    if ':' in line:
+                        name, value = line.split(':', 1)
+                        headers[name.strip().lower()] = value.strip()
+
+                try:
+                    body_size = int(headers.get('content-length') or 0)
+                    if body_size < 0:
+                        raise ValueError(body_size)
+                except ValueError:
+                    await self.send(writer, *error_response(400, "Некорректный заголовок Content-Length"),
+                                    keep_alive=False)
+                    break
+                if body_size:
+                    await reader.readexactly(body_size)
+
+                keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+                url = urlsplit(target)
+                params = parse_qs(url.query)
+                handler = self.routes.get((method, url.path))
+                try:
+                    if handler is None:
+                        known_path = any(path == url.path for _, path in self.routes)
+                        raise HttpError(405 if known_path else 404, "Маршрут не найден")
+                    if url.path.startswith(('/top/', '/without/')):
+                        response = await handler(params, headers, path=url.path)
+                    else:
+                        response = await handler(params, headers)
+                except HttpError as e:
+                    response = error_response(e.status, str(e))
+                except Exception as e:
+                    response = error_response(500, str(e))
+
+                if isinstance(response, tuple):
+                    await self.send(writer, *response, keep_alive=keep_alive)
+                else:
+                    await self.send_stream(writer, response, keep_alive=keep_alive)
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def send(writer, status, headers, body, keep_alive=True):
+        head = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}", f"Content-Length: {len(body)}",
+                f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        head += [f"{name}: {value}" for name, value in headers.items()]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode('latin-1') + body)
+        await writer.drain()
+
+    @staticmethod
+    async def send_stream(writer, chunks, keep_alive=True):
+        # Chunked transfer encoding: размер ответа заранее неизвестен
+        head = ["HTTP/1.1 200 OK", "Content-Type: application/json; charset=utf-8", "Transfer-Encoding: chunked",
+                f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode('latin-1'))
+        try:
+            async for chunk in chunks:
+                writer.write(f"{len(chunk):x}\r\n".encode('latin-1') + chunk + b"\r\n")
+                await writer.drain()
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+        finally:
+            # Если клиент отключился, генератор больше не нужен
+            await chunks.aclose()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle_connection, host, port, limit=MAX_HEADER_SIZE)
+        print(f"Сервер запущен: http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.readers.shutdown()
+        self.writer.shutdown()
+        self.analyzer.close()
+
+
+def json_response(data, status=200):
+    body = json.dumps(data, ensure_ascii=False, default=str).encode('utf-8')
+    return status, {'Content-Type': 'application/json; charset=utf-8'}, body
+
+
+def error_response(status, message):
+    return json_response({'error': message}, status)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='HTTP/JSON API for the BookAnalyzer database')
+    parser.add_argument('--db_path', default='books.db', help='Path to the database file')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=8080, help='Port to listen on')
+    parser.add_argument('--pool_size', type=int, default=8, help='Read-only SQLite connections in the pool')
+    args = parser.parse_args()
+
+    server = BookServer(args.db_path, args.pool_size)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == '__main__':
+    main()
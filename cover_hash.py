@@ -0,0 +1,109 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+# Перцептивные хеши обложек (превью PDF и ePub) для поиска книг с одинаковой обложкой в разных
+# изданиях и форматах. Хеш -- 64 бита, похожие изображения отличаются в немногих битах
+# (расстояние Хэмминга). Для поиска без сравнения со всеми книгами хеш делится на COVER_BANDS
+# частей по 16 бит (multi-index hashing): если хеши отличаются не более чем в r битах, то хотя бы
+# одна часть отличается не более чем в r // COVER_BANDS битах, поэтому кандидатов достаточно искать
+# по индексу среди значений частей, близких к частям искомого хеша (таблица cover_hash_bands).
+
+HASH_METHODS = ('ahash', 'dhash', 'phash')
+COVER_BANDS = 4
+BAND_BITS = 64 // COVER_BANDS
+# Порог "та же обложка" по умолчанию (из 64 бит)
+COVER_DISTANCE = 10
+# Изображения почти одного цвета (пустая страница) не хешируются: у всех них был бы один хеш
+MIN_CONTRAST = 2.0
+
+# Матрица DCT-II 32x32 для pHash
+_DCT_SIZE = 32
+_DCT = np.array([[np.cos(np.pi * (2 * x + 1) * u / (2 * _DCT_SIZE)) for x in range(_DCT_SIZE)]
+                 for u in range(_DCT_SIZE)]) * np.sqrt(2 / _DCT_SIZE)
+_DCT[0] /= np.sqrt(2)
+
+
+def _grayscale(image_bytes, size):
+    # Уменьшенное изображение в оттенках серого как массив float (высота, ширина)
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        image.draft('L', (size[0] * 4, size[1] * 4))
+        pixels = image.convert('L').resize(size, Image.Resampling.LANCZOS)
+    return np.asarray(pixels, dtype=np.float32)
+
+
+def _to_int(bits):
+    # Массив из 64 логических значений -> целое без знака (первый бит -- старший)
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), 'big')
+
+
+def image_hash(image_bytes, method='dhash'):
+    """
+    Вычисляет перцептивный хеш изображения.\n
+    Аргументы:
+    image_bytes -- изображение (PNG, JPEG и т.д.) в виде байтов
+    method -- 'ahash' (яркость выше средней), 'dhash' (градиенты соседних точек)
+    или 'phash' (низкие частоты DCT)\n
+    Возвращает:
+    64-битное целое без знака или None для однотонного изображения.
+    """
+    if method == 'dhash':
+        pixels = _grayscale(image_bytes, (9, 8))
+        bits = pixels[:, 1:] > pixels[:, :-1]
+    elif method == 'ahash':
+        pixels = _grayscale(image_bytes, (8, 8))
+        bits = pixels > pixels.mean()
+    elif method == 'phash':
+        pixels = _grayscale(image_bytes, (_DCT_SIZE, _DCT_SIZE))
+        low = (_DCT @ pixels @ _DCT.T)[:8, :8]
+        # Постоянная составляющая (средняя яркость) в медиану не входит
+        bits = low > np.median(low.ravel()[1:])
+    else:
+        raise ValueError(f"Неизвестный метод хеширования изображений: {method}")
+    if pixels.std() < MIN_CONTRAST:
+        return None
+    return _to_int(bits)
+
+
+def to_signed(value):
+    # SQLite хранит INTEGER со знаком: старший бит хеша становится знаком
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def to_unsigned(value):
+    return value + (1 << 64) if value < 0 else value
+
+
+def hamming(first, second) -> int:
+    return bin(to_unsigned(first) ^ to_unsigned(second)).count('1')
+
+
+def hash_bands(value):
+    # Части хеша: (номер части, значение из BAND_BITS бит)
+    value = to_unsigned(value)
+    mask = (1 << BAND_BITS) - 1
+    return [(band, (value >> (BAND_BITS * band)) & mask) for band in range(COVER_BANDS)]
+
+
+def band_variants(value, radius):
+    """
+    Все значения части хеша, отличающиеся от value не более чем в radius битах.\n
+    Аргументы:
+    value -- значение части хеша
+    radius -- максимальное количество отличающихся бит\n
+    Возвращает:
+    Список значений (для radius=2 и 16 бит -- 137 значений).
+    """
+    variants = [value]
+    frontier = [(value, -1)]
+    for _ in range(radius):
+        next_frontier = []
+        for variant, last_bit in frontier:
+            # Биты перебираются по возрастанию, чтобы каждое значение получилось один раз
+            for bit in range(last_bit + 1, BAND_BITS):
+                flipped = variant ^ (1 << bit)
+                variants.append(flipped)
+                next_frontier.append((flipped, bit))
+        frontier = next_frontier
+    return variants
@@ -0,0 +1,107 @@
+import os
+import mmap
+import hashlib
+
+# Хеши содержимого файлов книг. Файл отображается в память (mmap) и передается функции хеширования
+# срезами memoryview, поэтому данные не копируются в буферы Python и не занимают память процесса
+# сверх кеша страниц ОС. Два режима:
+#   full    -- хеш всего содержимого (content_hash для поиска точных дубликатов);
+#   sampled -- хеш размера, начала, конца и нескольких блоков из середины файла: читается
+#              не больше SAMPLE_COUNT * SAMPLE_SIZE байт при любом размере файла.
+# Алгоритмы: BLAKE2b (стандартная библиотека) или xxHash XXH3 (нужен пакет xxhash; в разы быстрее,
+# но его значения несовместимы с уже сохраненными хешами BLAKE2b).
+
+HASH_MODES = ('full', 'sampled')
+DIGEST_SIZE = 16
+# Размер среза, передаваемого функции хеширования за один вызов
+CHUNK_SIZE = 8 * 1024 ** 2
+# Блоки выборочного хеша: начало, конец и равномерно расположенные блоки между ними
+SAMPLE_SIZE = 64 * 1024
+SAMPLE_COUNT = 8
+# Префикс выборочного хеша, чтобы он никогда не совпал с полным хешем другого файла
+SAMPLED_PREFIX = '~'
+
+
+def is_full_hash(value):
+    # Хеш всего содержимого: только такие хеши означают одинаковое содержимое файлов
+    # (у разных файлов одного размера выборочные хеши могут совпасть)
+    return bool(value) and not value.startswith(SAMPLED_PREFIX)
+
+
+def new_digest(algorithm='blake2b'):
+    # Объект хеширования с методами update и hexdigest
+    if algorithm == 'blake2b':
+        return hashlib.blake2b(digest_size=DIGEST_SIZE)
+    if algorithm == 'xxh3':
+        import xxhash
+        return xxhash.xxh3_128()
+    raise ValueError(f"Неизвестный алгоритм хеширования: {algorithm}")
+
+
+def stat_key(stat):
+    # Ключ кеша хешей: файл (устройство и inode) и признаки его изменения (размер и время в наносекундах).
+    # Некоторые файловые системы не сообщают inode (0) или выдают числа, не помещающиеся в INTEGER SQLite
+    if not 0 < stat.st_ino < 2 ** 63 or not 0 <= stat.st_dev < 2 ** 63:
+        return None
+    return stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+def _sample_offsets(size, sample_size=SAMPLE_SIZE, count=SAMPLE_COUNT):
+    # Смещения блоков выборки: первый блок с начала файла, последний -- в конце
+    step = (size - sample_size) / (count - 1)
+    return [round(step * i) for i in range(count)]
+
+
+def hashed_size(size, mode='full'):
+    # Сколько байт содержимого читает хеширование файла такого размера
+    if mode == 'sampled' and size > SAMPLE_SIZE * SAMPLE_COUNT:
+        return SAMPLE_SIZE * SAMPLE_COUNT
+    return size
+
+
+def hash_buffer(data, mode='full', algorithm='blake2b') -> str:
+    """
+    Хеширует содержимое, уже находящееся в памяти (bytes, memoryview или mmap).\n
+    Аргументы:
+    data -- содержимое файла
+    mode -- 'full' или 'sampled'
+    algorithm -- 'blake2b' или 'xxh3'\n
+    Возвращает:
+    Шестнадцатеричная строка хеша (выборочный хеш начинается с SAMPLED_PREFIX).
+    """
+    if mode not in HASH_MODES:
+        raise ValueError(f"Неизвестный режим хеширования: {mode}")
+    digest = new_digest(algorithm)
+    # memoryview освобождается сразу, иначе отображение файла нельзя будет закрыть
+    with memoryview(data) as view:
+        size = len(view)
+        if mode == 'sampled' and size > SAMPLE_SIZE * SAMPLE_COUNT:
+            digest.update(size.to_bytes(8, 'little'))
+            for offset in _sample_offsets(size):
+                digest.update(view[offset:offset + SAMPLE_SIZE])
+            return SAMPLED_PREFIX + digest.hexdigest()
+        # Маленький файл в режиме sampled хешируется целиком (с тем же префиксом)
+        for start in range(0, size, CHUNK_SIZE):
+            digest.update(view[start:start + CHUNK_SIZE])
+    return (SAMPLED_PREFIX if mode == 'sampled' else '') + digest.hexdigest()
+
+
+def hash_file(file_path, mode='full', algorithm='blake2b') -> str:
+    """
+    Хеширует файл через отображение в память.\n
+    Аргументы:
+    file_path -- путь к файлу
+    mode -- 'full' или 'sampled'
+    algorithm -- 'blake2b' или 'xxh3'\n
+    Возвращает:
+    Шестнадцатеричная строка хеша.
+    """
+    with open(file_path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            # Пустой файл нельзя отобразить в память
+            return hash_buffer(b'', mode, algorithm)
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if mode == 'full' and hasattr(data, 'madvise'):
+                # Файл читается подряд: ОС может читать вперед большими блоками
+                data.madvise(mmap.MADV_SEQUENTIAL)
+            return hash_buffer(data, mode, algorithm)
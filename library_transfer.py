@@ -0,0 +1,169 @@
+import io
+import gzip
+import json
+import base64
+import tarfile
+
+import web_catalog
+
+# Форматы файлов для переноса каталога между машинами (используются в BookAnalyzer.export_library
+# и BookAnalyzer.import_library): JSONL (можно сжать .gz) или Parquet (нужен пакет pyarrow).
+# Превью хранятся отдельно, в tar-архиве, в том же порядке, что и строки каталога.
+
+FORMAT_NAME = 'book_analyzer'
+FORMAT_VERSION = 1
+
+EXPORT_COLUMNS = ('file_path', 'title', 'author', 'file_ext', 'file_size', 'num_pages', 'metadata', 'favorite',
+                  'content_hash', 'signature', 'minhash', 'char_count', 'word_count', 'sentence_count',
+                  'script', 'language', 'cover_hash', 'preview')
+BINARY_COLUMNS = ('minhash',)
+
+
+def is_parquet(path):
+    return path.lower().endswith(('.parquet', '.pq'))
+
+
+def _open_text(path, mode):
+    if path.lower().endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8', compresslevel=3)
+    return open(path, mode, encoding='utf-8')
+
+
+class JsonlWriter:
+    # Первая строка -- заголовок с версией формата, далее одна книга на строку
+    def __init__(self, path):
+        self.file = _open_text(path, 'w')
+        self.file.write(json.dumps({'format': FORMAT_NAME, 'version': FORMAT_VERSION, 'columns': EXPORT_COLUMNS}) + "\n")
+
+    def write(self, rows):
+        lines = []
+        for row in rows:
+            row = dict(row)
+            for column in BINARY_COLUMNS:
+                if row[column] is not None:
+                    row[column] = base64.b64encode(row[column]).decode('ascii')
+            lines.append(json.dumps(row, ensure_ascii=False))
+        self.file.write("\n".join(lines) + "\n")
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    # Каждый пакет строк записывается отдельной группой строк Parquet
+    def __init__(self, path):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self.pa = pa
+        types = {'file_size': pa.int64(), 'num_pages': pa.int64(), 'favorite': pa.int64(), 'char_count': pa.int64(),
+                 'word_count': pa.int64(), 'sentence_count': pa.int64(), 'cover_hash': pa.int64(),
+                 'minhash': pa.binary()}
+        self.schema = pa.schema([(column, types.get(column, pa.string())) for column in EXPORT_COLUMNS],
+                                metadata={'format': FORMAT_NAME, 'version': str(FORMAT_VERSION)})
+        self.writer = pq.ParquetWriter(path, self.schema, compression='zstd')
+
+    def write(self, rows):
+        self.writer.write_batch(self.pa.RecordBatch.from_pylist(rows, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+def open_writer(path):
+    return ParquetWriter(path) if is_parquet(path) else JsonlWriter(path)
+
+
+def read_jsonl(path, batch_size):
+    # Строки файла пакетами по batch_size, двоичные столбцы декодируются из base64
+    with _open_text(path, 'r') as file:
+        header = json.loads(file.readline() or 'null')
+        if not isinstance(header, dict) or header.get('format') != FORMAT_NAME:
+            raise ValueError(f"Файл {path} не является экспортом каталога книг")
+        if header.get('version', 0) > FORMAT_VERSION:
+            raise ValueError(f"Неподдерживаемая версия формата: {header.get('version')}")
+        batch = []
+        for line in file:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            for column in BINARY_COLUMNS:
+                if row.get(column) is not None:
+                    row[column] = base64.b64decode(row[column])
+            batch.append(row)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+def read_parquet(path, batch_size):
+    import pyarrow.parquet as pq
+    parquet_file = pq.ParquetFile(path)
+    metadata = parquet_file.schema_arrow.metadata or {}
+    if metadata.get(b'format') != FORMAT_NAME.encode():
+        raise ValueError(f"Файл {path} не является экспортом каталога книг")
+    for record_batch in parquet_file.iter_batches(batch_size=batch_size):
+        yield record_batch.to_pylist()
+
+
+def read_batches(path, batch_size):
+    return read_parquet(path, batch_size) if is_parquet(path) else read_jsonl(path, batch_size)
+
+
+class PreviewArchiveWriter:
+    # Потоковая запись превью в tar (без произвольного доступа, поэтому память не растет)
+    def __init__(self, path):
+        self.tar = tarfile.open(path, 'w|gz' if path.lower().endswith(('.tar.gz', '.tgz')) else 'w|')
+
+    def add(self, number, preview):
+        # Возвращает имя файла превью в архиве
+        name = f"previews/{number:08d}{web_catalog.image_extension(preview)}"
+        info = tarfile.TarInfo(name)
+        info.size = len(preview)
+        self.tar.addfile(info, io.BytesIO(preview))
+        return name
+
+    def close(self):
+        self.tar.close()
+
+
+class PreviewArchiveReader:
+    """
+    Последовательное чтение превью из tar. Превью запрашиваются в том же порядке,
+    в котором были записаны, поэтому архив читается за один проход.
+    """
+    def __init__(self, path):
+        self.tar = tarfile.open(path, 'r|*')
+        self.members = iter(self.tar)
+
+    def get(self, name):
+        for member in self.members:
+            if member.name == name:
+                return self.tar.extractfile(member).read()
+        return None
+
+    def close(self):
+        self.tar.close()
+
+
+def remap_path(file_path, path_map):
+    """
+    Заменяет начало пути по таблице соответствия корней.\n
+    Аргументы:
+    file_path -- путь на исходной машине
+    path_map -- список пар (старый корень, новый корень); выбирается самый длинный подходящий\n
+    Возвращает:
+    Путь на текущей машине.
+    """
+    best = None
+    for old_root, new_root in path_map or ():
+        # Корень совпадает только целиком: '/books' не подходит для '/books2/x.pdf'.
+        # Разделитель любой, каталог мог быть выгружен на Windows
+        old_root = old_root.rstrip('/\\')
+        matches = file_path == old_root or (file_path.startswith(old_root) and file_path[len(old_root)] in '/\\')
+        if matches and (best is None or len(old_root) > len(best[0])):
+            best = (old_root, new_root.rstrip('/\\'))
+    if best is None:
+        return file_path
+    return best[1] + file_path[len(best[0]):]
@@ -0,0 +1,407 @@
+import re
+import mmap
+import zlib
+
+# Быстрое чтение количества страниц и словаря Info из PDF без полного разбора документа.
+# Читаются только таблица ссылок (xref) из конца файла, каталог (/Root), корень дерева
+# страниц (/Pages /Count) и словарь /Info; файл отображается в память (mmap), поэтому
+# с диска читаются лишь нужные страницы файла. При любой неожиданности выбрасывается
+# PdfProbeError, и вызывающий код переходит к полному разбору PyPDF2.
+
+_SPACE = re.compile(rb'(?:[\x00\t\n\f\r ]+|%[^\r\n]*)*')
+_TOKEN = re.compile(rb'<<|>>|\[|\]|\(|/[^\x00\t\n\f\r ()<>\[\]{}/%]*|<[0-9A-Fa-f\x00\t\n\f\r ]*>|'
+                    rb'[-+]?(?:\d+\.?\d*|\.\d+)|[A-Za-z]+')
+_REFERENCE = re.compile(rb'(\d+)[\x00\t\n\f\r ]+(\d+)[\x00\t\n\f\r ]+R(?![A-Za-z])')
+_OBJECT_HEADER = re.compile(rb'[\x00\t\n\f\r ]*(\d+)[\x00\t\n\f\r ]+(\d+)[\x00\t\n\f\r ]+obj')
+_XREF_SUBSECTION = re.compile(rb'(\d+)[ \t]+(\d+)[\x00\t\n\f\r ]*')
+_XREF_ENTRY = re.compile(rb'(\d{10}) (\d{5}) ([nf])')
+_NAME_ESCAPE = re.compile(rb'#([0-9A-Fa-f]{2})')
+_ESCAPES = {ord('n'): b'\n', ord('r'): b'\r', ord('t'): b'\t', ord('b'): b'\b', ord('f'): b'\f',
+            ord('('): b'(', ord(')'): b')', ord('\\'): b'\\'}
+
+
+class PdfProbeError(Exception):
+    pass
+
+
+class Reference:
+    __slots__ = ('num', 'gen')
+
+    def __init__(self, num, gen):
+        self.num = num
+        self.gen = gen
+
+
+class Name(str):
+    pass
+
+
+class _Parser:
+    # Разбор объектов PDF (словари, массивы, строки, имена, числа, ссылки) из буфера
+    def __init__(self, data, pos=0):
+        self.data = data
+        self.pos = pos
+
+    def skip_space(self):
+        self.pos = _SPACE.match(self.data, self.pos).end()
+
+    def parse(self):
+        self.skip_space()
+        reference = _REFERENCE.match(self.data, self.pos)
+        if reference:
+            self.pos = reference.end()
+            return Reference(int(reference.group(1)), int(reference.group(2)))
+
+        token = _TOKEN.match(self.data, self.pos)
+        if token is None:
+            raise PdfProbeError(f"Неожиданные данные в позиции {self.pos}")
+        value = token.group()
+        self.pos = token.end()
+
+        if value == b'<<':
+            result = {}
+            while True:
+                self.skip_space()
+                if self.data[self.pos:self.pos + 2] == b'>>':
+                    self.pos += 2
+                    return result
+                key = self.parse()
+                if not isinstance(key, Name):
+                    raise PdfProbeError("Ключ словаря не является именем")
+                result[key] = self.parse()
+        if value == b'[':
+            result = []
+            while True:
+                self.skip_space()
+                if self.data[self.pos:self.pos + 1] == b']':
+                    self.pos += 1
+                    return result
+                result.append(self.parse())
+        if value == b'(':
+            return self.literal_string()
+        if value.startswith(b'/'):
+            return Name(_NAME_ESCAPE.sub(lambda m: bytes.fromhex(m.group(1).decode()), value[1:]).decode('latin-1'))
+        if value.startswith(b'<'):
+            digits = re.sub(rb'[^0-9A-Fa-f]', b'', value[1:-1])
+            return bytes.fromhex((digits + b'0' * (len(digits) % 2)).decode())
+        if value[:1].isdigit() or value[:1] in b'+-.':
+            return float(value) if b'.' in value else int(value)
+        if value == b'true':
+            return True
+        if value == b'false':
+            return False
+        if value == b'null':
+            return None
+        raise PdfProbeError(f"Неожиданное ключевое слово {value!r}")
+
+    def literal_string(self):
+        data = self.data
+        result = bytearray()
+        depth = 1
+        pos = self.pos
+        while True:
+            char = data[pos]
+            pos += 1
+            if char == 0x5C:  # обратная косая черта
+                char = data[pos]
+                pos += 1
+                if char in _ESCAPES:
+                    result += _ESCAPES[char]
+                elif 0x30 <= char <= 0x37:
+                    octal = bytes([char])
+                    while len(octal) < 3 and 0x30 <= data[pos] <= 0x37:
+                        octal += bytes([data[pos]])
+                        pos += 1
+                    result.append(int(octal, 8) & 0xFF)
+                elif char == 0x0D:
+                    # Перенос строки внутри строки игнорируется
+                    if data[pos] == 0x0A:
+                        pos += 1
+                elif char != 0x0A:
+                    result.append(char)
+            elif char == 0x28:
+                depth += 1
+                result.append(char)
+            elif char == 0x29:
+                depth -= 1
+                if depth == 0:
+                    self.pos = pos
+                    return bytes(result)
+                result.append(char)
+            else:
+                result.append(char)
+
+
+def _png_unpredict(data, columns):
+    # Фильтры PNG (предиктор 10-15) для строк по columns байт
+    row_size = columns + 1
+    if len(data) % row_size:
+        raise PdfProbeError("Неверный размер данных с предиктором PNG")
+    previous = bytearray(columns)
+    result = bytearray()
+    for start in range(0, len(data), row_size):
+        kind = data[start]
+        row = bytearray(data[start + 1:start + row_size])
+        if kind == 1:
+            for i in range(1, columns):
+                row[i] = (row[i] + row[i - 1]) & 0xFF
+        elif kind == 2:
+            for i in range(columns):
+                row[i] = (row[i] + previous[i]) & 0xFF
+        elif kind == 3:
+            for i in range(columns):
+                row[i] = (row[i] + ((row[i - 1] if i else 0) + previous[i]) // 2) & 0xFF
+        elif kind == 4:
+            for i in range(columns):
+                left = row[i - 1] if i else 0
+                up_left = previous[i - 1] if i else 0
+                estimate = left + previous[i] - up_left
+                distances = (abs(estimate - left), abs(estimate - previous[i]), abs(estimate - up_left))
+                predictor = (left, previous[i], up_left)[distances.index(min(distances))]
+                row[i] = (row[i] + predictor) & 0xFF
+        elif kind != 0:
+            raise PdfProbeError(f"Неизвестный фильтр PNG {kind}")
+        result += row
+        previous = row
+    return bytes(result)
+
+
+class PdfProbe:
+    def __init__(self, data):
+        self.data = data
+        # Разделы таблицы ссылок от последнего обновления файла к первому
+        self.sections = []
+        self.trailer = None
+        self.object_streams = {}
+        self.__load_xref()
+
+    def __load_xref(self):
+        tail_start = max(0, len(self.data) - 4096)
+        tail = self.data[tail_start:]
+        position = tail.rfind(b'startxref')
+        match = re.match(rb'startxref[\x00\t\n\f\r ]+(\d+)', tail[position:]) if position >= 0 else None
+        if match is None:
+            raise PdfProbeError("Не найден startxref")
+
+        offset = int(match.group(1))
+        visited = set()
+        while offset is not None:
+            if offset in visited or offset >= len(self.data):
+                raise PdfProbeError("Неверная ссылка на таблицу xref")
+            visited.add(offset)
+            if self.data[offset:offset + 4] == b'xref':
+                trailer = self.__read_xref_table(offset)
+                # Гибридные файлы: дополнительная таблица в потоке
+                if isinstance(trailer.get('XRefStm'), int):
+                    self.__read_xref_stream(trailer['XRefStm'])
+            else:
+                trailer = self.__read_xref_stream(offset)
+            if self.trailer is None:
+                self.trailer = trailer
+            offset = trailer.get('Prev')
+
+    def __read_xref_table(self, offset):
+        subsections = []
+        parser = _Parser(self.data, offset + 4)
+        while True:
+            parser.skip_space()
+            match = _XREF_SUBSECTION.match(self.data, parser.pos)
+            if match is None:
+                break
+            start, count = int(match.group(1)), int(match.group(2))
+            subsections.append((start, count, match.end()))
+            parser.pos = match.end() + 20 * count
+        if self.data[parser.pos:parser.pos + 7] != b'trailer':
+            raise PdfProbeError("Не найден trailer")
+        parser.pos += 7
+        trailer = parser.parse()
+        if not isinstance(trailer, dict):
+            raise PdfProbeError("Неверный trailer")
+
+        def lookup(num):
+            for start, count, entries in subsections:
+                if start <= num < start + count:
+                    entry = _XREF_ENTRY.match(self.data, entries + 20 * (num - start))
+                    if entry is None:
+                        raise PdfProbeError("Неверная запись таблицы xref")
+                    return ('free',) if entry.group(3) == b'f' else ('offset', int(entry.group(1)))
+            return None
+        self.sections.append(lookup)
+        return trailer
+
+    def __read_xref_stream(self, offset):
+        dictionary, data = self.__read_stream(offset, resolve_length=False)
+        if dictionary.get('Type') != 'XRef':
+            raise PdfProbeError("Ожидался поток XRef")
+        widths = dictionary['W']
+        index = dictionary.get('Index', [0, dictionary['Size']])
+        row_size = sum(widths)
+        entries = {}
+        position = 0
+        for start, count in zip(index[::2], index[1::2]):
+            for num in range(start, start + count):
+                fields = []
+                for width in widths:
+                    fields.append(int.from_bytes(data[position:position + width], 'big'))
+                    position += width
+                kind = fields[0] if widths[0] else 1
+                if kind == 1:
+                    entries[num] = ('offset', fields[1])
+                elif kind == 2:
+                    entries[num] = ('compressed', fields[1], fields[2])
+                else:
+                    entries[num] = ('free',)
+        if position > len(data) or row_size == 0:
+            raise PdfProbeError("Неверный размер потока XRef")
+        self.sections.append(entries.get)
+        return dictionary
+
+    def __read_stream(self, offset, resolve_length=True):
+        # Словарь потока и распакованные данные
+        header = _OBJECT_HEADER.match(self.data, offset)
+        if header is None:
+            raise PdfProbeError(f"Не найден объект в позиции {offset}")
+        parser = _Parser(self.data, header.end())
+        dictionary = parser.parse()
+        parser.skip_space()
+        if not isinstance(dictionary, dict) or self.data[parser.pos:parser.pos + 6] != b'stream':
+            raise PdfProbeError("Ожидался поток")
+        start = parser.pos + 6
+        if self.data[start:start + 2] == b'\r\n':
+            start += 2
+        elif self.data[start:start + 1] in (b'\n', b'\r'):
+            start += 1
+
+        length = dictionary.get('Length')
+        if isinstance(length, Reference) and resolve_length:
+            length = self.resolve(length)
+        if not isinstance(length, int):
+            end = self.data.find(b'endstream', start)
+            if end < 0:
+                raise PdfProbeError("Не найден конец потока")
+            length = end - start
+        data = self.data[start:start + length]
+
+        filters = dictionary.get('Filter')
+        filters = filters if isinstance(filters, list) else [filters] if filters else []
+        if filters not in ([], ['FlateDecode']):
+            raise PdfProbeError(f"Неподдерживаемый фильтр {filters}")
+        if filters:
+            try:
+                data = zlib.decompressobj().decompress(data)
+            except zlib.error as e:
+                raise PdfProbeError(f"Ошибка распаковки потока: {e}")
+        parameters = dictionary.get('DecodeParms') or {}
+        if isinstance(parameters, list):
+            parameters = parameters[0] or {}
+        predictor = parameters.get('Predictor', 1)
+        if predictor >= 10:
+            data = _png_unpredict(data, parameters.get('Columns', 1))
+        elif predictor != 1:
+            raise PdfProbeError(f"Неподдерживаемый предиктор {predictor}")
+        return dictionary, data
+
+    def get_object(self, num):
+        for lookup in self.sections:
+            entry = lookup(num)
+            if entry is not None:
+                break
+        else:
+            raise PdfProbeError(f"Объект {num} не найден")
+
+        if entry[0] == 'offset':
+            header = _OBJECT_HEADER.match(self.data, entry[1])
+            if header is None or int(header.group(1)) != num:
+                raise PdfProbeError(f"Неверное смещение объекта {num}")
+            return _Parser(self.data, header.end()).parse()
+        if entry[0] == 'compressed':
+            return self.__get_compressed_object(entry[1], entry[2])
+        raise PdfProbeError(f"Объект {num} удален")
+
+    def __get_compressed_object(self, stream_num, index):
+        # Объект внутри потока объектов (/Type /ObjStm)
+        if stream_num not in self.object_streams:
+            for lookup in self.sections:
+                entry = lookup(stream_num)
+                if entry is not None:
+                    break
+            if entry is None or entry[0] != 'offset':
+                raise PdfProbeError(f"Поток объектов {stream_num} не найден")
+            dictionary, data = self.__read_stream(entry[1])
+            parser = _Parser(data)
+            offsets = [parser.parse() for _ in range(2 * dictionary['N'])][1::2]
+            self.object_streams[stream_num] = (dictionary['First'], offsets, data)
+        first, offsets, data = self.object_streams[stream_num]
+        return _Parser(data, first + offsets[index]).parse()
+
+    def resolve(self, value, depth=0):
+        while isinstance(value, Reference):
+            if depth > 16:
+                raise PdfProbeError("Слишком длинная цепочка ссылок")
+            value = self.get_object(value.num)
+            depth += 1
+        return value
+
+    def page_count(self):
+        if 'Encrypt' in self.trailer:
+            raise PdfProbeError("Зашифрованный PDF")
+        pages = self.resolve(self.resolve(self.trailer['Root'])['Pages'])
+        count = self.resolve(pages.get('Count'))
+        if not isinstance(count, int) or count < 0:
+            raise PdfProbeError("Неверное значение /Count")
+        return count
+
+    def info(self):
+        # Словарь Info в виде {'/Title': str, ...}, как метаданные PyPDF2
+        info = self.resolve(self.trailer.get('Info'))
+        if not isinstance(info, dict):
+            return None
+        return {f"/{key}": decode_text(self.resolve(value)) for key, value in info.items()}
+
+
+def decode_text(value):
+    # Текстовая строка PDF: UTF-16 с BOM, UTF-8 с BOM или PDFDocEncoding (почти совпадает с latin-1)
+    if not isinstance(value, bytes):
+        return value if isinstance(value, (str, int, float, bool)) or value is None else str(value)
+    if value.startswith((b'\xfe\xff', b'\xff\xfe')):
+        return value.decode('utf-16', errors='replace')
+    if value.startswith(b'\xef\xbb\xbf'):
+        return value[3:].decode('utf-8', errors='replace')
+    return value.decode('latin-1')
+
+
+def probe_pdf(file_path):
+    """
+    Быстро читает количество страниц и метаданные PDF.\n
+    Аргументы:
+    file_path -- путь к PDF-файлу\n
+    Возвращает:
+    Кортеж (количество страниц, словарь Info или None).
+    Выбрасывает PdfProbeError, если файл нельзя разобрать быстрым способом.
+    """
+    with open(file_path, 'rb') as file:
+        try:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise PdfProbeError("Пустой файл")
+        try:
+            return probe_pdf_data(data)
+        finally:
+            data.close()
+
+
+def probe_pdf_data(data):
+    """
+    То же, что probe_pdf, для PDF, уже находящегося в памяти (например, книги из архива).\n
+    Аргументы:
+    data -- содержимое PDF (bytes или mmap)\n
+    Возвращает:
+    Кортеж (количество страниц, словарь Info или None).
+    """
+    if not data:
+        raise PdfProbeError("Пустой файл")
+    try:
+        probe = PdfProbe(data)
+        return probe.page_count(), probe.info()
+    except (KeyError, IndexError, TypeError, ValueError, AttributeError, RecursionError) as e:
+        raise PdfProbeError(f"Ошибка разбора PDF: {e!r}")
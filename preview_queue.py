@@ -0,0 +1,188 @@
+import argparse
+import threading
+import collections
+from multiprocessing.connection import wait as wait_connections
+
+from bookAnalyzer import BookAnalyzer, ExtractionWorker, FILE_TIMEOUT, FILES_PER_WORKER
+
+# Отложенное построение превью для книг, обработанных в режиме metadata_only.
+# Превью строятся в фоновом потоке через отдельный процесс ExtractionWorker, поэтому
+# зависший или упавший рендер не мешает интерфейсу. Книги, видимые в интерфейсе,
+# обрабатываются в первую очередь (prioritize), остальные -- по возрастанию id.
+#
+# Пример (двухфазная обработка из командной строки):
+#     python bookAnalyzer.py --dir_path books --file_types pdf epub --metadata_only
+#     python preview_queue.py --db_path books.db
+
+# Сколько отложенных книг выбирать из БД за один запрос
+FETCH_SIZE = 100
+# Пауза между проверками БД, когда отложенных превью нет, секунд
+IDLE_INTERVAL = 5
+
+
+class PreviewQueue:
+    """
+    Фоновая очередь построения отложенных превью.\n
+    Аргументы:
+    analyzer -- BookAnalyzer (используются путь к БД и параметры обработки)
+    timeout -- максимальное время построения одного превью в секундах
+    idle_interval -- пауза между проверками БД, когда очередь пуста (None -- остановиться)
+    """
+    def __init__(self, analyzer, timeout=FILE_TIMEOUT, idle_interval=IDLE_INTERVAL):
+        self.analyzer = analyzer
+        self.timeout = timeout
+        self.idle_interval = idle_interval
+        self.priority = collections.deque()
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+        self.thread = None
+        self.rendered = 0
+        self.failed = 0
+
+    def start(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.stopping.clear()
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        self.wakeup.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def prioritize(self, file_paths):
+        # Заменяет приоритетную очередь (например, книгами, которые сейчас видны в таблице)
+        with self.lock:
+            self.priority = collections.deque(file_paths)
+        self.wakeup.set()
+
+    def run_until_empty(self):
+        """
+        Строит все отложенные превью в текущем потоке.\n
+        Возвращает:
+        Кортеж (построено, с ошибкой).
+        """
+        idle_interval, self.idle_interval = self.idle_interval, None
+        try:
+            self.run()
+        finally:
+            self.idle_interval = idle_interval
+        return self.rendered, self.failed
+
+    def __next_path(self, batch):
+        cursor = self.analyzer.open_db(readonly=True)
+        try:
+            return self.__find_next_path(cursor, batch)
+        finally:
+            self.analyzer.close_db()
+
+    def __find_next_path(self, cursor, batch):
+        # Сначала приоритетные книги, затем очередной пакет отложенных из БД
+        with self.lock:
+            while self.priority:
+                file_path = self.priority.popleft()
+                cursor.execute('SELECT 1 FROM books WHERE file_path = ? AND preview_pending = 1', (file_path,))
+                if cursor.fetchone() is not None:
+                    return file_path
+        while batch:
+            file_path = batch.popleft()
+            cursor.execute('SELECT preview_pending FROM books WHERE file_path = ?', (file_path,))
+            row = cursor.fetchone()
+            if row is not None and row[0] == 1:
+                return file_path
+        return None
+
+    def __fetch_batch(self, last_id):
+        cursor = self.analyzer.open_db(readonly=True)
+        try:
+            cursor.execute('SELECT id, file_path FROM books WHERE preview_pending = 1 AND id > ? ORDER BY id LIMIT ?',
+                           (last_id, FETCH_SIZE))
+            return cursor.fetchall()
+        finally:
+            self.analyzer.close_db()
+
+    def __store(self, file_path, preview):
+        # Запись идет через общее соединение BookAnalyzer для записи
+        cursor = self.analyzer.open_db()
+        try:
+            BookAnalyzer.store_preview(cursor, file_path, preview)
+        finally:
+            # Запись сбрасывает кеш запросов: от превью зависят get_book_preview_info и find_similar_covers
+            self.analyzer.close_db()
+
+    def run(self):
+        options = self.analyzer.worker_options()
+        worker = None
+        batch = collections.deque()
+        last_id = 0
+        try:
+            while not self.stopping.is_set():
+                self.wakeup.clear()
+                file_path = self.__next_path(batch)
+                if file_path is None:
+                    rows = self.__fetch_batch(last_id)
+                    if not rows and last_id:
+                        # Дошли до конца таблицы -- начинаем сначала (могли появиться новые книги)
+                        last_id = 0
+                        rows = self.__fetch_batch(last_id)
+                    if rows:
+                        last_id = rows[-1][0]
+                        batch.extend(file_path for _, file_path in rows)
+                        continue
+                    if self.idle_interval is None:
+                        break
+                    self.wakeup.wait(self.idle_interval)
+                    continue
+
+                if worker is None:
+                    worker = ExtractionWorker(options)
+                preview, restart = self.__render(worker, file_path)
+                if restart or worker.files_done >= FILES_PER_WORKER:
+                    worker.stop()
+                    worker = None
+                self.__store(file_path, preview)
+        finally:
+            if worker is not None:
+                worker.stop()
+
+    def __render(self, worker, file_path):
+        # Возвращает превью (None при ошибке) и признак того, что процесс нужно перезапустить
+        worker.submit(file_path, kind='preview')
+        if not wait_connections([worker.conn], self.timeout):
+            worker.kill()
+            print(f"Превышено время построения превью {file_path} ({self.timeout} с)")
+            self.failed += 1
+            return None, True
+        try:
+            status, payload = worker.conn.recv()
+        except (EOFError, OSError):
+            worker.process.join(1)
+            print(f"Процесс построения превью {file_path} завершился с кодом {worker.process.exitcode}")
+            self.failed += 1
+            return None, True
+
+        if status == 'ok':
+            self.rendered += 1
+            return payload, False
+        stage, error = payload
+        print(f"Не удалось построить превью {file_path}. Причина: {error}")
+        self.failed += 1
+        return None, status == 'fatal'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Render previews deferred by a --metadata_only scan')
+    parser.add_argument('--db_path', default='books.db', help='Path to the database file')
+    parser.add_argument('--timeout', type=int, default=FILE_TIMEOUT, help='Maximum rendering time of one preview, seconds')
+    args = parser.parse_args()
+
+    queue = PreviewQueue(BookAnalyzer(args.db_path), timeout=args.timeout)
+    rendered, failed = queue.run_until_empty()
+    print(f"Построено превью: {rendered}, с ошибкой: {failed}")
+
+
+if __name__ == '__main__':
+    main()
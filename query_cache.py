@@ -0,0 +1,138 @@
+import sys
+import inspect
+import functools
+import threading
+import collections
+
+# Кеш результатов запросов BookAnalyzer на чтение. Ключ -- имя метода и значения всех его
+# аргументов (с учетом значений по умолчанию), поэтому повторный показ того же списка
+# в интерфейсе не обращается к SQLite. Каждая запись в БД через BookAnalyzer увеличивает
+# номер версии данных (invalidate), и результаты, полученные до нее, больше не выдаются.
+# Изменения, сделанные другими процессами (например, обработка из командной строки
+# при открытом интерфейсе), кеш не замечает -- для этого есть BookAnalyzer.invalidate_cache.
+
+QUERY_CACHE_ENTRIES = 256               # результатов в кеше
+QUERY_CACHE_BYTES = 64 * 1024 ** 2      # байт на все результаты (оценка, см. estimate_size)
+
+
+def estimate_size(value) -> int:
+    # Приблизительный объем результата в памяти: списки и кортежи строк, словари, скаляры
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple, set)):
+        size += sum(estimate_size(item) for item in value)
+    elif isinstance(value, dict):
+        size += sum(estimate_size(key) + estimate_size(item) for key, item in value.items())
+    return size
+
+
+def shallow_copy(value):
+    # Копия верхнего уровня результата: вызывающий может менять полученный список или словарь,
+    # не затрагивая сохраненный в кеше (записи book_rows -- неизменяемые кортежи)
+    if isinstance(value, (list, dict, set)):
+        return type(value)(value)
+    return value
+
+
+class QueryCache:
+    """
+    Кеш результатов с вытеснением давно не использованных записей (LRU).\n
+    Аргументы:
+    max_entries -- максимальное количество результатов (0 -- кеш выключен)
+    max_bytes -- максимальный суммарный объем результатов в байтах
+    """
+    def __init__(self, max_entries=QUERY_CACHE_ENTRIES, max_bytes=QUERY_CACHE_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.version = 0
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0 and self.max_bytes > 0
+
+    def get(self, key):
+        """
+        Ищет результат текущей версии данных.\n
+        Аргументы:
+        key -- ключ запроса\n
+        Возвращает:
+        Кортеж (найден, результат).
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] != self.version:
+                self.misses += 1
+                return False, None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+
+    def put(self, key, version, value):
+        """
+        Сохраняет результат запроса.\n
+        Аргументы:
+        key -- ключ запроса
+        version -- версия данных на момент начала запроса (результат, полученный
+        во время записи в БД, не сохраняется)
+        value -- результат
+        """
+        size = estimate_size(value)
+        with self.lock:
+            if version != self.version or size > self.max_bytes:
+                return
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= old[2]
+            self.entries[key] = (version, value, size)
+            self.size += size
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                _, (_, _, evicted_size) = self.entries.popitem(last=False)
+                self.size -= evicted_size
+
+    def invalidate(self):
+        # Новая версия данных: все сохраненные результаты устарели
+        with self.lock:
+            self.version += 1
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.entries), 'bytes': self.size, 'version': self.version,
+                    'hits': self.hits, 'misses': self.misses}
+
+
+def cached_query(method):
+    """
+    Декоратор метода BookAnalyzer, результат которого зависит только от аргументов и данных БД.
+    Результат выдается из кеша self.query_cache, пока в БД ничего не записано.
+    Каждый вызов получает свою копию списка (словаря) результата, сами записи общие и неизменяемые.
+    """
+    signature = inspect.signature(method)
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        cache = self.query_cache
+        if not cache.enabled:
+            return method(self, *args, **kwargs)
+        bound = signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        key = (method.__name__,) + tuple(bound.arguments.values())[1:]
+        try:
+            found, value = cache.get(key)
+        except TypeError:
+            # Изменяемые аргументы (например, списки) не могут быть ключом -- запрос без кеша
+            return method(self, *args, **kwargs)
+        if found:
+            return shallow_copy(value)
+        # Версия запоминается до запроса: если во время него завершится запись, результат не сохранится
+        version = cache.version
+        value = method(self, *args, **kwargs)
+        cache.put(key, version, shallow_copy(value))
+        return value
+
+    return wrapper
@@ -0,0 +1,127 @@
+import json
+
+# Контрольные точки обработки каталога: задание (scan_jobs) и список найденных файлов с отметкой
+# об обработке (scan_files). Отметки копятся в памяти и записываются в той же транзакции, что
+# и данные книг (BookAnalyzer.process_files фиксирует транзакцию раз в batch_size файлов), поэтому
+# после сбоя файл либо сохранен и отмечен, либо не сделано ни то, ни другое. Прерванное задание
+# продолжается (BookAnalyzer.resume_scan) только с необработанных файлов, а если обход каталога
+# был завершен -- без повторного обхода.
+# Сами таблицы создает BookAnalyzer.init_database.
+
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+STATUS_CANCELLED = 'cancelled'
+
+
+class ScanCheckpoint:
+    """
+    Контрольная точка одного задания обработки каталога.\n
+    Аргументы:
+    job_id -- id задания в таблице scan_jobs
+    params -- параметры process_directory, с которыми задание было запущено
+    walked -- обход каталога был завершен (все найденные файлы есть в scan_files)
+    """
+    def __init__(self, job_id, params, walked=False):
+        self.job_id = job_id
+        self.params = params
+        self.walked = walked
+        self.found = []
+        self.completed = []
+
+    @classmethod
+    def create(cls, cursor, params):
+        """
+        Создает задание. Незавершенные задания для того же каталога отменяются.\n
+        Аргументы:
+        cursor -- курсор соединения для записи
+        params -- словарь параметров process_directory (сериализуется в JSON)\n
+        Возвращает:
+        ScanCheckpoint.
+        """
+        cursor.execute('SELECT id FROM scan_jobs WHERE status = ? AND directory = ?',
+                       (STATUS_RUNNING, params['directory']))
+        for job_id, in cursor.fetchall():
+            cls.cancel(cursor, job_id)
+        cursor.execute('''
+            INSERT INTO scan_jobs (directory, params, status, walked, found, done, started_at, updated_at)
+            VALUES (?, ?, ?, 0, 0, 0, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+        ''', (params['directory'], json.dumps(params, ensure_ascii=False), STATUS_RUNNING))
+        return cls(cursor.lastrowid, params)
+
+    @classmethod
+    def load(cls, cursor, job_id=None):
+        """
+        Загружает незавершенное задание.\n
+        Аргументы:
+        cursor -- курсор соединения с БД
+        job_id -- id задания (None -- последнее незавершенное)\n
+        Возвращает:
+        ScanCheckpoint или None, если такого задания нет.
+        """
+        query = 'SELECT id, params, walked FROM scan_jobs WHERE status = ?'
+        params = (STATUS_RUNNING,)
+        if job_id is not None:
+            query += ' AND id = ?'
+            params += (job_id,)
+        cursor.execute(query + ' ORDER BY id DESC LIMIT 1', params)
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        job_id, job_params, walked = row
+        return cls(job_id, json.loads(job_params), walked == 1)
+
+    @staticmethod
+    def cancel(cursor, job_id):
+        cursor.execute('UPDATE scan_jobs SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
+                       (STATUS_CANCELLED, job_id))
+        cursor.execute('DELETE FROM scan_files WHERE job_id = ?', (job_id,))
+
+    def pending_paths(self, cursor):
+        # Необработанные файлы завершенного обхода (читаются целиком до начала записи)
+        cursor.execute('SELECT file_path FROM scan_files WHERE job_id = ? AND done = 0', (self.job_id,))
+        return [file_path for file_path, in cursor.fetchall()]
+
+    def completed_paths(self, cursor):
+        cursor.execute('SELECT file_path FROM scan_files WHERE job_id = ? AND done = 1', (self.job_id,))
+        return {file_path for file_path, in cursor.fetchall()}
+
+    def track(self, file_paths):
+        # Пропускает пути обхода каталога, запоминая их для записи в scan_files
+        for file_path in file_paths:
+            self.found.append(file_path)
+            yield file_path
+        self.walked = True
+
+    def complete(self, file_path):
+        # Файл обработан (успешно или с ошибкой) -- отметка попадет в БД при следующем flush
+        self.completed.append(file_path)
+
+    def flush(self, cursor):
+        """
+        Записывает накопленные пути и отметки об обработке (в текущей транзакции).\n
+        Аргументы:
+        cursor -- курсор соединения для записи
+        """
+        found = 0
+        done = 0
+        if self.found:
+            cursor.executemany('INSERT OR IGNORE INTO scan_files (job_id, file_path, done) VALUES (?, ?, 0)',
+                               [(self.job_id, file_path) for file_path in self.found])
+            found = cursor.rowcount
+            self.found = []
+        if self.completed:
+            cursor.executemany('UPDATE scan_files SET done = 1 WHERE job_id = ? AND file_path = ? AND done = 0',
+                               [(self.job_id, file_path) for file_path in self.completed])
+            done = cursor.rowcount
+            self.completed = []
+        cursor.execute('''
+            UPDATE scan_jobs SET found = found + ?, done = done + ?, walked = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', (found, done, 1 if self.walked else 0, self.job_id))
+
+    def finish(self, cursor):
+        # Задание выполнено: список файлов больше не нужен, остается только запись в scan_jobs
+        self.flush(cursor)
+        cursor.execute('UPDATE scan_jobs SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
+                       (STATUS_DONE, self.job_id))
+        cursor.execute('DELETE FROM scan_files WHERE job_id = ?', (self.job_id,))
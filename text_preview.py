@@ -0,0 +1,201 @@
+import io
+import os
+import sys
+import threading
+from functools import lru_cache
+
+from PIL import Image, ImageDraw, ImageFont
+
+# Превью-карточка для текстовых документов (docx, odt): первые строки текста на цветном фоне.
+# Шрифт загружается один раз на процесс, символы растеризуются один раз и дальше только
+# копируются на холст, холст переиспользуется, а карточка кодируется в PNG с палитрой
+# из 16 цветов (4 бита на пиксель), поэтому подготовка к каждому файлу сводится к очистке холста.
+
+CARD_SIZE = (500, 200)
+FONT_SIZE = 15
+LINE_HEIGHT = 18
+MARGIN = 10
+BACKGROUND = (73, 109, 137)
+FOREGROUND = (255, 255, 0)
+# Уровней сглаживания текста (размер палитры PNG)
+LEVELS = 16
+
+# Каталог со шрифтами, поставляемыми вместе с программой (необязательный)
+BUNDLED_FONTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fonts')
+
+# Шрифты с кириллицей, которые ищутся по порядку; путь без каталога ищется
+# в BUNDLED_FONTS_DIR и стандартных каталогах шрифтов (PIL)
+DEFAULT_FONTS = [
+    'DejaVuSans.ttf',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+    '/usr/share/fonts/dejavu/DejaVuSans.ttf',
+    'LiberationSans-Regular.ttf',
+    '/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf',
+    'arial.ttf',
+    '/Library/Fonts/Arial.ttf',
+    '/System/Library/Fonts/Supplemental/Arial.ttf',
+]
+
+_fonts = list(DEFAULT_FONTS)
+_local = threading.local()
+
+
+def configure_fonts(fonts):
+    """
+    Задает шрифты превью-карточек.\n
+    Аргументы:
+    fonts -- пути к файлам шрифтов в порядке предпочтения; если ни один не загрузится,
+    используется встроенный шрифт PIL
+    """
+    global _fonts
+    _fonts = list(fonts)
+    get_font.cache_clear()
+
+
+def _font_candidates():
+    # Переменная окружения BOOK_ANALYZER_FONT позволяет указать шрифт без изменения кода
+    if os.environ.get('BOOK_ANALYZER_FONT'):
+        yield os.environ['BOOK_ANALYZER_FONT']
+    for font in _fonts:
+        if os.path.dirname(font):
+            yield font
+        else:
+            yield os.path.join(BUNDLED_FONTS_DIR, font)
+            if sys.platform == 'win32':
+                yield os.path.join(os.environ.get('WINDIR', 'C:\\Windows'), 'Fonts', font)
+            yield font
+
+
+@lru_cache(maxsize=None)
+def get_font(size=FONT_SIZE):
+    # Первый загрузившийся шрифт из списка (один раз на процесс для каждого размера).
+    # Простая раскладка (без libraqm) в несколько раз быстрее и достаточна для кириллицы и латиницы
+    for path in _font_candidates():
+        try:
+            return ImageFont.truetype(path, size, layout_engine=ImageFont.Layout.BASIC)
+        except OSError:
+            continue
+    try:
+        return ImageFont.load_default(size)
+    except TypeError:
+        # Pillow < 10.1: встроенный растровый шрифт без выбора размера
+        return ImageFont.load_default()
+
+
+@lru_cache(maxsize=4096)
+def _glyph(font, char):
+    # Маска символа, смещение относительно точки вывода и ширина (растеризуется один раз)
+    advance = font.getlength(char)
+    left, top, right, bottom = font.getbbox(char)
+    if right <= left or bottom <= top:
+        return None, 0, 0, advance
+    mask = Image.new('L', (right - left, bottom - top), 0)
+    ImageDraw.Draw(mask).text((-left, -top), char, fill=255, font=font)
+    return mask, left, top, advance
+
+
+def text_width(font, text):
+    # Ширина текста в пикселях (без кернинга)
+    return sum(_glyph(font, char)[3] for char in text)
+
+
+def wrap_lines(text, font, width, max_lines):
+    """
+    Разбивает текст на строки, помещающиеся в заданную ширину.\n
+    Аргументы:
+    text -- текст (абзацы разделены переводами строк)
+    font -- шрифт PIL
+    width -- ширина строки в пикселях
+    max_lines -- максимальное количество строк\n
+    Возвращает:
+    Список строк.
+    """
+    space = text_width(font, ' ')
+    lines = []
+    for paragraph in text.split('\n'):
+        words = paragraph.split()
+        if not words:
+            continue
+        line = ''
+        line_width = 0
+        for word in words:
+            word_width = text_width(font, word)
+            candidate_width = line_width + space + word_width if line else word_width
+            if candidate_width <= width:
+                line = f"{line} {word}" if line else word
+                line_width = candidate_width
+                continue
+            if line:
+                lines.append(line)
+                if len(lines) == max_lines:
+                    return lines
+            # Слово длиннее строки обрезается по символам
+            while text_width(font, word) > width:
+                cut = len(word) - 1
+                while cut > 1 and text_width(font, word[:cut]) > width:
+                    cut -= 1
+                lines.append(word[:cut])
+                if len(lines) == max_lines:
+                    return lines
+                word = word[cut:]
+                word_width = text_width(font, word)
+            line = word
+            line_width = word_width
+        lines.append(line)
+        if len(lines) == max_lines:
+            return lines
+    return lines
+
+
+def _palette():
+    # Градиент от цвета фона к цвету текста: индекс палитры -- уровень сглаживания
+    palette = []
+    for level in range(LEVELS):
+        for background, foreground in zip(BACKGROUND, FOREGROUND):
+            palette.append(background + (foreground - background) * level // (LEVELS - 1))
+    return palette
+
+
+_PALETTE = _palette()
+_QUANTIZE = [value * LEVELS // 256 for value in range(256)]
+
+
+def _canvas():
+    # Холст в оттенках серого (маска текста), один на поток
+    canvas = getattr(_local, 'canvas', None)
+    if canvas is None:
+        canvas = Image.new('L', CARD_SIZE, 0)
+        _local.canvas = canvas
+    else:
+        canvas.paste(0, (0, 0) + CARD_SIZE)
+    return canvas
+
+
+def render_text_card(text):
+    """
+    Строит превью-карточку текстового документа.\n
+    Аргументы:
+    text -- текст документа (используется только начало)\n
+    Возвращает:
+    Изображение PNG в виде байтов.
+    """
+    font = get_font()
+    max_lines = (CARD_SIZE[1] - 2 * MARGIN) // LINE_HEIGHT
+    # Дальше первых строк текст не нужен
+    lines = wrap_lines(text[:max_lines * 200], font, CARD_SIZE[0] - 2 * MARGIN, max_lines)
+
+    canvas = _canvas()
+    for i, line in enumerate(lines):
+        x = MARGIN
+        y = MARGIN + i * LINE_HEIGHT
+        for char in line:
+            mask, left, top, advance = _glyph(font, char)
+            if mask is not None:
+                canvas.paste(255, (round(x) + left, y + top), mask)
+            x += advance
+
+    card = canvas.point(_QUANTIZE)
+    card.putpalette(_PALETTE)
+    byte_arr = io.BytesIO()
+    card.save(byte_arr, format='PNG', bits=4)
+    return byte_arr.getvalue()
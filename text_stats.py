@@ -0,0 +1,144 @@
+import numpy as np
+
+# Статистика текста книги (слова, символы, предложения, преобладающая письменность).
+# Текст обрабатывается блоками как массив кодов символов NumPy, без цикла по словам в Python.
+
+# Скорость чтения для оценки времени чтения, слов в минуту
+WORDS_PER_MINUTE = 200
+
+# Размер блока в символах: в UTF-32 блок занимает в 4 раза больше байт
+CHUNK_SIZE = 1 << 20
+
+# Классы символов
+OTHER, WORD, TERMINATOR, SPACE = range(4)
+
+# Письменности (индекс 0 -- не буква или неизвестная письменность)
+SCRIPTS = (None, 'latin', 'cyrillic', 'greek', 'armenian', 'hebrew', 'arabic', 'devanagari', 'georgian',
+           'cjk', 'hangul')
+_SCRIPT_RANGES = [
+    ('latin', 0x0041, 0x024F), ('latin', 0x1E00, 0x1EFF),
+    ('greek', 0x0370, 0x03FF), ('greek', 0x1F00, 0x1FFF),
+    ('cyrillic', 0x0400, 0x052F),
+    ('armenian', 0x0530, 0x058F),
+    ('hebrew', 0x0590, 0x05FF),
+    ('arabic', 0x0600, 0x06FF),
+    ('devanagari', 0x0900, 0x097F),
+    ('georgian', 0x10A0, 0x10FF),
+    ('hangul', 0x1100, 0x11FF), ('hangul', 0xAC00, 0xD7AF),
+    ('cjk', 0x3040, 0x30FF), ('cjk', 0x3400, 0x4DBF), ('cjk', 0x4E00, 0x9FFF),
+]
+_SENTENCE_TERMINATORS = '.!?…。！？'
+
+# Таблицы классов и письменностей для символов BMP; все коды выше
+# отображаются в последний элемент (буква неизвестной письменности)
+_TABLE_SIZE = 0x10000
+
+
+def _build_tables():
+    classes = np.full(_TABLE_SIZE + 1, OTHER, dtype=np.uint8)
+    classes[_TABLE_SIZE] = WORD
+    scripts = np.zeros(_TABLE_SIZE + 1, dtype=np.uint8)
+    for name, first, last in _SCRIPT_RANGES:
+        scripts[first:last + 1] = SCRIPTS.index(name)
+
+    for code in range(_TABLE_SIZE):
+        char = chr(code)
+        if char.isalnum():
+            classes[code] = WORD
+        elif char.isspace():
+            classes[code] = SPACE
+        # Письменность учитывается только для букв
+        if not char.isalpha():
+            scripts[code] = 0
+    classes[[ord(char) for char in _SENTENCE_TERMINATORS]] = TERMINATOR
+    return classes, scripts
+
+
+_CLASS_TABLE, _SCRIPT_TABLE = _build_tables()
+
+
+class TextStatistics:
+    """
+    Накапливает статистику текста, который передается по частям (feed).\n
+    Части могут разрезать слова и предложения в любом месте: класс последнего символа
+    переносится в следующую часть.
+    """
+    __slots__ = ('chars', 'words', 'sentences', 'script_counts', 'last_class', 'words_at_sentence_end')
+
+    def __init__(self):
+        self.chars = 0
+        self.words = 0
+        self.sentences = 0
+        self.script_counts = np.zeros(len(SCRIPTS), dtype=np.int64)
+        self.last_class = SPACE
+        self.words_at_sentence_end = 0
+
+    def feed(self, text):
+        for start in range(0, len(text), CHUNK_SIZE):
+            self.__feed_chunk(text[start:start + CHUNK_SIZE])
+
+    def __feed_chunk(self, text):
+        codes = np.frombuffer(text.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+        index = np.minimum(codes, _TABLE_SIZE)
+        classes = _CLASS_TABLE[index]
+        self.script_counts += np.bincount(_SCRIPT_TABLE[index], minlength=len(SCRIPTS))
+
+        is_space = classes == SPACE
+        self.chars += len(classes) - int(np.count_nonzero(is_space))
+
+        # Перед частью ставим последний символ предыдущей части, чтобы не терять границы на стыке
+        classes = np.concatenate((np.array([self.last_class], dtype=np.uint8), classes))
+        is_word = classes == WORD
+        word_starts = is_word[1:] & ~is_word[:-1]
+
+        # Конец предложения -- последний знак в серии ".!?", за которым не следует буква или цифра
+        # (поэтому "3.14" не считается концом предложения). Последний символ части проверяется
+        # вместе со следующей частью или в result().
+        is_terminator = classes == TERMINATOR
+        sentence_ends = np.flatnonzero(is_terminator[:-1] & ~is_terminator[1:] & ~is_word[1:])
+
+        # Предложение засчитывается, только если после предыдущего конца были слова
+        words_before = np.cumsum(word_starts)
+        if len(sentence_ends):
+            # Индекс i в classes соответствует символу i - 1 части; слова до него включительно
+            words_at_ends = np.where(sentence_ends > 0, words_before[sentence_ends - 1], 0) + self.words
+            previous = np.concatenate(([self.words_at_sentence_end], words_at_ends[:-1]))
+            self.sentences += int(np.count_nonzero(words_at_ends > previous))
+            self.words_at_sentence_end = int(words_at_ends[-1])
+
+        self.words += int(words_before[-1])
+        self.last_class = int(classes[-1])
+
+    def result(self):
+        """
+        Итоговая статистика.\n
+        Возвращает:
+        Словарь: char_count (символов без пробелов), word_count, sentence_count, script
+        (преобладающая письменность или None).
+        """
+        sentences = self.sentences
+        # Незавершенное последнее предложение тоже считается
+        if self.words > self.words_at_sentence_end:
+            sentences += 1
+        script_index = int(np.argmax(self.script_counts[1:])) + 1
+        script = SCRIPTS[script_index] if self.script_counts[script_index] else None
+        return {
+            'char_count': self.chars,
+            'word_count': self.words,
+            'sentence_count': sentences,
+            'script': script,
+        }
+
+
+def analyze_text(chunks):
+    # Статистика текста, переданного итератором частей (например, по страницам)
+    statistics = TextStatistics()
+    for chunk in chunks:
+        if chunk:
+            statistics.feed(chunk)
+    return statistics.result()
+
+
+def reading_minutes(word_count):
+    # Оценка времени чтения в минутах
+    return None if word_count is None else round(word_count / WORDS_PER_MINUTE)
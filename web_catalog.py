@@ -0,0 +1,153 @@
+import os
+import json
+from html import escape
+
+# Шаблоны статического HTML-каталога (используются в BookAnalyzer.generate_web_page)
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html lang="ru">
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<style>
+body {{ font-family: sans-serif; margin: 20px; }}
+table {{ border-collapse: collapse; width: 100%; }}
+th, td {{ border: 1px solid #ccc; padding: 4px 8px; text-align: left; vertical-align: top; }}
+img.thumb {{ max-width: 80px; max-height: 110px; }}
+nav {{ margin: 12px 0; }}
+nav a, nav span {{ margin-right: 6px; }}
+#search-results li {{ margin: 2px 0; }}
+</style>
+</head>
+<body>
+<h1>{title}</h1>
+<p>Всего книг: {total}. Страница {page} из {pages}.</p>
+<input id="search" type="search" placeholder="Поиск по названию или автору" size="50">
+<ul id="search-results"></ul>
+{nav}
+<table>
+<tr><th>Превью</th><th>Название</th><th>Автор</th><th>Расширение</th><th>Размер</th><th>Страниц</th><th>Избранное</th></tr>
+{rows}
+</table>
+{nav}
+<script src="search_index.js"></script>
+<script>
+(function () {{
+    var input = document.getElementById('search');
+    var list = document.getElementById('search-results');
+    input.addEventListener('input', function () {{
+        var query = input.value.trim().toLowerCase();
+        list.innerHTML = '';
+        if (query.length < 2) return;
+        var found = 0;
+        // Элемент индекса: [название, автор, номер страницы каталога]
+        for (var i = 0; i < SEARCH_INDEX.length && found < 50; i++) {{
+            var entry = SEARCH_INDEX[i];
+            if ((entry[0] + ' ' + entry[1]).toLowerCase().indexOf(query) !== -1) {{
+                var item = document.createElement('li');
+                var link = document.createElement('a');
+                link.href = pageFile(entry[2]);
+                link.textContent = entry[0] + (entry[1] ? ' — ' + entry[1] : '');
+                item.appendChild(link);
+                list.appendChild(item);
+                found++;
+            }}
+        }}
+    }});
+    function pageFile(page) {{
+        return page === 1 ? '{first_page}' : 'page_' + page + '.html';
+    }}
+}})();
+</script>
+</body>
+</html>
+"""
+
+ROW_TEMPLATE = ("<tr><td>{thumb}</td><td>{title}</td><td>{author}</td><td>{file_ext}</td>"
+                "<td>{file_size}</td><td>{num_pages}</td><td>{favorite}</td></tr>")
+
+
+def page_file_name(first_page, page):
+    # Первая страница сохраняется под именем, переданным пользователем, остальные -- page_N.html
+    return first_page if page == 1 else f"page_{page}.html"
+
+
+def image_extension(data):
+    # Определяем формат превью по сигнатуре файла
+    if data.startswith(b'\x89PNG'):
+        return '.png'
+    if data.startswith(b'\xff\xd8'):
+        return '.jpg'
+    if data[:6] in (b'GIF87a', b'GIF89a'):
+        return '.gif'
+    return '.bin'
+
+
+def write_thumbnail(output_dir, book_id, preview):
+    """
+    Сохраняет превью книги в отдельный файл thumbs/<тысяча>/<id>.<ext>.\n
+    Файл не перезаписывается, если уже существует с тем же размером (повторный экспорт).\n
+    Возвращает:
+    Путь к файлу относительно каталога экспорта.
+    """
+    relative_path = f"thumbs/{book_id // 1000}/{book_id}{image_extension(preview)}"
+    path = os.path.join(output_dir, relative_path)
+    try:
+        if os.path.getsize(path) == len(preview):
+            return relative_path
+    except OSError:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as file:
+        file.write(preview)
+    return relative_path
+
+
+def render_nav(first_page, page, pages):
+    # Ссылки на соседние страницы и несколько ближайших номеров
+    links = []
+    if page > 1:
+        links.append(f'<a href="{page_file_name(first_page, page - 1)}">&larr; Назад</a>')
+    for number in range(max(1, page - 5), min(pages, page + 5) + 1):
+        if number == page:
+            links.append(f"<span><b>{number}</b></span>")
+        else:
+            links.append(f'<a href="{page_file_name(first_page, number)}">{number}</a>')
+    if page < pages:
+        links.append(f'<a href="{page_file_name(first_page, page + 1)}">Вперед &rarr;</a>')
+    return "<nav>" + "".join(links) + "</nav>"
+
+
+def render_row(thumb_path, title, author, file_ext, file_size, num_pages, favorite):
+    thumb = f'<img class="thumb" loading="lazy" src="{escape(thumb_path)}" alt="">' if thumb_path else ""
+    return ROW_TEMPLATE.format(thumb=thumb, title=escape(title or ""), author=escape(author or ""),
+                               file_ext=escape(file_ext or ""), file_size=escape(file_size),
+                               num_pages="" if num_pages is None else num_pages, favorite=escape(favorite))
+
+
+def write_page(output_dir, first_page, title, page, pages, total, rows):
+    nav = render_nav(first_page, page, pages)
+    html = PAGE_TEMPLATE.format(title=escape(title), total=total, page=page, pages=pages,
+                                nav=nav, rows="\n".join(rows), first_page=first_page)
+    with open(os.path.join(output_dir, page_file_name(first_page, page)), 'w', encoding='utf-8') as file:
+        file.write(html)
+
+
+class SearchIndexWriter:
+    """
+    Потоковая запись поискового индекса в search_index.js (подключается тегом script,
+    поэтому каталог работает и при открытии файлов с диска, без веб-сервера).
+    """
+    def __init__(self, output_dir):
+        self.file = open(os.path.join(output_dir, 'search_index.js'), 'w', encoding='utf-8')
+        self.file.write("var SEARCH_INDEX = [\n")
+        self.first = True
+
+    def add(self, title, author, page):
+        if not self.first:
+            self.file.write(",\n")
+        self.file.write(json.dumps([title or "", author or "", page], ensure_ascii=False))
+        self.first = False
+
+    def close(self):
+        self.file.write("\n];\n")
+        self.file.close()